@@ -0,0 +1,119 @@
+"""ベンチマーク用の固定フィクスチャ（応答ヘッダー・本文・ページ・結果レコード列）"""
+
+import json
+import random
+from typing import Callable, Dict, List
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+# Cloudflare経由の応答に付く典型的なヘッダー
+CLOUDFLARE_RESPONSE_HEADERS = {
+    'Date': 'Wed, 27 Aug 2025 08:09:30 GMT',
+    'Content-Type': 'application/json',
+    'Transfer-Encoding': 'chunked',
+    'Connection': 'keep-alive',
+    'Server': 'cloudflare',
+    'CF-RAY': '976a1b2c3d4e5f60-NRT',
+    'CF-Cache-Status': 'DYNAMIC',
+    'Nel': '{"success_fraction":0,"report_to":"cf-nel","max_age":604800}',
+    'Report-To': '{"endpoints":[{"url":"https:\\/\\/a.nel.cloudflare.com\\/report\\/v4?s=abc"}],'
+                 '"group":"cf-nel","max_age":604800}',
+    'Vary': 'RSC, Next-Router-State-Tree, Next-Router-Prefetch, Accept-Encoding',
+    'X-Bot-Detection-Type': 'Cloudflare-Bot-Fight-Mode',
+    'Strict-Transport-Security': 'max-age=31536000; includeSubDomains',
+    'X-Content-Type-Options': 'nosniff',
+    'alt-svc': 'h3=":443"; ma=86400',
+}
+
+API_SUCCESS_BODY = json.dumps({
+    'success': True,
+    'message': 'お問い合わせを受け付けました',
+    # cf-bot-score ヘッダーがない場合、実際のルートは cloudflare キーを出力しない
+    'scores': {'recaptcha': None, 'jsDetectionPassed': None},
+    'debug': {'hasCfClearance': False,
+              'headers': {'cfRay': '976a1b2c3d4e5f60-NRT', 'cfConnectingIp': '203.0.113.10', 'cfIpCountry': 'JP'}}
+}, ensure_ascii=False)
+
+CHALLENGE_BODY = """<!DOCTYPE html>
+<html lang="en-US"><head><title>Just a moment...</title></head>
+<body><h1>Checking your browser before accessing the site.</h1><p>DDoS protection by Cloudflare</p></body></html>
+"""
+
+
+def build_contact_page(padding_kb: int = 120) -> str:
+    """Next.jsのページを模した固定のHTML（インラインのRSCペイロードでサイズを実際のページに近づける）"""
+    from mock_server import CONTACT_PAGE
+    rng = random.Random(0)
+    chunks = []
+    size = 0
+    while size < padding_kb * 1024:
+        chunk = 'self.__next_f.push([1,"%s"])' % ''.join(
+            rng.choices('abcdefghijklmnopqrstuvwxyz0123456789:{}[],', k=200))
+        chunks.append(f'<script>{chunk}</script>')
+        size += len(chunks[-1])
+    return CONTACT_PAGE.replace('</body>', '\n'.join(chunks) + '\n</body>')
+
+
+class CannedResponseAdapter(BaseAdapter):
+    """ネットワークを使わず、(メソッド, パス) ごとに固定の応答を返すアダプター"""
+
+    def __init__(self, routes: Dict):
+        super().__init__()
+        # (method, path) -> (status_code, headers, body)
+        self.routes = routes
+
+    def send(self, request, **kwargs) -> requests.Response:
+        path = request.path_url.split('?', 1)[0]
+        status_code, headers, body = self.routes[(request.method, path)]
+        response = requests.Response()
+        response.status_code = status_code
+        response.headers = CaseInsensitiveDict(headers)
+        response._content = body.encode('utf-8')
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        response.reason = 'OK' if status_code == 200 else ''
+        return response
+
+    def close(self):
+        pass
+
+
+def mount_canned(session: requests.Session, routes: Dict):
+    adapter = CannedResponseAdapter(routes)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+
+def build_results(count: int, extra_fields: Dict[str, Callable[[random.Random], object]] = None) -> List[Dict]:
+    """統計計算用の固定の結果レコード列（シード固定）"""
+    rng = random.Random(42)
+    results = []
+    base = 1_756_282_170.0
+    for i in range(count):
+        roll = rng.random()
+        status_code = 200 if roll < 0.85 else 403 if roll < 0.92 else 429 if roll < 0.97 else 503
+        response_time = rng.lognormvariate(-2.5, 0.6)
+        result = {
+            'thread_id': i % 20,
+            'attempt': i,
+            'timestamp': '2025-08-27T17:09:30.000000',
+            'success': status_code == 200,
+            'error': None if status_code == 200 else f'HTTP {status_code}',
+            'response_time': response_time,
+            'intended_start': base + i * 0.001,
+            'actual_start': base + i * 0.001 + rng.random() * 0.002,
+            'service_time': response_time,
+            'status_code': status_code,
+            'cloudflare_blocked': status_code == 403,
+            'challenge_detected': status_code == 503,
+            'response_headers': {},
+            'cloudflare_headers': {'CF-RAY': '976a1b2c3d4e5f60-NRT'},
+            'header_set': None,
+        }
+        for field, make in (extra_fields or {}).items():
+            result[field] = make(rng)
+        results.append(result)
+    return results
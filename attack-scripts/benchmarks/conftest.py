@@ -0,0 +1,182 @@
+"""
+クライアント側オーバーヘッドのマイクロベンチマーク（pytest）
+
+テスター自身が1リクエストごとに行う処理（結果レコードの作成、ヘッダーのコピーと cf- ヘッダーの抽出、
+キーワード走査、ランダムなフォームデータの生成、統計計算など）を固定のフィクスチャに対して計測し、
+baselines.json に保存した基準値と比較します。
+
+実行（リポジトリのルートで）:
+    poetry run pytest attack-scripts/benchmarks                # 計測して、基準値より遅いものは警告だけ出す
+    poetry run pytest attack-scripts/benchmarks --bench-check  # 基準値より遅いものを失敗にする（BENCH_CHECK=1 と同じ）
+    poetry run pytest attack-scripts/benchmarks --bench-save   # 基準値を更新
+
+マシンの速さの違いは参照ワークロードとの比で補正します。参照ワークロードと対象の処理を1ラウンドずつ交互に計測し、
+ラウンドごとの比の中央値を基準値の比と比べるので、実行中に速さが変わる環境（共有VMなど）でも比較がずれにくくなります。
+それでも共有の環境では揺らぐため、遅れの判定はオプトインにしています。
+"""
+
+import gc
+import io
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+import warnings
+from pathlib import Path
+from typing import Callable, Dict, Tuple
+
+import pytest
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent
+BASELINE_PATH = Path(__file__).with_name('baselines.json')
+
+sys.path.insert(0, str(SCRIPTS_DIR))
+
+# テスターはインポート時に setup_logging でファイルとコンソールにログを出すため、先にルートロガーを設定して
+# それを無効にする。ログの整形コストは計測に含めたいので、書き込み先だけを捨てるストリームにする。
+
+
+class _DiscardStream(io.TextIOBase):
+    def write(self, text):
+        return len(text)
+
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler(_DiscardStream())]
+)
+
+# 1回の計測ラウンドの最短時間と、ラウンド数（中央値を採用する）
+MIN_ROUND_TIME = 0.05
+ROUNDS = 9
+
+# 計測結果と、その直前に計測した参照ワークロードの値（--bench-save 時にセッション終了時に書き出す）
+_measured = {}
+_references = {}
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('bench', 'client-overhead micro-benchmarks')
+    group.addoption('--bench-save', action='store_true',
+                    help='Save the measured timings as the new baselines')
+    group.addoption('--bench-check', action='store_true', default=os.environ.get('BENCH_CHECK') == '1',
+                    help='Fail benchmarks that are slower than the baseline instead of only warning '
+                         '(also enabled by BENCH_CHECK=1)')
+    group.addoption('--bench-tolerance', type=float, default=0.5,
+                    help='Allowed slowdown over the baseline before failing, as a fraction (default: 0.5)')
+
+
+def _calibrate(func: Callable, *args, **kwargs) -> int:
+    """1ラウンドが MIN_ROUND_TIME 以上になるループ回数"""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_ROUND_TIME:
+            return loops
+        loops *= 2 if elapsed == 0 else max(2, int(MIN_ROUND_TIME / elapsed * 1.2))
+
+
+def _time_round(loops: int, func: Callable, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    for _ in range(loops):
+        func(*args, **kwargs)
+    return (time.perf_counter() - start) / loops
+
+
+def measure(func: Callable, *args, **kwargs) -> Tuple[float, float, float]:
+    """func と参照ワークロードを交互に計測し、1回あたりの実行時間（秒）・参照ワークロードの実行時間・その比の中央値を返す"""
+    # 直前のベンチマークが残したゴミの回収を計測に含めない
+    gc.collect()
+    reference_loops = _calibrate(_reference_workload)
+    loops = _calibrate(func, *args, **kwargs)
+
+    times, references, ratios = [], [], []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(ROUNDS):
+            reference = _time_round(reference_loops, _reference_workload)
+            elapsed = _time_round(loops, func, *args, **kwargs)
+            times.append(elapsed)
+            references.append(reference)
+            ratios.append(elapsed / reference)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return statistics.median(times), statistics.median(references), statistics.median(ratios)
+
+
+def _reference_workload():
+    """マシンの速さを測るための固定の処理（辞書・文字列・JSONの典型的な操作）"""
+    record = {f'key{i}': i for i in range(50)}
+    text = json.dumps(record)
+    json.loads(text)
+    ''.join(sorted(text.lower()))
+
+
+def _load_baselines() -> Dict:
+    if BASELINE_PATH.exists():
+        with open(BASELINE_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {'reference': None, 'references': {}, 'benchmarks': {}}
+
+
+class BenchRunner:
+    """計測して基準値と比較するヘルパー（bench フィクスチャ）"""
+
+    def __init__(self, baselines: Dict, save: bool, check: bool, tolerance: float):
+        self.baselines = baselines
+        self.save = save
+        self.check = check
+        self.tolerance = tolerance
+
+    def __call__(self, name: str, func: Callable, *args, **kwargs) -> float:
+        elapsed, reference, ratio = measure(func, *args, **kwargs)
+        _measured[name] = elapsed
+        _references[name] = reference
+
+        baseline = self.baselines['benchmarks'].get(name)
+        baseline_reference = self.baselines.get('references', {}).get(name) or self.baselines.get('reference')
+        if self.save:
+            return elapsed
+        if baseline is None or not baseline_reference:
+            warnings.warn(f"No baseline for {name} ({elapsed * 1e6:.1f}us/call); run with --bench-save")
+            return elapsed
+
+        # 参照ワークロードとの比を、基準値を保存したときの比と比べる
+        scale = reference / baseline_reference
+        if ratio > baseline / baseline_reference * (1 + self.tolerance):
+            message = (f"{name} regressed: {elapsed * 1e6:.1f}us/call, "
+                       f"baseline {baseline * scale * 1e6:.1f}us/call (scaled), "
+                       f"{ratio / (baseline / baseline_reference) - 1:+.0%} relative to the reference workload")
+            if self.check:
+                pytest.fail(message)
+            warnings.warn(message)
+        return elapsed
+
+
+@pytest.fixture
+def bench(request) -> BenchRunner:
+    config = request.config
+    return BenchRunner(_load_baselines(), config.getoption('--bench-save'), config.getoption('--bench-check'),
+                       config.getoption('--bench-tolerance'))
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if not session.config.getoption('--bench-save', default=False) or not _measured:
+        return
+    baselines = _load_baselines()
+    baselines['reference'] = min(_references.values())
+    for key, values in (('benchmarks', _measured), ('references', _references)):
+        merged = dict(baselines.get(key, {}))
+        merged.update(values)
+        baselines[key] = dict(sorted(merged.items()))
+    with open(BASELINE_PATH, 'w', encoding='utf-8') as f:
+        json.dump(baselines, f, indent=2)
+        f.write('\n')
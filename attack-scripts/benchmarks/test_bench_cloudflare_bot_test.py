@@ -0,0 +1,38 @@
+"""CloudflareBotTester のクライアント側処理のベンチマーク（ブラウザは起動しない）"""
+
+import pytest
+
+from bench_fixtures import build_results
+from cloudflare_bot_test import CloudflareBotTester
+
+TARGET_URL = 'https://bench.invalid/contact'
+
+
+@pytest.fixture
+def tester():
+    return CloudflareBotTester(target_url=TARGET_URL)
+
+
+def test_generate_form_values(bench, tester):
+    def generate():
+        tester.generate_random_email()
+        tester.generate_random_message()
+
+    bench('cloudflare_bot_test.generate_form_values', generate)
+
+
+def test_record_result(bench, tester):
+    result = build_results(1, {'bot_score': lambda rng: 0.9})[0]
+    bench('cloudflare_bot_test.record_result', tester._record_result, result)
+    tester.results.clear()
+
+
+def test_calculate_statistics_100k(bench, tester):
+    tester.results.extend(build_results(100_000, {
+        'recaptcha_found': lambda rng: True,
+        'bot_score': lambda rng: round(rng.random(), 1),
+        'page_title': lambda rng: 'お問い合わせ',
+        'driver_startup_time': lambda rng: 0.0,
+        'interaction_time': lambda rng: rng.uniform(0.5, 2.0),
+    }))
+    bench('cloudflare_bot_test.calculate_statistics.100k', tester.calculate_statistics, 60.0)
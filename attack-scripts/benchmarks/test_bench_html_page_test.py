@@ -0,0 +1,61 @@
+"""HTMLPageBotTester のクライアント側処理のベンチマーク"""
+
+import pytest
+
+from bench_fixtures import (API_SUCCESS_BODY, CLOUDFLARE_RESPONSE_HEADERS, CHALLENGE_BODY, build_contact_page,
+                      build_results, mount_canned)
+from html_page_test import HTMLPageBotTester
+from page_analysis import analyze_contact_page, analyze_contact_page_bs4
+
+TARGET_URL = 'https://bench.invalid/contact'
+CONTACT_PAGE = build_contact_page()
+PAGE_HEADERS = dict(CLOUDFLARE_RESPONSE_HEADERS, **{'Content-Type': 'text/html; charset=utf-8'})
+
+
+@pytest.fixture
+def tester():
+    tester = HTMLPageBotTester(target_url=TARGET_URL)
+    mount_canned(tester.session, {
+        ('GET', '/contact'): (200, PAGE_HEADERS, CONTACT_PAGE),
+        ('POST', '/api/contact'): (200, CLOUDFLARE_RESPONSE_HEADERS, API_SUCCESS_BODY),
+    })
+    yield tester
+    tester.sessions.close()
+
+
+def test_analyze_contact_page(bench):
+    bench('html_page_test.analyze_contact_page', analyze_contact_page, CONTACT_PAGE)
+
+
+def test_analyze_challenge_page(bench):
+    bench('html_page_test.analyze_challenge_page', analyze_contact_page, CHALLENGE_BODY)
+
+
+def test_analyze_contact_page_bs4(bench):
+    bench('html_page_test.analyze_contact_page_bs4', analyze_contact_page_bs4, CONTACT_PAGE)
+
+
+def test_generate_form_values(bench, tester):
+    def generate():
+        tester.generate_random_email()
+        tester.generate_random_message()
+
+    bench('html_page_test.generate_form_values', generate)
+
+
+def test_access_page_and_submit_form(bench, tester):
+    # ネットワークを除いた1試行分の処理（ページ取得・解析・API送信）
+    bench('html_page_test.access_page_and_submit_form', tester.access_page_and_submit_form, 1, 1)
+
+
+def test_calculate_statistics_100k(bench):
+    tester = HTMLPageBotTester(target_url=TARGET_URL)
+    tester.results.extend(build_results(100_000, {
+        'form_found': lambda rng: True,
+        'recaptcha_found': lambda rng: True,
+        'page_title': lambda rng: 'お問い合わせ',
+        'page_time': lambda rng: rng.lognormvariate(-3, 0.5),
+        'api_time': lambda rng: rng.lognormvariate(-3, 0.5),
+    }))
+    bench('html_page_test.calculate_statistics.100k', tester.calculate_statistics, 60.0)
+    tester.sessions.close()
@@ -0,0 +1,60 @@
+"""SimpleBotTester のクライアント側処理のベンチマーク"""
+
+import pytest
+
+from bench_fixtures import API_SUCCESS_BODY, CLOUDFLARE_RESPONSE_HEADERS, CHALLENGE_BODY, build_results, mount_canned
+from simple_test import SimpleBotTester
+
+TARGET_URL = 'https://bench.invalid/contact'
+
+
+@pytest.fixture
+def tester():
+    tester = SimpleBotTester(target_url=TARGET_URL)
+    mount_canned(tester.session, {
+        ('POST', '/api/contact'): (200, CLOUDFLARE_RESPONSE_HEADERS, API_SUCCESS_BODY),
+    })
+    yield tester
+    tester.sessions.close()
+
+
+def test_new_result(bench, tester):
+    bench('simple_test.new_result', tester._new_result, 1, 1, 0.0, 0.0)
+
+
+def test_build_form_data(bench, tester):
+    bench('simple_test.build_form_data', tester._build_form_data)
+
+
+def test_process_response_success(bench, tester):
+    def process():
+        result = tester._new_result(1, 1, 0.0, 0.0)
+        tester._process_response(result, 200, CLOUDFLARE_RESPONSE_HEADERS, API_SUCCESS_BODY, 1, 1)
+
+    bench('simple_test.process_response.success', process)
+
+
+def test_process_response_challenge(bench, tester):
+    def process():
+        result = tester._new_result(1, 1, 0.0, 0.0)
+        tester._process_response(result, 503, CLOUDFLARE_RESPONSE_HEADERS, CHALLENGE_BODY, 1, 1)
+
+    bench('simple_test.process_response.challenge', process)
+
+
+def test_submit_contact_form(bench, tester):
+    # ネットワークを除いた1リクエスト分の処理（requests の送受信処理を含む）
+    bench('simple_test.submit_contact_form', tester.submit_contact_form, 1, 1)
+
+
+def test_record_result(bench, tester):
+    result = build_results(1)[0]
+    bench('simple_test.record_result', tester._record_result, result)
+    tester.results.clear()
+
+
+def test_calculate_statistics_100k(bench):
+    tester = SimpleBotTester(target_url=TARGET_URL)
+    tester.results.extend(build_results(100_000))
+    bench('simple_test.calculate_statistics.100k', tester.calculate_statistics, 60.0)
+    tester.sessions.close()
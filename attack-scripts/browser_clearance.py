@@ -0,0 +1,242 @@
+"""
+ブラウザで取得したクリアランス（Cookie と User-Agent）をHTTPワーカーに配るハイブリッドモード
+
+Cloudflare のJSチャレンジを通過して cf_clearance などのCookieを得るには実際のブラウザが必要ですが、
+一度得たCookieは同じ User-Agent（と同じIPアドレス）からのリクエストであれば、ブラウザを介さずに使えます。
+ClearanceBroker は少数のブラウザセッション（CloudflareBotTester.create_driver で作る）でクリアランスを取得し、
+SimpleBotTester のHTTPワーカーはそれを付けて /api/contact に直接送信します。
+
+- ワーカーは thread_id ごとにいずれかのブラウザのクリアランスを使います
+- クリアランスのCookie（cf_clearance / __cf_bm）の期限が近づいた場合、max_age を過ぎた場合、
+  または直近の結果でブロック（403・失敗したチャレンジ）の割合が block_rate 以上になった場合に、
+  そのブラウザのCookieを消去してページを開き直し、クリアランスを取り直します
+- 取り直しはバックグラウンドのスレッドで行い、その間ワーカーは前のクリアランスで送信を続けます
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+from page_waits import has_challenge, wait_for_challenge_cleared
+
+logger = logging.getLogger(__name__)
+
+# 期限を見るCookie（Cloudflare のクリアランスとBot Managementのセッション）
+CLEARANCE_COOKIES = ('cf_clearance', '__cf_bm')
+
+# Cookieの期限のこの秒数前に取り直す
+EXPIRY_MARGIN = 10.0
+
+# ブロックの割合を判定する前に必要な結果の最小件数
+MIN_BLOCK_SAMPLES = 5
+
+
+def is_blocked(result: Dict) -> bool:
+    """クリアランスが効いていないとみなす結果か（403、または失敗したチャレンジ）"""
+    return result['cloudflare_blocked'] or (result['challenge_detected'] and not result['success'])
+
+
+class Clearance:
+    """ブラウザ1つが1回の取得で得たCookieとUser-Agent"""
+
+    __slots__ = ('source', 'generation', 'label', 'cookies', 'user_agent', 'earned_at', 'refresh_at')
+
+    def __init__(self, source: 'ClearanceSource', generation: int, cookies: Dict[str, str], user_agent: str,
+                 earned_at: float, refresh_at: Optional[float]):
+        self.source = source
+        self.generation = generation
+        # 結果レコードの clearance 列（"ブラウザ番号:取得回数"）
+        self.label = f"{source.index}:{generation}"
+        self.cookies = cookies
+        self.user_agent = user_agent
+        self.earned_at = earned_at
+        # この時刻（time.time()）を過ぎたら取り直す（None の場合は期限で取り直さない）
+        self.refresh_at = refresh_at
+
+
+class ClearanceSource:
+    """クリアランスを取得・更新するブラウザセッション1つ"""
+
+    def __init__(self, index: int, driver_factory: Callable, target_url: str, max_age: Optional[float],
+                 block_rate: float, block_window: int, challenge_timeout: float):
+        self.index = index
+        self.driver_factory = driver_factory
+        self.target_url = target_url
+        self.max_age = max_age
+        self.block_rate = block_rate
+        self.challenge_timeout = challenge_timeout
+        self.driver = None
+        self.current: Optional[Clearance] = None
+        self.generation = 0
+        self.refreshes = {'expired': 0, 'blocked': 0}
+        self.failures = 0
+        self.earn_times: List[float] = []
+        self._recent = deque(maxlen=block_window)
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def earn(self) -> Clearance:
+        """Cookieを消去してページを開き、チャレンジを通過した後のCookieとUser-Agentを取得する"""
+        started = time.time()
+        if self.driver is None:
+            self.driver = self.driver_factory()
+        driver = self.driver
+        driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+        driver.get(self.target_url)
+        if has_challenge(driver):
+            wait_for_challenge_cleared(driver, timeout=self.challenge_timeout)
+
+        cookies = driver.get_cookies()
+        user_agent = driver.execute_script('return navigator.userAgent')
+        earned_at = time.time()
+
+        refresh_at = earned_at + self.max_age if self.max_age else None
+        expiries = [cookie['expiry'] for cookie in cookies
+                    if cookie['name'] in CLEARANCE_COOKIES and cookie.get('expiry')]
+        if expiries:
+            expires_at = min(expiries) - EXPIRY_MARGIN
+            refresh_at = min(refresh_at, expires_at) if refresh_at else expires_at
+
+        with self._lock:
+            self.generation += 1
+            self.current = Clearance(self, self.generation, {cookie['name']: cookie['value'] for cookie in cookies},
+                                     user_agent, earned_at, refresh_at)
+            self._recent.clear()
+            self.earn_times.append(earned_at - started)
+        logger.info(f"Browser {self.index}: clearance #{self.generation} earned in {earned_at - started:.2f}s "
+                    f"({len(cookies)} cookies{', cf_clearance' if 'cf_clearance' in self.current.cookies else ''})")
+        return self.current
+
+    def get(self) -> Optional[Clearance]:
+        """現在のクリアランスを返す（期限を過ぎていればバックグラウンドで取り直す）"""
+        clearance = self.current
+        if clearance is not None and clearance.refresh_at is not None and time.time() >= clearance.refresh_at:
+            self._refresh('expired')
+        return clearance
+
+    def observe(self, clearance: Clearance, result: Dict):
+        """クリアランスを付けて送信した結果を記録し、ブロックされ始めたら取り直す"""
+        with self._lock:
+            # 取り直す前のクリアランスで送った結果は判定に使わない
+            if clearance is not self.current:
+                return
+            self._recent.append(is_blocked(result))
+            blocked = (len(self._recent) >= min(MIN_BLOCK_SAMPLES, self._recent.maxlen)
+                       and sum(self._recent) / len(self._recent) >= self.block_rate)
+        if blocked:
+            self._refresh('blocked')
+
+    def _refresh(self, reason: str):
+        """バックグラウンドで取り直す（同時に1つだけ）"""
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+            self.refreshes[reason] += 1
+        logger.info(f"Browser {self.index}: refreshing clearance #{self.generation} ({reason})")
+        threading.Thread(target=self._run_refresh, name=f'clearance-{self.index}', daemon=True).start()
+
+    def _run_refresh(self):
+        try:
+            self.earn_with_retry()
+        except Exception as e:
+            # 前のクリアランスを使い続け、次の期限切れ・ブロックでまた取り直す
+            logger.error(f"Browser {self.index}: clearance refresh failed: {e}")
+            with self._lock:
+                self._recent.clear()
+                if self.current is not None and self.current.refresh_at is not None:
+                    self.current.refresh_at = time.time() + EXPIRY_MARGIN
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def earn_with_retry(self) -> Clearance:
+        """earn と同じ（ブラウザのエラーやチャレンジのタイムアウトでは、ブラウザを起動し直して1回だけ再試行する）"""
+        try:
+            return self.earn()
+        except (WebDriverException, TimeoutException) as e:
+            with self._lock:
+                self.failures += 1
+            logger.warning(f"Browser {self.index}: earning clearance failed, restarting the browser: {e}")
+            self.quit()
+            return self.earn()
+
+    def summary(self) -> Dict:
+        clearance = self.current
+        return {
+            'browser': self.index,
+            'generation': self.generation,
+            'refreshes': dict(self.refreshes),
+            'failures': self.failures,
+            'avg_earn_time': sum(self.earn_times) / len(self.earn_times) if self.earn_times else None,
+            'user_agent': clearance.user_agent if clearance else None,
+            'cookies': sorted(clearance.cookies) if clearance else [],
+            'refresh_at': clearance.refresh_at if clearance else None
+        }
+
+    def quit(self):
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except Exception:
+                pass
+            self.driver = None
+
+
+class ClearanceBroker:
+    """ブラウザセッションのクリアランスをHTTPワーカーに配る
+
+    driver_factory は引数なしでクリアランスを取得するブラウザの WebDriver を返す（CloudflareBotTester.create_driver）。
+    block_rate は直近 block_window 件のうちブロックされた結果の割合（0〜1）の閾値。
+    """
+
+    def __init__(self, driver_factory: Callable, target_url: str, browsers: int = 1, max_age: Optional[float] = None,
+                 block_rate: float = 0.5, block_window: int = 20, challenge_timeout: float = 30.0):
+        self.sources = [ClearanceSource(index, driver_factory, target_url, max_age, block_rate, block_window,
+                                        challenge_timeout)
+                        for index in range(browsers)]
+        self._ready: List[ClearanceSource] = []
+
+    def start(self):
+        """すべてのブラウザで最初のクリアランスを取得する（取得できたブラウザが1つもなければ例外）"""
+        started = time.time()
+        with ThreadPoolExecutor(max_workers=len(self.sources)) as executor:
+            futures = [(source, executor.submit(source.earn_with_retry)) for source in self.sources]
+        for source, future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"Browser {source.index}: could not earn clearance: {e}")
+                source.quit()
+        self._ready = [source for source in self.sources if source.current is not None]
+        if not self._ready:
+            raise RuntimeError("No browser could earn clearance")
+        logger.info(f"Clearance earned by {len(self._ready)}/{len(self.sources)} browsers "
+                    f"in {time.time() - started:.2f}s")
+
+    def clearance_for(self, thread_id: int) -> Clearance:
+        """ワーカー（thread_id）が使うクリアランス"""
+        return self._ready[thread_id % len(self._ready)].get()
+
+    def observe(self, clearance: Clearance, result: Dict):
+        clearance.source.observe(clearance, result)
+
+    def summary(self) -> Dict:
+        sources = [source.summary() for source in self.sources]
+        return {
+            'browsers': len(self.sources),
+            'ready_browsers': len(self._ready),
+            'refreshes': sum(sum(source['refreshes'].values()) for source in sources),
+            'refreshes_expired': sum(source['refreshes']['expired'] for source in sources),
+            'refreshes_blocked': sum(source['refreshes']['blocked'] for source in sources),
+            'sources': sources
+        }
+
+    def close(self):
+        for source in self.sources:
+            source.quit()
@@ -0,0 +1,332 @@
+"""
+1つのChromeで複数の分離されたブラウザコンテキストを動かすプール
+
+WebDriverPool は並列数と同じ数のChromeを起動するため、1台で同時に動かせるブラウザは数個から十数個が上限です。
+BrowserContextPool はChromeを contexts_per_browser 個のコンテキストごとに1つだけ起動し、その中に分離された
+ブラウザコンテキスト（シークレットウィンドウと同じく、Cookie・ストレージ・キャッシュを共有しない）とタブを作ります。
+
+- Chromeは所有者のWebDriverセッションで起動し、そのデバッグ用アドレス（debuggerAddress）にコンテキストごとの
+  WebDriverセッションを接続します。各セッションは自分のタブだけを操作するので、ページ内の待機中も
+  他のコンテキストを止めません
+- コンテキストとタブの作成・破棄は、ブラウザ全体に対するCDP接続（Target.createBrowserContext など）で行います
+- 返却時はコンテキストを作り直すので、試行間で状態は引き継がれません
+- Chromeごとのメモリ使用量（Chromeの全プロセスと、接続しているchromedriverのPSS）を返却時に計測し、
+  コンテキストあたりの値を報告します（/proc から読むため Linux のみ）
+"""
+
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+import websocket
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+
+logger = logging.getLogger(__name__)
+
+# Chromeごとのメモリ使用量を計測する最短の間隔（秒）
+MEMORY_SAMPLE_INTERVAL = 1.0
+
+# 新しいタブが WebDriver セッションのウィンドウ一覧に現れるまで待つ時間（秒）
+TAB_DISCOVERY_TIMEOUT = 5.0
+
+
+def process_memory(pid: int) -> Optional[int]:
+    """プロセスのメモリ使用量（バイト）。共有ページを按分した PSS、読めない場合は RSS"""
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                if line.startswith('Pss:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+class BrowserCDP:
+    """ブラウザ全体（browser ターゲット）に対するCDP接続"""
+
+    def __init__(self, debugger_address: str, timeout: float = 30.0):
+        version = requests.get(f"http://{debugger_address}/json/version", timeout=timeout).json()
+        # Origin ヘッダーを送ると --remote-allow-origins のないChromeに拒否される
+        self._socket = websocket.create_connection(version['webSocketDebuggerUrl'], timeout=timeout,
+                                                   suppress_origin=True)
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    def send(self, method: str, params: Optional[Dict] = None) -> Dict:
+        """コマンドを送って結果を返す（失敗した場合は WebDriverException）"""
+        with self._lock:
+            self._next_id += 1
+            message_id = self._next_id
+            try:
+                self._socket.send(json.dumps({'id': message_id, 'method': method, 'params': params or {}}))
+                while True:
+                    message = json.loads(self._socket.recv())
+                    # イベントは使わないので読み捨てる
+                    if message.get('id') == message_id:
+                        break
+            except (websocket.WebSocketException, OSError) as e:
+                raise WebDriverException(f"CDP connection failed during {method}: {e}")
+        if 'error' in message:
+            raise WebDriverException(f"{method} failed: {message['error'].get('message')}")
+        return message.get('result', {})
+
+    def close(self):
+        try:
+            self._socket.close()
+        except Exception:
+            pass
+
+
+class BrowserHost:
+    """起動済みのChrome1つ（所有者のWebDriverセッションと、ブラウザ全体へのCDP接続）"""
+
+    def __init__(self, owner: webdriver.Chrome):
+        self.owner = owner
+        self.debugger_address = owner.capabilities['goog:chromeOptions']['debuggerAddress']
+        self.cdp = BrowserCDP(self.debugger_address)
+        self.slots: List['ContextSlot'] = []
+        # acquire の割り当てに使う（プールのロックで保護）
+        self.idle: List['ContextSlot'] = []
+        self.busy = 0
+        self.peak_memory: Optional[int] = None
+        self.processes = 0
+        self._memory_lock = threading.Lock()
+        self._last_sample = 0.0
+
+    def new_context(self) -> Tuple[str, str]:
+        """分離されたコンテキストとその中の空白のタブを作り、(コンテキストID, ターゲットID) を返す"""
+        # この接続が切れたら（テストの終了時など）Chrome側でコンテキストが破棄される
+        context_id = self.cdp.send('Target.createBrowserContext', {'disposeOnDetach': True})['browserContextId']
+        target_id = self.cdp.send('Target.createTarget', {'url': 'about:blank',
+                                                          'browserContextId': context_id})['targetId']
+        return context_id, target_id
+
+    def dispose_context(self, context_id: str):
+        """コンテキストを破棄する（中のタブも閉じられる）"""
+        try:
+            self.cdp.send('Target.disposeBrowserContext', {'browserContextId': context_id})
+        except WebDriverException as e:
+            logger.debug(f"Disposing browser context {context_id} failed: {e}")
+
+    def sample_memory(self, force: bool = False):
+        """Chromeの全プロセスと、接続しているchromedriverのメモリ使用量を計測し、最大値を更新する"""
+        now = time.monotonic()
+        with self._memory_lock:
+            if not force and now - self._last_sample < MEMORY_SAMPLE_INTERVAL:
+                return
+            self._last_sample = now
+            try:
+                pids = [process['id'] for process in self.cdp.send('SystemInfo.getProcessInfo')['processInfo']]
+            except (WebDriverException, KeyError) as e:
+                logger.debug(f"Reading Chrome process info failed: {e}")
+                return
+            pids.extend(slot.driver_pid for slot in self.slots if slot.driver_pid is not None)
+            usages = [usage for usage in map(process_memory, pids) if usage is not None]
+            if not usages:
+                return
+            total = sum(usages)
+            self.processes = len(usages)
+            if self.peak_memory is None or total > self.peak_memory:
+                self.peak_memory = total
+
+    def report(self) -> Dict:
+        contexts = len(self.slots)
+        return {
+            'contexts': contexts,
+            'processes': self.processes,
+            'peak_memory_bytes': self.peak_memory,
+            'memory_per_context': self.peak_memory / contexts if self.peak_memory and contexts else None
+        }
+
+    def close(self):
+        self.cdp.close()
+        try:
+            self.owner.quit()
+        except Exception:
+            pass
+
+
+class ContextSlot:
+    """Chrome内の分離されたコンテキスト1つ分（専用のタブと、そのタブだけを操作するWebDriverセッション）"""
+
+    def __init__(self, host: BrowserHost):
+        self.host = host
+        self.driver: Optional[webdriver.Chrome] = None
+        self.context_id: Optional[str] = None
+        self.target_id: Optional[str] = None
+
+    @property
+    def driver_pid(self) -> Optional[int]:
+        """このセッションのchromedriverのプロセスID"""
+        process = getattr(getattr(self.driver, 'service', None), 'process', None)
+        return process.pid if process is not None else None
+
+    def open(self, factory: Callable[..., webdriver.Chrome]):
+        """WebDriverセッションを接続し、新しいコンテキストのタブに切り替える"""
+        if self.driver is None:
+            self.driver = factory(debugger_address=self.host.debugger_address)
+        self.renew()
+
+    def renew(self):
+        """新しいコンテキストのタブに切り替えてから、前のコンテキストを破棄する"""
+        previous = self.context_id
+        self.context_id, self.target_id = self.host.new_context()
+        self.driver.switch_to.window(self._window_handle())
+        if previous is not None:
+            self.host.dispose_context(previous)
+
+    def _window_handle(self) -> str:
+        # chromedriver のウィンドウハンドルはターゲットID（古いバージョンでは "CDwindow-" が付く）
+        deadline = time.monotonic() + TAB_DISCOVERY_TIMEOUT
+        while True:
+            for handle in self.driver.window_handles:
+                if handle.endswith(self.target_id):
+                    return handle
+            if time.monotonic() >= deadline:
+                raise WebDriverException(f"Tab {self.target_id} did not appear in the WebDriver session")
+            time.sleep(0.05)
+
+    def discard(self):
+        """セッションを切断してコンテキストを破棄する（次回の acquire で作り直される）
+
+        接続したセッションの quit はChrome自体を終了しない。
+        """
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except Exception:
+                pass
+            self.driver = None
+        if self.context_id is not None:
+            self.host.dispose_context(self.context_id)
+            self.context_id = self.target_id = None
+
+
+class BrowserContextPool:
+    """Chrome1つあたり contexts_per_browser 個のコンテキストを持つプール（WebDriverPool と同じインターフェース）
+
+    factory は factory() でChromeを起動し、factory(debugger_address=...) で起動済みのChromeに接続する。
+    acquire は、空いているコンテキストがあるChromeのうち使用中のコンテキストが最も少ないものから割り当てる。
+    """
+
+    def __init__(self, factory: Callable[..., webdriver.Chrome], size: int, contexts_per_browser: int):
+        self.factory = factory
+        self.size = size
+        self.contexts_per_browser = contexts_per_browser
+        self.hosts: List[BrowserHost] = []
+        self._available = threading.Condition()
+        self._by_driver: Dict[int, ContextSlot] = {}
+        self.launches = 0
+
+    def warm_up(self):
+        """必要な数のChromeを起動し、すべてのコンテキストを事前に作っておく"""
+        remaining = self.size
+        while remaining > 0:
+            launch_start = time.time()
+            host = BrowserHost(self.factory())
+            self.launches += 1
+            count = min(self.contexts_per_browser, remaining)
+            host.slots = [ContextSlot(host) for _ in range(count)]
+            # セッションの接続（chromedriverの起動）はコンテキストごとに並列で行う
+            with ThreadPoolExecutor(max_workers=min(count, 16)) as executor:
+                list(executor.map(lambda slot: slot.open(self.factory), host.slots))
+            host.sample_memory(force=True)
+            with self._available:
+                host.idle = list(host.slots)
+                self.hosts.append(host)
+            remaining -= count
+            logger.info(f"Chrome {len(self.hosts)} ready with {count} contexts in {time.time() - launch_start:.2f}s")
+
+    def acquire(self) -> Tuple[webdriver.Chrome, float]:
+        """コンテキストを借りる。(そのタブを操作するドライバー, 作り直しに要した時間) を返す"""
+        with self._available:
+            while True:
+                candidates = [host for host in self.hosts if host.idle]
+                if candidates:
+                    break
+                if not any(host.slots for host in self.hosts):
+                    raise RuntimeError("No browser contexts left in the pool")
+                self._available.wait(1.0)
+            host = min(candidates, key=lambda candidate: candidate.busy)
+            slot = host.idle.pop()
+            host.busy += 1
+
+        startup_time = 0.0
+        if slot.driver is None:
+            # 前の試行でエラーになったコンテキストを作り直す
+            launch_start = time.time()
+            try:
+                slot.open(self.factory)
+            except Exception:
+                slot.discard()
+                with self._available:
+                    host.busy -= 1
+                    host.slots.remove(slot)
+                    self._available.notify_all()
+                raise
+            startup_time = time.time() - launch_start
+            with self._available:
+                self.launches += 1
+        self._by_driver[id(slot.driver)] = slot
+        return slot.driver, startup_time
+
+    def release(self, driver: webdriver.Chrome, healthy: bool = True):
+        """コンテキストを返却する。作り直せなかった場合はセッションごと破棄する"""
+        slot = self._by_driver.pop(id(driver))
+        host = slot.host
+        if healthy:
+            # 試行のページを開いたままの状態で計測する
+            host.sample_memory()
+            try:
+                slot.renew()
+            except WebDriverException as e:
+                logger.warning(f"Browser context reset failed, discarding: {e}")
+                healthy = False
+        if not healthy:
+            slot.discard()
+        with self._available:
+            host.busy -= 1
+            host.idle.append(slot)
+            self._available.notify()
+
+    def report(self) -> Dict:
+        """Chromeの数・コンテキスト数と、メモリ使用量（Chromeごとの最大値の合計）"""
+        hosts = [host.report() for host in self.hosts]
+        contexts = sum(host['contexts'] for host in hosts)
+        measured = [host['peak_memory_bytes'] for host in hosts if host['peak_memory_bytes'] is not None]
+        total = sum(measured) if measured else None
+        return {
+            'browsers': len(hosts),
+            'contexts': contexts,
+            'contexts_per_browser': self.contexts_per_browser,
+            'peak_memory_bytes': total,
+            'memory_per_context': total / contexts if total and contexts else None,
+            'hosts': hosts
+        }
+
+    def close(self):
+        """すべてのセッションを切断し、Chromeを終了する"""
+        with self._available:
+            hosts = list(self.hosts)
+        for host in hosts:
+            for slot in host.slots:
+                if slot.driver is not None:
+                    try:
+                        slot.driver.quit()
+                    except Exception:
+                        pass
+            host.close()
+        logger.info(f"Browser context pool closed ({len(hosts)} browsers, {self.launches} launches)")
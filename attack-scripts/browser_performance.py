@@ -0,0 +1,164 @@
+"""
+ブラウザ側のパフォーマンス計測（Chrome DevTools Protocol）
+
+CloudflareBotTester の time.time() による計測は、ドライバーの起動・操作・待機を含む経過時間だけで、
+ページ自体の読み込みがどうだったかは分かりません。PerformanceCapture は試行ごとに次の値を記録します。
+
+    page_<phase>_time    Navigation Timing から求めたページ読み込みのフェーズ（request_timing と同じ
+                         dns / connect / tls / ttfb / body / processing。processing は本文の受信後から
+                         load イベントの終了まで）
+    resource_timings     リソースごとの開始時刻・所要時間・転送量（reCAPTCHA / Turnstile のスクリプトには
+                         captcha: true を付ける）
+    captcha_script_time  reCAPTCHA / Turnstile のスクリプトの読み込みにかかった時間（最初の開始から最後の終了まで）
+    api_xhr_time         フォーム送信時の /api/contact へのリクエストの所要時間（Network イベントから）
+    api_xhr_status       そのステータスコード
+    js_heap_used         試行の終了時点のJSヒープ使用量（バイト）
+
+Network イベントは performance ログ（goog:loggingPrefs）から、ヒープは Performance.getMetrics から取得します。
+"""
+
+import json
+import logging
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.options import Options
+
+from request_timing import PHASES, phase_fields
+
+logger = logging.getLogger(__name__)
+
+# reCAPTCHA / Turnstile のスクリプトと判定するURLの一部
+CAPTCHA_URL_MARKERS = ('recaptcha', 'challenges.cloudflare.com/turnstile')
+
+# Navigation Timing と Resource Timing をまとめて取得するスクリプト（時刻はミリ秒）
+_TIMING_SCRIPT = """
+const navigation = performance.getEntriesByType('navigation')[0];
+const resources = performance.getEntriesByType('resource').map(entry => ({
+    name: entry.name,
+    type: entry.initiatorType,
+    start: entry.startTime,
+    duration: entry.duration,
+    transfer_size: entry.transferSize
+}));
+return {navigation: navigation ? navigation.toJSON() : null, resources: resources};
+"""
+
+
+def enable_performance_logging(options: Options):
+    """ChromeのオプションでNetworkイベントの performance ログを有効にする"""
+    options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+    options.add_experimental_option('perfLoggingPrefs', {'enableNetwork': True, 'enablePage': False})
+
+
+def navigation_phases(navigation: Dict) -> Dict[str, float]:
+    """Navigation Timing のエントリーからフェーズごとの所要時間（秒）を求める"""
+    tls = 0.0
+    if navigation.get('secureConnectionStart', 0) > 0:
+        tls = navigation['connectEnd'] - navigation['secureConnectionStart']
+    # load イベントが終わる前に計測した場合は DOMContentLoaded までを処理時間とする
+    processed = navigation.get('loadEventEnd') or navigation.get('domContentLoadedEventEnd') or 0
+    phases = {
+        'dns': navigation['domainLookupEnd'] - navigation['domainLookupStart'],
+        'connect': navigation['connectEnd'] - navigation['connectStart'] - tls,
+        'tls': tls,
+        'ttfb': navigation['responseStart'] - navigation['requestStart'],
+        'body': navigation['responseEnd'] - navigation['responseStart'],
+        'processing': processed - navigation['responseEnd'] if processed else 0.0
+    }
+    return {phase: max(value, 0.0) / 1000 for phase, value in phases.items()}
+
+
+def is_captcha_resource(url: str) -> bool:
+    return any(marker in url for marker in CAPTCHA_URL_MARKERS)
+
+
+def captcha_script_span(resources: List[Dict]) -> float:
+    """reCAPTCHA / Turnstile のスクリプトの最初の開始から最後の終了までの時間（秒）"""
+    scripts = [resource for resource in resources if resource['captcha'] and resource['type'] == 'script']
+    if not scripts:
+        return 0.0
+    start = min(resource['start'] for resource in scripts)
+    end = max(resource['start'] + resource['duration'] for resource in scripts)
+    return end - start
+
+
+def find_api_request(log_entries: List[Dict], api_path: str) -> Optional[Dict]:
+    """performance ログの Network イベントから、api_path への最後のPOSTの所要時間とステータスを求める"""
+    posts = {}
+    last_request_id = None
+    for entry in log_entries:
+        message = json.loads(entry['message'])['message']
+        method = message.get('method')
+        params = message.get('params', {})
+        if method == 'Network.requestWillBeSent':
+            request = params['request']
+            if request.get('method') == 'POST' and urlsplit(request['url']).path.rstrip('/') == api_path:
+                posts[params['requestId']] = {'sent': params['timestamp'], 'status': None, 'finished': None}
+                last_request_id = params['requestId']
+        elif params.get('requestId') in posts:
+            request = posts[params['requestId']]
+            if method == 'Network.responseReceived':
+                request['status'] = params['response']['status']
+            elif method in ('Network.loadingFinished', 'Network.loadingFailed'):
+                request['finished'] = params['timestamp']
+
+    if last_request_id is None:
+        return None
+    request = posts[last_request_id]
+    return {
+        'time': request['finished'] - request['sent'] if request['finished'] is not None else None,
+        'status': request['status']
+    }
+
+
+class PerformanceCapture:
+    """試行ごとにブラウザ側のパフォーマンスを記録する（ドライバーは enable_performance_logging で作ること）"""
+
+    def __init__(self, api_path: str = '/api/contact'):
+        self.api_path = api_path.rstrip('/')
+        self.page_fields = phase_fields('page_')
+
+    def begin(self, driver):
+        """試行の開始時に呼ぶ（再利用したドライバーに残っている前の試行のイベントを捨てる）"""
+        driver.get_log('performance')
+        driver.execute_cdp_cmd('Performance.enable', {})
+
+    def collect(self, driver, result: Dict):
+        """試行の終了時に呼び、計測値を結果レコードに書き込む"""
+        timings = driver.execute_script(_TIMING_SCRIPT)
+        if timings['navigation']:
+            phases = navigation_phases(timings['navigation'])
+            for phase, field in zip(PHASES, self.page_fields):
+                result[field] = phases[phase]
+
+        resources = [
+            {
+                'name': resource['name'],
+                'type': resource['type'],
+                'start': resource['start'] / 1000,
+                'duration': resource['duration'] / 1000,
+                'transfer_size': resource['transfer_size'],
+                'captcha': is_captcha_resource(resource['name'])
+            }
+            for resource in timings['resources']
+        ]
+        result['resource_timings'] = resources
+        result['captcha_script_time'] = captcha_script_span(resources)
+
+        api_request = find_api_request(driver.get_log('performance'), self.api_path)
+        if api_request is not None:
+            result['api_xhr_time'] = api_request['time']
+            result['api_xhr_status'] = api_request['status']
+
+        metrics = driver.execute_cdp_cmd('Performance.getMetrics', {})['metrics']
+        heap = {metric['name']: metric['value'] for metric in metrics}
+        result['js_heap_used'] = heap.get('JSHeapUsedSize')
+
+    def safe_collect(self, driver, result: Dict, thread_id: int, attempt: int):
+        """collect と同じ（計測に失敗しても試行自体の結果には影響させない）"""
+        try:
+            self.collect(driver, result)
+        except (WebDriverException, KeyError, TypeError, ValueError) as e:
+            logger.warning("Thread %s, Attempt %s: Performance capture failed: %s", thread_id, attempt, e)
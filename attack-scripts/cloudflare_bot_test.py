@@ -15,46 +15,135 @@ import logging
 import json
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
 import random
+import re
 import string
 
 from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import TimeoutException, WebDriverException
 from webdriver_manager.chrome import ChromeDriverManager
 import requests
 
+from browser_contexts import BrowserContextPool
+from browser_performance import PerformanceCapture, enable_performance_logging
+from latency_stats import ResultAggregator, aggregate
+from log_setup import configure_attempt_logging, parse_log_sample, result_outcome, setup_logging
+from live_metrics import LiveMetrics, describe_live_metrics, metrics_path
+from load_scheduler import OpenLoopScheduler, parse_rate
+from page_waits import has_challenge, prepare_driver, wait_for_challenge_cleared, wait_for_form, wait_for_result
+from request_timing import describe_phases, phase_fields, phase_report
+from result_binary import OUTPUT_FORMATS, write_binary_results
+from result_sink import StreamingResults, detach_streamed_results, result_stream_path
+from result_table import ResultTable, json_default
+from webdriver_pool import WebDriverPool
 
-# ログ設定
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('attack-scripts/cloudflare_bot_test.log'),
-        logging.StreamHandler()
-    ]
-)
+
+# ログ設定（書き込みはキュー経由でリスナースレッドが行う）
+setup_logging('attack-scripts/cloudflare_bot_test.log')
 logger = logging.getLogger(__name__)
+# 試行ごとのログ（--quiet / --log-sample の対象。引数は出力するときにだけ整形される）
+attempt_logger = logging.getLogger(f'{__name__}.attempts')
 
 
 class CloudflareBotTester:
     """Cloudflare Bot Fight Mode テスタークラス"""
     
-    def __init__(self, target_url: str, headless: bool = True, user_agent: Optional[str] = None):
+    # 統計情報で件数を数えるフラグと、平均・分布を出す時間の項目
+    STAT_FLAG_FIELDS = ('success', 'cloudflare_blocked', 'challenge_detected', 'recaptcha_found')
+    # js_heap_used はバイト数だが、分布は同じヒストグラムで出す
+    STAT_TIMING_FIELDS = (('service_time', 'driver_startup_time', 'interaction_time') + phase_fields('page_')
+                          + ('captcha_script_time', 'api_xhr_time', 'js_heap_used'))
+    # 結果テーブルの列（結果レコードのキーと同じ順）
+    RESULT_COLUMNS = {
+        'thread_id': 'int',
+        'attempt': 'int',
+        'timestamp': 'timestamp',
+        'success': 'flag',
+        'error': 'category',
+        'response_time': 'float',
+        'intended_start': 'float',
+        'actual_start': 'float',
+        'service_time': 'float',
+        'status_code': 'category',
+        'cloudflare_blocked': 'flag',
+        'recaptcha_found': 'flag',
+        'challenge_detected': 'flag',
+        'bot_score': 'float',
+        'driver_startup_time': 'float',
+        'driver_reused': 'flag',
+        'interaction_time': 'float',
+        # DevTools による計測（--devtools 指定時のみ。page_dns_time, ..., page_processing_time は Navigation Timing）
+        **{field: 'float' for field in phase_fields('page_')},
+        'resource_timings': 'object',
+        'captcha_script_time': 'float',
+        'api_xhr_time': 'float',
+        'api_xhr_status': 'category',
+        'js_heap_used': 'float'
+    }
+    
+    def __init__(self, target_url: str, headless: bool = True, user_agent: Optional[str] = None,
+                 use_driver_pool: bool = False,
+                 stream_results: bool = False, fsync_interval: float = 1.0, output_format: str = 'json',
+                 live_metrics: Optional[LiveMetrics] = None, capture_performance: bool = False,
+                 contexts_per_browser: int = 1):
         self.target_url = target_url
         self.headless = headless
         self.user_agent = user_agent
-        self.results = []
+        self.use_driver_pool = use_driver_pool
+        self.driver_pool = None
+        self._chromedriver_path = None
+        self.results = ResultTable(self.RESULT_COLUMNS)
+        self.aggregator = ResultAggregator(self.STAT_FLAG_FIELDS, self.STAT_TIMING_FIELDS)
+        self.target_rate = None
+        # Trueの場合、結果をメモリに溜めずJSONLファイルへ逐次書き出す
+        self.stream_results = stream_results
+        self.fsync_interval = fsync_interval
+        # 結果ファイルの形式（json / binary）
+        self.output_format = output_format
+        # 実行中のメトリクス（秒単位のウィンドウ・Prometheusエンドポイント）
+        self.live_metrics = live_metrics
+        # DevTools によるブラウザ側の計測（Navigation / Resource Timing・APIのXHR・JSヒープ）
+        self.performance_capture = PerformanceCapture() if capture_performance else None
+        # 2以上の場合、1つのChromeで複数の分離されたブラウザコンテキストを並行して使う
+        self.contexts_per_browser = contexts_per_browser
+        
+    def create_driver(self, debugger_address: Optional[str] = None) -> webdriver.Chrome:
+        """Chrome WebDriverを作成
         
-    def create_driver(self) -> webdriver.Chrome:
-        """Chrome WebDriverを作成"""
+        debugger_address を指定した場合は、Chromeを起動せずに起動済みのChromeに接続する。
+        """
         options = Options()
         
+        if debugger_address:
+            # 起動時の設定は接続先のChromeで済んでいる
+            options.debugger_address = debugger_address
+        else:
+            self._add_launch_options(options)
+        
+        # DevTools の Network イベントを performance ログに記録
+        if self.performance_capture:
+            enable_performance_logging(options)
+        
+        # WebDriverManagerを使用してChromeDriverを自動管理（パスは初回のみ解決）
+        if self._chromedriver_path is None:
+            self._chromedriver_path = ChromeDriverManager().install()
+        service = Service(self._chromedriver_path)
+        driver = webdriver.Chrome(service=service, options=options)
+        
+        # webdriver検知回避
+        driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+        
+        # ページ内で待機するスクリプト（page_waits）のタイムアウト
+        prepare_driver(driver)
+        
+        return driver
+    
+    def _add_launch_options(self, options: Options):
+        """Chromeの起動時の設定"""
         if self.headless:
             options.add_argument('--headless')
         
@@ -72,14 +161,27 @@ class CloudflareBotTester:
         if self.user_agent:
             options.add_argument(f'--user-agent={self.user_agent}')
         
-        # WebDriverManagerを使用してChromeDriverを自動管理
-        service = Service(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service, options=options)
-        
-        # webdriver検知回避
-        driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+        # 複数のコンテキストを並行して使う場合、前面にないタブのタイマーや描画を間引かせない
+        if self.contexts_per_browser > 1:
+            options.add_argument('--disable-background-timer-throttling')
+            options.add_argument('--disable-backgrounding-occluded-windows')
+            options.add_argument('--disable-renderer-backgrounding')
+    
+    def _acquire_driver(self) -> Tuple[webdriver.Chrome, float]:
+        """ドライバーを取得し、(ドライバー, 起動時間) を返す（プール使用時は再利用）"""
+        if self.driver_pool:
+            return self.driver_pool.acquire()
         
-        return driver
+        launch_start = time.time()
+        driver = self.create_driver()
+        return driver, time.time() - launch_start
+    
+    def _release_driver(self, driver: webdriver.Chrome, healthy: bool):
+        """ドライバーを返却（プール未使用時は終了）"""
+        if self.driver_pool:
+            self.driver_pool.release(driver, healthy=healthy)
+        else:
+            driver.quit()
     
     def generate_random_email(self) -> str:
         """ランダムなメールアドレスを生成"""
@@ -99,9 +201,13 @@ class CloudflareBotTester:
         ]
         return random.choice(messages)
     
-    def submit_contact_form(self, thread_id: int, attempt: int) -> Dict:
-        """コンタクトフォームを送信"""
-        start_time = time.time()
+    def submit_contact_form(self, thread_id: int, attempt: int, intended_start: Optional[float] = None) -> Dict:
+        """コンタクトフォームを送信
+        
+        intended_start を指定した場合、response_time は予定開始時刻から計測する。
+        """
+        actual_start = time.time()
+        start_time = intended_start if intended_start is not None else actual_start
         result = {
             'thread_id': thread_id,
             'attempt': attempt,
@@ -109,57 +215,75 @@ class CloudflareBotTester:
             'success': False,
             'error': None,
             'response_time': 0,
+            'intended_start': start_time,
+            'actual_start': actual_start,
+            'service_time': 0,
             'status_code': None,
             'cloudflare_blocked': False,
             'recaptcha_found': False,
             'challenge_detected': False,
-            'bot_score': None
+            'bot_score': None,
+            'driver_startup_time': 0,
+            'driver_reused': False,
+            'interaction_time': 0,
+            'page_dns_time': 0,
+            'page_connect_time': 0,
+            'page_tls_time': 0,
+            'page_ttfb_time': 0,
+            'page_body_time': 0,
+            'page_processing_time': 0,
+            'resource_timings': None,
+            'captcha_script_time': 0,
+            'api_xhr_time': None,
+            'api_xhr_status': None,
+            'js_heap_used': None
         }
         
         driver = None
+        driver_healthy = True
+        interaction_start = None
         try:
-            driver = self.create_driver()
+            driver, startup_time = self._acquire_driver()
+            result['driver_startup_time'] = startup_time
+            result['driver_reused'] = startup_time == 0
+            interaction_start = time.time()
+            if self.performance_capture:
+                self.performance_capture.begin(driver)
             
             # ページにアクセス
-            logger.info(f"Thread {thread_id}, Attempt {attempt}: Accessing {self.target_url}")
+            attempt_logger.info("Thread %s, Attempt %s: Accessing %s", thread_id, attempt, self.target_url)
             driver.get(self.target_url)
             
-            # ページの読み込み待機
-            wait = WebDriverWait(driver, 10)
-            
-            # Cloudflareのチャレンジページをチェック
-            if "cloudflare" in driver.title.lower() or "checking your browser" in driver.page_source.lower():
+            # Cloudflareのチャレンジページをチェック（DOMを転送せずにページ内で判定）
+            if has_challenge(driver):
                 result['challenge_detected'] = True
-                logger.warning(f"Thread {thread_id}, Attempt {attempt}: Cloudflare challenge detected")
+                attempt_logger.warning("Thread %s, Attempt %s: Cloudflare challenge detected", thread_id, attempt)
                 
-                # チャレンジを待機（最大30秒）
-                challenge_wait = WebDriverWait(driver, 30)
+                # チャレンジの文言が消えるまでページ内の MutationObserver で待機（最大30秒）
                 try:
-                    challenge_wait.until_not(
-                        lambda d: "checking your browser" in d.page_source.lower()
-                    )
-                    logger.info(f"Thread {thread_id}, Attempt {attempt}: Challenge passed")
+                    wait_for_challenge_cleared(driver, timeout=30)
+                    attempt_logger.info("Thread %s, Attempt %s: Challenge passed", thread_id, attempt)
                 except TimeoutException:
                     result['cloudflare_blocked'] = True
                     result['error'] = "Cloudflare challenge failed"
-                    logger.error(f"Thread {thread_id}, Attempt {attempt}: Challenge failed")
+                    attempt_logger.error("Thread %s, Attempt %s: Challenge failed", thread_id, attempt)
                     return result
             
-            # フォーム要素を取得
+            # フォーム要素が揃うまで待機し、要素と reCAPTCHA の有無をまとめて取得
             try:
-                email_field = wait.until(EC.presence_of_element_located((By.ID, "email")))
-                message_field = driver.find_element(By.ID, "message")
-                submit_button = driver.find_element(By.CSS_SELECTOR, "button[type='submit']")
+                form = wait_for_form(driver, timeout=10)
             except TimeoutException:
                 result['error'] = "Form elements not found"
-                logger.error(f"Thread {thread_id}, Attempt {attempt}: Form elements not found")
+                attempt_logger.error("Thread %s, Attempt %s: Form elements not found", thread_id, attempt)
                 return result
+            email_field = form['email']
+            message_field = form['message']
+            submit_button = form['submit']
             
             # reCAPTCHAの存在確認
-            recaptcha_elements = driver.find_elements(By.CSS_SELECTOR, ".g-recaptcha, iframe[src*='recaptcha']")
-            if recaptcha_elements:
+            if form['recaptcha']:
                 result['recaptcha_found'] = True
-                logger.info(f"Thread {thread_id}, Attempt {attempt}: reCAPTCHA detected")
+                attempt_logger.info("Thread %s, Attempt %s: reCAPTCHA detected", thread_id, attempt)
             
             # フォームに入力
             email = self.generate_random_email()
@@ -178,118 +302,200 @@ class CloudflareBotTester:
             
             # 送信後の結果を待機
             try:
-                # 成功メッセージまたはエラーメッセージを待機
-                wait.until(
-                    EC.any_of(
-                        EC.presence_of_element_located((By.CSS_SELECTOR, ".bg-green-100")),  # 成功メッセージ
-                        EC.presence_of_element_located((By.CSS_SELECTOR, ".bg-red-100")),   # エラーメッセージ
-                        EC.presence_of_element_located((By.CSS_SELECTOR, "[class*='error']"))
-                    )
-                )
+                # 成功メッセージまたはエラーメッセージが出るまでページ内で待機し、
+                # 成功かどうかとBotスコアの表示をページ内で判定して受け取る
+                outcome = wait_for_result(driver, timeout=10)
                 
-                # ページの内容をチェック
-                page_source = driver.page_source.lower()
-                
-                if "お問い合わせありがとうございます" in page_source or "success" in page_source:
+                if outcome['success']:
                     result['success'] = True
-                    logger.info(f"Thread {thread_id}, Attempt {attempt}: Form submission successful")
+                    attempt_logger.info("Thread %s, Attempt %s: Form submission successful", thread_id, attempt)
                 else:
                     result['error'] = "Form submission failed"
-                    logger.warning(f"Thread {thread_id}, Attempt {attempt}: Form submission failed")
+                    attempt_logger.warning("Thread %s, Attempt %s: Form submission failed", thread_id, attempt)
                 
-                # Bot スコア情報を取得
-                try:
-                    bot_score_element = driver.find_element(By.CSS_SELECTOR, "[data-testid='bot-score-display']")
-                    if bot_score_element:
-                        score_text = bot_score_element.text
-                        # スコアを抽出（例: "Bot Score: 0.85" から 0.85 を抽出）
-                        import re
-                        score_match = re.search(r'(\d+\.?\d*)', score_text)
-                        if score_match:
-                            result['bot_score'] = float(score_match.group(1))
-                except:
-                    pass  # Bot スコア要素が見つからない場合は無視
+                # Bot スコア情報を取得（例: "Bot Score: 0.85" から 0.85 を抽出）
+                if outcome['bot_score_text']:
+                    score_match = re.search(r'(\d+\.?\d*)', outcome['bot_score_text'])
+                    if score_match:
+                        result['bot_score'] = float(score_match.group(1))
                 
             except TimeoutException:
                 result['error'] = "Response timeout"
-                logger.warning(f"Thread {thread_id}, Attempt {attempt}: Response timeout")
+                attempt_logger.warning("Thread %s, Attempt %s: Response timeout", thread_id, attempt)
             
         except WebDriverException as e:
+            driver_healthy = False
             result['error'] = f"WebDriver error: {str(e)}"
-            logger.error(f"Thread {thread_id}, Attempt {attempt}: WebDriver error: {e}")
+            attempt_logger.error("Thread %s, Attempt %s: WebDriver error: %s", thread_id, attempt, e)
         except Exception as e:
             result['error'] = f"Unexpected error: {str(e)}"
-            logger.error(f"Thread {thread_id}, Attempt {attempt}: Unexpected error: {e}")
+            attempt_logger.error("Thread %s, Attempt %s: Unexpected error: %s", thread_id, attempt, e)
         finally:
-            if driver:
-                driver.quit()
+            end_time = time.time()
+            result['response_time'] = end_time - start_time
+            result['service_time'] = end_time - actual_start
+            if interaction_start is not None:
+                result['interaction_time'] = end_time - interaction_start
+            
+            # 計測値の取得は試行の時間に含めない
+            if driver and driver_healthy and self.performance_capture:
+                self.performance_capture.safe_collect(driver, result, thread_id, attempt)
             
-            result['response_time'] = time.time() - start_time
+            if driver:
+                self._release_driver(driver, driver_healthy)
         
         return result
     
-    def run_test(self, num_requests: int = 50, num_threads: int = 5, delay: float = 0.1) -> Dict:
-        """テストを実行"""
+    def run_test(self, num_requests: int = 50, num_threads: int = 5, delay: float = 0.1,
+                 rate: Optional[float] = None) -> Dict:
+        """テストを実行
+        
+        rate (req/s) を指定するとオープンループで一定レートで発行し、delay は無視する。
+        """
+        self.target_rate = rate
         logger.info(f"Starting Cloudflare Bot Fight Mode test")
         logger.info(f"Target URL: {self.target_url}")
         logger.info(f"Number of requests: {num_requests}")
         logger.info(f"Number of threads: {num_threads}")
-        logger.info(f"Delay between requests: {delay}s")
+        if rate:
+            logger.info(f"Target arrival rate: {rate:.2f} req/s (open-loop)")
+        else:
+            logger.info(f"Delay between requests: {delay}s")
         logger.info(f"Headless mode: {self.headless}")
+        logger.info(f"Driver pool: {'enabled' if self.use_driver_pool else 'disabled'}")
+        if self.contexts_per_browser > 1:
+            logger.info(f"Browser contexts per Chrome: {self.contexts_per_browser}")
         
+        pool_warmup_time = 0
+        if self.contexts_per_browser > 1:
+            # スレッド数と同じ数のコンテキストを、contexts_per_browser 個ずつのChromeに事前に作っておく
+            self.driver_pool = BrowserContextPool(self.create_driver, size=num_threads,
+                                                  contexts_per_browser=self.contexts_per_browser)
+            warmup_start = time.time()
+            self.driver_pool.warm_up()
+            pool_warmup_time = time.time() - warmup_start
+            logger.info(f"Browser context pool warmed up in {pool_warmup_time:.2f}s")
+        elif self.use_driver_pool:
+            # スレッド数と同じ数のChromeを事前に起動しておく（起動時間は計測から除外）
+            target = urlsplit(self.target_url)
+            self.driver_pool = WebDriverPool(self.create_driver, size=num_threads,
+                                             origins=[f"{target.scheme}://{target.netloc}"])
+            warmup_start = time.time()
+            self.driver_pool.warm_up()
+            pool_warmup_time = time.time() - warmup_start
+            logger.info(f"Driver pool warmed up in {pool_warmup_time:.2f}s")
+        
+        self._open_results()
         start_time = time.time()
         
+        try:
+            self._execute(num_requests, num_threads, delay, rate)
+        finally:
+            if self.driver_pool:
+                self.driver_pool.close()
+            self._close_results()
+        
+        total_time = time.time() - start_time
+        
+        # 統計情報を計算
+        stats = self.calculate_statistics(total_time)
+        stats['performance']['pool_warmup_time'] = pool_warmup_time
+        # Chromeの数・コンテキスト数とコンテキストあたりのメモリ使用量
+        stats['performance']['browser_contexts'] = (self.driver_pool.report()
+                                                    if isinstance(self.driver_pool, BrowserContextPool) else None)
+        
+        # 結果をファイルに保存
+        self.save_results(stats)
+        
+        return stats
+    
+    def _execute(self, num_requests: int, num_threads: int, delay: float, rate: Optional[float] = None):
+        """リクエストを発行し、完了順に self.results に追加"""
         with ThreadPoolExecutor(max_workers=num_threads) as executor:
             futures = []
             
-            for i in range(num_requests):
-                thread_id = i % num_threads
-                future = executor.submit(self.submit_contact_form, thread_id, i)
-                futures.append(future)
-                
-                # リクエスト間隔制御
-                if delay > 0:
-                    time.sleep(delay)
+            if rate:
+                # オープンループ: 前のリクエストの完了を待たずに時刻表どおり発行
+                for i, intended_start in OpenLoopScheduler(rate).ticks(num_requests):
+                    thread_id = i % num_threads
+                    futures.append(self._observe(executor.submit(self.submit_contact_form, thread_id, i, intended_start)))
+            else:
+                for i in range(num_requests):
+                    thread_id = i % num_threads
+                    future = self._observe(executor.submit(self.submit_contact_form, thread_id, i))
+                    futures.append(future)
+                    
+                    # リクエスト間隔制御
+                    if delay > 0:
+                        time.sleep(delay)
             
             # 結果を収集
             for future in as_completed(futures):
                 try:
                     result = future.result()
-                    self.results.append(result)
+                    self._record_result(result)
                     
                     # リアルタイムでログ出力
-                    status = "SUCCESS" if result['success'] else "FAILED"
-                    error_info = f" ({result['error']})" if result['error'] else ""
-                    logger.info(f"Thread {result['thread_id']}, Attempt {result['attempt']}: {status}{error_info}")
+                    self._log_result(result)
                     
                 except Exception as e:
                     logger.error(f"Error processing result: {e}")
-        
-        total_time = time.time() - start_time
-        
-        # 統計情報を計算
-        stats = self.calculate_statistics(total_time)
-        
-        # 結果をファイルに保存
-        self.save_results(stats)
-        
-        return stats
+    
+    def _log_result(self, result: Dict):
+        """完了した試行の結果をリアルタイムでログ出力"""
+        if not attempt_logger.isEnabledFor(logging.INFO):
+            return
+        status = "SUCCESS" if result['success'] else "FAILED"
+        error_info = f" ({result['error']})" if result['error'] else ""
+        outcome = result_outcome(result)
+        attempt_logger.info("Thread %s, Attempt %s: %s%s", result['thread_id'], result['attempt'],
+                            status, error_info, extra={'outcome': outcome})
+    
+    def _open_results(self):
+        """結果の保存先を準備（ストリーム時はJSONLファイルに逐次書き出す）"""
+        if self.stream_results:
+            self.results = StreamingResults(result_stream_path('cloudflare_test'), self.fsync_interval)
+            logger.info(f"Streaming results to: {self.results.path}")
+        if self.live_metrics is not None:
+            self.live_metrics.start()
+    
+    def _close_results(self):
+        """結果ストリームを閉じる（残りを書き出してfsync）"""
+        if isinstance(self.results, StreamingResults):
+            self.results.close()
+        if self.live_metrics is not None:
+            self.live_metrics.stop()
+    
+    def _observe(self, future):
+        """ライブメトリクスが有効なら、完了した時点で結果を記録させる
+
+        結果の収集ループは送信がすべて終わってから回るので、ライブメトリクスは Future の完了で記録する。
+        """
+        if self.live_metrics is not None:
+            future.add_done_callback(self.live_metrics.observe)
+        return future
+    
+    def _record_result(self, result: Dict):
+        """完了した結果を保存し、集計器を更新"""
+        self.results.append(result)
+        self.aggregator.add(result)
     
     def calculate_statistics(self, total_time: float) -> Dict:
         """統計情報を計算"""
-        total_requests = len(self.results)
-        successful_requests = sum(1 for r in self.results if r['success'])
-        failed_requests = total_requests - successful_requests
+        stats = self.aggregator
+        if stats.total != len(self.results):
+            # self.results が外部から設定された場合などは1回の走査で集計し直す
+            stats = aggregate(self.results, self.STAT_FLAG_FIELDS, self.STAT_TIMING_FIELDS)
         
-        cloudflare_blocks = sum(1 for r in self.results if r['cloudflare_blocked'])
-        challenges_detected = sum(1 for r in self.results if r['challenge_detected'])
-        recaptcha_found = sum(1 for r in self.results if r['recaptcha_found'])
+        total_requests = stats.total
+        successful_requests = stats.flags['success']
+        failed_requests = total_requests - successful_requests
         
-        response_times = [r['response_time'] for r in self.results if r['response_time'] > 0]
-        avg_response_time = sum(response_times) / len(response_times) if response_times else 0
+        cloudflare_blocks = stats.flags['cloudflare_blocked']
+        challenges_detected = stats.flags['challenge_detected']
+        recaptcha_found = stats.flags['recaptcha_found']
         
-        bot_scores = [r['bot_score'] for r in self.results if r['bot_score'] is not None]
-        avg_bot_score = sum(bot_scores) / len(bot_scores) if bot_scores else None
+        latency = stats.latency_report()
         
         return {
             'test_summary': {
@@ -298,36 +504,66 @@ class CloudflareBotTester:
                 'total_requests': total_requests,
                 'successful_requests': successful_requests,
                 'failed_requests': failed_requests,
-                'success_rate': (successful_requests / total_requests * 100) if total_requests > 0 else 0
+                'success_rate': stats.rate('success')
             },
             'cloudflare_detection': {
                 'blocks': cloudflare_blocks,
                 'challenges_detected': challenges_detected,
-                'challenge_rate': (challenges_detected / total_requests * 100) if total_requests > 0 else 0
+                'challenge_rate': stats.rate('challenge_detected')
             },
             'recaptcha_info': {
                 'found_instances': recaptcha_found,
-                'detection_rate': (recaptcha_found / total_requests * 100) if total_requests > 0 else 0
+                'detection_rate': stats.rate('recaptcha_found')
             },
             'performance': {
-                'avg_response_time': avg_response_time,
-                'requests_per_second': total_requests / total_time if total_time > 0 else 0
-            },
-            'bot_scores': {
-                'avg_score': avg_bot_score,
-                'total_scores_received': len(bot_scores),
-                'scores': bot_scores
+                'load_model': 'open-loop' if self.target_rate else 'closed-loop',
+                'target_rate': self.target_rate,
+                'avg_response_time': stats.response_times.mean,
+                'avg_service_time': stats.mean('service_time'),
+                # 予定開始時刻から実際の開始までの遅れ（オープンループ時の送信側の詰まり）
+                'avg_start_lag': stats.start_lags.mean,
+                # Chrome起動時間とページ操作時間を分けて集計
+                'avg_driver_startup_time': stats.mean('driver_startup_time'),
+                'avg_interaction_time': stats.mean('interaction_time'),
+                'driver_launches': stats.timings['driver_startup_time'].count,
+                'requests_per_second': total_requests / total_time if total_time > 0 else 0,
+                'latency': latency['overall'],
+                'latency_by_status_code': latency['by_status_code']
             },
+            'bot_scores': stats.bot_scores.summary(),
+            # DevTools による計測の要約（--devtools 指定時のみ）
+            'browser_performance': self._browser_performance(stats) if self.performance_capture else None,
+            # 実行中のメトリクスの時系列ファイルと、防御応答が出始めた時刻
+            'live_metrics': self.live_metrics.summary() if self.live_metrics else None,
             'detailed_results': self.results
         }
     
+    @staticmethod
+    def _browser_performance(stats: ResultAggregator) -> Dict:
+        """ページ読み込みのフェーズ・reCAPTCHA/Turnstile のスクリプト・APIのXHR・JSヒープの分布"""
+        return {
+            'page_phases': phase_report(stats, 'page_'),
+            'captcha_script_time': stats.timings['captcha_script_time'].summary(),
+            'api_xhr_time': stats.timings['api_xhr_time'].summary(),
+            'js_heap_used': stats.timings['js_heap_used'].summary()
+        }
+    
     def save_results(self, stats: Dict):
-        """結果をJSONファイルに保存"""
+        """結果をJSONファイル（output_format が binary の場合は .rbin ファイル）に保存"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        if self.output_format == 'binary':
+            filename = f"attack-scripts/cloudflare_test_results_{timestamp}.rbin"
+            write_binary_results(filename, stats, self.RESULT_COLUMNS)
+            logger.info(f"Results saved to: {filename}")
+            return
+        
         filename = f"attack-scripts/cloudflare_test_results_{timestamp}.json"
         
+        # ストリーム済みの詳細結果はJSONLファイルへの参照として保存
+        stats = detach_streamed_results(stats)
+        
         with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(stats, f, ensure_ascii=False, indent=2)
+            json.dump(stats, f, ensure_ascii=False, indent=2, default=json_default)
         
         logger.info(f"Results saved to: {filename}")
 
@@ -343,18 +579,63 @@ def main():
                        help='Number of concurrent threads (default: 5)')
     parser.add_argument('--delay', type=float, default=0.1,
                        help='Delay between requests in seconds (default: 0.1)')
+    parser.add_argument('--rate', type=parse_rate,
+                       help='Open-loop target arrival rate, e.g. 500/s or 30/m (overrides --delay)')
+    parser.add_argument('--stream-results', action='store_true',
+                       help='Write results incrementally to a JSONL file instead of keeping them in memory')
+    parser.add_argument('--fsync-interval', type=float, default=1.0,
+                       help='Seconds between fsyncs of the result stream (default: 1.0)')
+    parser.add_argument('--live-metrics', action='store_true',
+                       help='Keep per-interval windows of rate, latency, status codes and block/challenge counts '
+                            'and write them to a time-series JSONL file next to the results')
+    parser.add_argument('--metrics-port', type=int,
+                       help='Also serve the live metrics in Prometheus text format on 127.0.0.1:PORT/metrics '
+                            '(implies --live-metrics)')
+    parser.add_argument('--metrics-interval', type=float, default=1.0,
+                       help='Live metrics window length in seconds (default: 1.0)')
+    parser.add_argument('--output-format', choices=OUTPUT_FORMATS, default='json',
+                       help='Result file format: json, or binary (.rbin: fixed-width records read lazily with '
+                            'result_binary.py, exportable to JSON) (default: json)')
     parser.add_argument('--no-headless', action='store_true',
                        help='Run browser in non-headless mode (default: headless)')
     parser.add_argument('--user-agent', type=str,
                        help='Custom User-Agent string')
+    parser.add_argument('--driver-pool', action='store_true',
+                       help='Reuse a pool of warm Chrome instances (one per thread) instead of launching per attempt')
+    parser.add_argument('--contexts-per-browser', type=int, default=1,
+                       help='Run up to N isolated browser contexts (each with its own tab and WebDriver session) '
+                            'in each Chrome instance; --threads is the total number of contexts. Contexts are '
+                            'pre-created and recreated after each attempt (default: 1, one Chrome per thread)')
+    parser.add_argument('--devtools', action='store_true',
+                       help='Record browser-side performance per attempt via the Chrome DevTools Protocol: '
+                            'Navigation Timing phases, resource timings (incl. reCAPTCHA/Turnstile scripts), '
+                            'the /api/contact XHR latency and the JS heap size')
+    parser.add_argument('--quiet', action='store_true',
+                       help='Do not log per-attempt messages (run-level messages and the summary are still printed)')
+    parser.add_argument('--log-sample', type=parse_log_sample,
+                       help='Log only 1 in N per-attempt messages per outcome/level, e.g. 100 (successes and info) '
+                            'or success=100,info=100,warning=10; blocks and errors are logged in full unless listed')
     
     args = parser.parse_args()
+    configure_attempt_logging(attempt_logger, quiet=args.quiet, sample=args.log_sample)
+    
+    live_metrics = None
+    if args.live_metrics or args.metrics_port is not None:
+        live_metrics = LiveMetrics('cloudflare_test', metrics_path('cloudflare_test'), interval=args.metrics_interval,
+                                   port=args.metrics_port)
     
     # テスターを初期化
     tester = CloudflareBotTester(
         target_url=args.url,
         headless=not args.no_headless,
-        user_agent=args.user_agent
+        user_agent=args.user_agent,
+        use_driver_pool=args.driver_pool,
+        stream_results=args.stream_results,
+        fsync_interval=args.fsync_interval,
+        output_format=args.output_format,
+        live_metrics=live_metrics,
+        capture_performance=args.devtools,
+        contexts_per_browser=args.contexts_per_browser
     )
     
     try:
@@ -362,7 +643,8 @@ def main():
         stats = tester.run_test(
             num_requests=args.requests,
             num_threads=args.threads,
-            delay=args.delay
+            delay=args.delay,
+            rate=args.rate
         )
         
         # 結果をコンソールに出力
@@ -377,9 +659,35 @@ def main():
         print(f"Success Rate: {stats['test_summary']['success_rate']:.1f}%")
         print(f"Requests/Second: {stats['performance']['requests_per_second']:.2f}")
         print(f"Avg Response Time: {stats['performance']['avg_response_time']:.2f}s")
+        latency = stats['performance']['latency']
+        print(f"Latency p50/p95/p99: {latency['p50']:.2f}s / {latency['p95']:.2f}s / {latency['p99']:.2f}s "
+              f"(max {latency['max']:.2f}s)")
+        print(f"Avg Driver Startup Time: {stats['performance']['avg_driver_startup_time']:.2f}s "
+              f"({stats['performance']['driver_launches']} launches)")
+        print(f"Avg Interaction Time: {stats['performance']['avg_interaction_time']:.2f}s")
+        browser_contexts = stats['performance']['browser_contexts']
+        if browser_contexts is not None:
+            memory = (f"{browser_contexts['memory_per_context'] / 1024 / 1024:.1f} MB per context "
+                      f"({browser_contexts['peak_memory_bytes'] / 1024 / 1024:.0f} MB peak)"
+                      if browser_contexts['memory_per_context'] is not None else "memory not measured")
+            print(f"Browser Contexts: {browser_contexts['browsers']} Chrome x "
+                  f"{browser_contexts['contexts_per_browser']} contexts, {memory}")
+        browser_performance = stats['browser_performance']
+        if browser_performance is not None:
+            print(f"Page Load Phases (avg): {describe_phases(browser_performance['page_phases'])}")
+            print(f"Avg reCAPTCHA/Turnstile Script Time: {browser_performance['captcha_script_time']['mean']:.3f}s")
+            print(f"Avg API XHR Time: {browser_performance['api_xhr_time']['mean']:.3f}s "
+                  f"(p95 {browser_performance['api_xhr_time']['p95']:.3f}s)")
+            print(f"Avg JS Heap Used: {browser_performance['js_heap_used']['mean'] / 1024 / 1024:.1f} MB")
+        if stats['performance']['target_rate']:
+            print(f"Target Rate: {stats['performance']['target_rate']:.2f} req/s (open-loop)")
+            print(f"Avg Service Time: {stats['performance']['avg_service_time']:.2f}s")
+            print(f"Avg Start Lag: {stats['performance']['avg_start_lag']:.3f}s")
         print(f"Cloudflare Challenges: {stats['cloudflare_detection']['challenges_detected']}")
         print(f"Challenge Rate: {stats['cloudflare_detection']['challenge_rate']:.1f}%")
         print(f"Cloudflare Blocks: {stats['cloudflare_detection']['blocks']}")
+        if stats['live_metrics'] is not None:
+            print(f"Live Metrics: {describe_live_metrics(stats['live_metrics'])}")
         print(f"reCAPTCHA Found: {stats['recaptcha_info']['found_instances']}")
         
         if stats['bot_scores']['avg_score'] is not None:
@@ -0,0 +1,127 @@
+"""
+AIMD（加算的増加・乗算的減少）の同時実行数リミッター
+
+対象が 429 やチャレンジ（503 など）を返し始めても固定の同時実行数で送り続けると、以降のリクエストの
+多くが無駄になり、結果もほとんどノイズになります。AIMDLimiter は完了した結果を見て、
+スロットリングの応答があれば同時実行数の上限を乗算的に下げ、なければ1ウィンドウ（上限件数の完了）ごとに
+1ずつ上げて様子を見ます（TCPの輻輳制御と同じ考え方）。
+
+減少は「前回下げた後に開始したリクエスト」の応答でのみ行います。下げる前から飛んでいたリクエストが
+まとめてスロットリングされても、上限が一気に最小まで落ちないようにするためです。
+
+上限の推移は時系列（経過秒, 上限, 実行中の数）として記録し、結果ファイルに保存できます。
+"""
+
+import asyncio
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+
+class AIMDLimiter:
+    """スロットリングの応答に応じて同時実行数の上限を調整するリミッター（スレッド・asyncio両用）"""
+
+    def __init__(self, max_limit: int, min_limit: int = 1, initial_limit: Optional[int] = None,
+                 decrease_factor: float = 0.5, increase: float = 1.0,
+                 throttled: Optional[Callable[[Dict], bool]] = None):
+        if not 1 <= min_limit <= max_limit:
+            raise ValueError(f"Invalid concurrency range: {min_limit} - {max_limit}")
+        if not 0 < decrease_factor < 1:
+            raise ValueError(f"Decrease factor must be between 0 and 1: {decrease_factor}")
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.decrease_factor = decrease_factor
+        # 1ウィンドウ（上限と同じ件数の完了）あたりに増やす量
+        self.increase = increase
+        # 結果レコードがスロットリングの応答か判定する関数
+        self.throttled = throttled or (lambda result: result.get('status_code') == 429)
+        self.limit = float(initial_limit if initial_limit is not None else max_limit)
+        self.in_flight = 0
+        self.decreases = 0
+        self.throttled_responses = 0
+        self._last_decrease = 0.0
+        self._origin = time.monotonic()
+        self._series = [(0.0, int(self.limit), 0)]
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._async_available = None
+
+    @property
+    def current_limit(self) -> int:
+        return int(self.limit)
+
+    def acquire(self) -> float:
+        """空きができるまで待って1枠確保する（戻り値は開始時刻。release に渡す）"""
+        with self._available:
+            while self.in_flight >= int(self.limit):
+                self._available.wait()
+            self.in_flight += 1
+            return time.monotonic()
+
+    def release(self, result: Optional[Dict], started: float):
+        """1枠を返し、結果に応じて上限を調整する（result が None の場合は調整しない）"""
+        with self._available:
+            self.in_flight -= 1
+            if result is not None:
+                self._update(result, started)
+            self._available.notify(self._free_slots())
+
+    async def acquire_async(self) -> float:
+        """acquire() のasyncio版（イベントループ内でのみ使う）"""
+        if self._async_available is None:
+            self._async_available = asyncio.Condition()
+        async with self._async_available:
+            while self.in_flight >= int(self.limit):
+                await self._async_available.wait()
+            self.in_flight += 1
+            return time.monotonic()
+
+    async def release_async(self, result: Optional[Dict], started: float):
+        """release() のasyncio版"""
+        async with self._async_available:
+            self.in_flight -= 1
+            if result is not None:
+                self._update(result, started)
+            self._async_available.notify(self._free_slots())
+
+    def _free_slots(self) -> int:
+        # 待っている側は空きの数だけ起こす（全員を起こすと待ちが多いときに無駄な再判定が増える）
+        return max(0, int(self.limit) - self.in_flight)
+
+    def _update(self, result: Dict, started: float):
+        previous = int(self.limit)
+        if self.throttled(result):
+            self.throttled_responses += 1
+            if started >= self._last_decrease:
+                self.limit = max(float(self.min_limit), self.limit * self.decrease_factor)
+                self._last_decrease = time.monotonic()
+                self.decreases += 1
+        else:
+            self.limit = min(float(self.max_limit), self.limit + self.increase / self.limit)
+        if int(self.limit) != previous:
+            self._series.append((round(time.monotonic() - self._origin, 3), int(self.limit), self.in_flight))
+
+    def time_series(self) -> List[List]:
+        """上限が変わった時点の [経過秒, 上限, 実行中の数] のリスト"""
+        with self._lock:
+            return [list(point) for point in self._series]
+
+    def summary(self) -> Dict:
+        """結果ファイル用の要約（時間で重み付けした平均の上限を含む）"""
+        series = self.time_series()
+        elapsed = time.monotonic() - self._origin
+        weighted = 0.0
+        for (start, limit, _), (end, _, _) in zip(series, series[1:] + [[elapsed, None, None]]):
+            weighted += limit * (end - start)
+        limits = [limit for _, limit, _ in series]
+        return {
+            'adaptive': True,
+            'min_limit': self.min_limit,
+            'max_limit': self.max_limit,
+            'final_limit': int(self.limit),
+            'lowest_limit': min(limits),
+            'avg_limit': weighted / elapsed if elapsed > 0 else float(limits[-1]),
+            'decreases': self.decreases,
+            'throttled_responses': self.throttled_responses,
+            'time_series': series
+        }
@@ -0,0 +1,442 @@
+"""
+複数ホストでの分散実行（コーディネーターとワーカー）
+
+1台のマシンからの送信では、多数のクライアントからのトラフィックを再現できません。コーディネーターは
+1回のテストのリクエスト数と到着レートをワーカーに分割して割り当て、各ワーカーが返してくる結果レコードを
+受け取って1つのレポートにまとめます。
+
+プロトコルはTCP上の1行1メッセージのJSONです。
+
+    ワーカー → コーディネーター  hello   {version, host, pid}
+    コーディネーター → ワーカー  job     {worker_id, attempt_offset, num_requests, rate, ...テストの設定}
+                                 bye     割り当てがない場合（リクエスト数がワーカー数より少ないなど）
+    ワーカー → コーディネーター  ready   テスターの準備ができた
+    コーディネーター → ワーカー  start   全ワーカーの ready が揃った時点で一斉に送る
+    ワーカー → コーディネーター  results {records: [...]}（完了した結果をまとめて逐次送る）
+                                 heartbeat  heartbeat_interval 秒間ほかに何も送らなかった場合
+                                 done    {summary}（接続統計など、ワーカー側でしか分からない値）
+                                 error   {message}
+
+コーディネーターは read_timeout 秒間メッセージが届かないワーカー（ホストの停止やネットワークの切断）と、
+ready を返さずに切断したワーカーを lost として、残りのワーカーで続けます。ソケットには TCP keepalive も設定します。
+逆にワーカーは、開始後にコーディネーターとの接続が切れる（読み取りが終わる・送信に失敗する）と
+CoordinatorLost を送出して、割り当ての残りを送らずに終了します。
+
+開始は start の受信時刻に揃えるので、ホスト間で時計がずれていても送信の開始はずれません
+（結果レコードの timestamp / intended_start は各ワーカーの時計の値です）。
+localhost 上で複数のワーカーを起動すれば1台で動作を確認できます。
+"""
+
+import argparse
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from load_scheduler import shard_budget
+from result_table import json_default
+
+logger = logging.getLogger(__name__)
+
+PROTOCOL_VERSION = 2
+
+# この秒数ワーカーからメッセージが届かなければ lost とする（ワーカーはその1/3の間隔で heartbeat を送る）
+DEFAULT_READ_TIMEOUT = 30.0
+
+# TCP keepalive の設定（無通信になってから最初の確認までの秒数・確認の間隔・諦めるまでの回数）
+KEEPALIVE_OPTIONS = (('TCP_KEEPIDLE', 10), ('TCP_KEEPINTVL', 5), ('TCP_KEEPCNT', 3))
+
+
+def parse_address(text: str) -> Tuple[str, int]:
+    """'host:port' または ':port' を (host, port) に変換（host を省略した場合は全インターフェース）"""
+    host, separator, port = text.strip().rpartition(':')
+    try:
+        if not separator:
+            raise ValueError
+        port = int(port)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid address: {text!r} (expected host:port)")
+    if not 0 <= port <= 65535:
+        raise argparse.ArgumentTypeError(f"Invalid port: {text!r}")
+    return host.strip('[]') or '0.0.0.0', port
+
+
+def configure_socket(sock: socket.socket, timeout: Optional[float]):
+    """接続の設定（読み取りのタイムアウト、TCP_NODELAY、相手の停止を検知するための TCP keepalive）"""
+    sock.settimeout(timeout)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    # 既定では最初の確認まで2時間かかるので短くする（オプションがないプラットフォームでは既定のまま）
+    for name, value in KEEPALIVE_OPTIONS:
+        if hasattr(socket, name):
+            sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, name), value)
+
+
+def send_message(sock: socket.socket, message: Dict):
+    """メッセージを1行のJSONとして送る"""
+    line = json.dumps(message, ensure_ascii=False, separators=(',', ':'), default=json_default) + '\n'
+    sock.sendall(line.encode('utf-8'))
+
+
+class CoordinatorLost(ConnectionError):
+    """ワーカーの実行中にコーディネーターとの接続が切れた（残りの割り当ては送信しない）"""
+
+
+class MessageReader:
+    """ソケットから1行ずつメッセージを読む（接続が切れたら None を返し、理由を error に入れる）"""
+
+    def __init__(self, sock: socket.socket):
+        self._file = sock.makefile('r', encoding='utf-8', newline='\n')
+        self.error = None
+
+    def read(self) -> Optional[Dict]:
+        try:
+            line = self._file.readline()
+        except socket.timeout:
+            self.error = 'no message within the read timeout'
+            return None
+        except (OSError, ValueError) as e:
+            self.error = str(e) or type(e).__name__
+            return None
+        # 行の途中で切れた場合も切断として扱う
+        if not line.endswith('\n'):
+            self.error = 'connection closed'
+            return None
+        return json.loads(line)
+
+    def close(self):
+        self._file.close()
+
+
+class RemoteResults:
+    """ワーカー側で self.results の代わりに使う、結果をコーディネーターへ送る結果コレクション
+
+    1件ごとに送るとシステムコールが結果の数だけ増えるので、batch_size 件か interval 秒ごとにまとめて送る。
+    """
+
+    def __init__(self, sock: socket.socket, batch_size: int = 200, interval: float = 0.25):
+        self.sock = sock
+        self.batch_size = batch_size
+        self.interval = interval
+        self._pending = []
+        self._count = 0
+        self._last_flush = time.monotonic()
+        # heartbeat のスレッドと送信が混ざらないようにする
+        self._send_lock = threading.Lock()
+        self._last_send = time.monotonic()
+        # コーディネーターとの接続が切れた場合の CoordinatorLost（以降の送信と check で送出する）
+        self.lost = None
+
+    def append(self, record: Dict):
+        self.check()
+        self._pending.append(record)
+        self._count += 1
+        if len(self._pending) >= self.batch_size or time.monotonic() - self._last_flush >= self.interval:
+            self.flush()
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def flush(self):
+        if self._pending:
+            self.send({'type': 'results', 'records': self._pending})
+            self._pending = []
+        self._last_flush = time.monotonic()
+
+    def send(self, message: Dict):
+        self.check()
+        with self._send_lock:
+            try:
+                send_message(self.sock, message)
+            except OSError as e:
+                self._lose(str(e))
+                raise self.lost from e
+            self._last_send = time.monotonic()
+
+    def check(self):
+        """コーディネーターとの接続が切れていれば CoordinatorLost を送出する（テスターの送信ループから呼ぶ）"""
+        if self.lost is not None:
+            raise self.lost
+
+    def _lose(self, reason: str):
+        if self.lost is None:
+            self.lost = CoordinatorLost(f"Lost connection to the coordinator: {reason}")
+            logger.error(f"{self.lost}; not sending the remaining requests")
+
+    def watch(self, reader: MessageReader, finished: threading.Event):
+        """接続が切れるまで読み続ける（別スレッドで実行する）
+
+        開始後にコーディネーターから届くメッセージはないので、読み取りが終わったら接続が切れたとみなす。
+        """
+        while reader.read() is not None:
+            pass
+        if not finished.is_set():
+            self._lose(reader.error)
+
+    def send_heartbeats(self, interval: float, stop: threading.Event):
+        """stop が立つまで、interval 秒間何も送っていなければ heartbeat を送る（別スレッドで実行する）"""
+        while not stop.wait(interval):
+            with self._send_lock:
+                if time.monotonic() - self._last_send < interval:
+                    continue
+                try:
+                    send_message(self.sock, {'type': 'heartbeat'})
+                except OSError as e:
+                    self._lose(str(e))
+                    return
+                self._last_send = time.monotonic()
+
+    def close(self):
+        self.flush()
+
+    def __len__(self) -> int:
+        return self._count
+
+
+class Coordinator:
+    """ワーカーの接続を待ち、リクエスト数とレートを分割して割り当て、結果を集める"""
+
+    def __init__(self, address: Tuple[str, int], num_workers: int, accept_timeout: float = 60.0,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT):
+        if num_workers < 1:
+            raise ValueError(f"Number of workers must be >= 1: {num_workers}")
+        self.num_workers = num_workers
+        self.accept_timeout = accept_timeout
+        self.read_timeout = read_timeout
+        self._server = socket.create_server(address)
+        # port 0 を指定した場合は実際に割り当てられたポート
+        self.address = self._server.getsockname()[:2]
+        self._workers = []
+        # start を送った時刻（ワーカーの接続待ちを除いた実行時間の起点）
+        self.started_at = None
+
+    def _accept_workers(self):
+        """num_workers 台が接続するか accept_timeout 秒が経つまで待つ"""
+        deadline = time.monotonic() + self.accept_timeout
+        logger.info(f"Waiting for {self.num_workers} workers on {self.address[0]}:{self.address[1]}")
+        while len(self._workers) < self.num_workers:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._server.settimeout(remaining)
+            try:
+                sock, peer = self._server.accept()
+            except socket.timeout:
+                break
+            configure_socket(sock, self.read_timeout)
+            reader = MessageReader(sock)
+            hello = reader.read()
+            if not hello or hello.get('type') != 'hello' or hello.get('version') != PROTOCOL_VERSION:
+                logger.warning(f"Rejected worker {peer[0]}:{peer[1]}: unexpected handshake {hello!r}")
+                sock.close()
+                continue
+            worker = {
+                'worker_id': len(self._workers),
+                'address': f"{peer[0]}:{peer[1]}",
+                'host': hello.get('host'),
+                'pid': hello.get('pid'),
+                'sock': sock,
+                'reader': reader
+            }
+            self._workers.append(worker)
+            logger.info(f"Worker {worker['worker_id']} connected from {worker['address']} ({worker['host']})")
+
+        if not self._workers:
+            raise RuntimeError(f"No workers connected within {self.accept_timeout}s")
+        if len(self._workers) < self.num_workers:
+            logger.warning(f"Only {len(self._workers)} of {self.num_workers} workers connected; "
+                           f"splitting the run across them")
+
+    def run(self, num_requests: int, rate: Optional[float], job: Dict,
+            on_result: Callable[[Dict], None]) -> List[Dict]:
+        """テストを分散実行し、ワーカーごとの結果（割り当て・受信件数・状態・サマリー）を返す
+
+        job はすべてのワーカーに渡すテストの設定。rate は割り当てたワーカーで等分する。
+        on_result は受信した結果レコード（worker_id 付き）ごとに、呼び出し元のスレッドで呼ばれる。
+        """
+        try:
+            self._accept_workers()
+            shards = shard_budget(num_requests, len(self._workers))
+            assigned = self._workers[:len(shards)]
+            for worker in self._workers[len(shards):]:
+                send_message(worker['sock'], {'type': 'bye'})
+                worker['sock'].close()
+
+            # 割り当てを送り、全ワーカーの準備ができてから一斉に開始する
+            shard_rate = rate / len(shards) if rate else None
+            for worker, (attempt_offset, shard_requests) in zip(assigned, shards):
+                worker.update(attempt_offset=attempt_offset, requests=shard_requests, received=0,
+                              status='running', summary=None, error=None)
+                try:
+                    send_message(worker['sock'], dict(job, type='job', worker_id=worker['worker_id'],
+                                                      attempt_offset=attempt_offset, num_requests=shard_requests,
+                                                      rate=shard_rate, heartbeat_interval=self.read_timeout / 3))
+                except OSError as e:
+                    self._lose(worker, f"failed to send the job: {e}")
+            ready = []
+            for worker in assigned:
+                if worker['status'] != 'running':
+                    continue
+                message = worker['reader'].read()
+                if message and message.get('type') == 'ready':
+                    ready.append(worker)
+                else:
+                    self._lose(worker, f"failed to start: {message or worker['reader'].error}")
+            if not ready:
+                raise RuntimeError("No worker became ready")
+
+            self.started_at = time.time()
+            started = []
+            for worker in ready:
+                try:
+                    send_message(worker['sock'], {'type': 'start'})
+                    started.append(worker)
+                except OSError as e:
+                    self._lose(worker, f"failed to send start: {e}")
+            logger.info(f"Started {len(started)} workers: "
+                        f"{sum(worker['requests'] for worker in started)} of {num_requests} requests"
+                        + (f" at {shard_rate * len(started):.2f} req/s ({shard_rate:.2f} req/s each)"
+                           if rate else ""))
+
+            self._collect(started, on_result)
+        finally:
+            self.close()
+
+        return [
+            {key: worker[key] for key in ('worker_id', 'address', 'host', 'pid', 'attempt_offset', 'requests',
+                                          'received', 'status', 'error', 'summary')}
+            for worker in assigned
+        ]
+
+    @staticmethod
+    def _lose(worker: Dict, error: str):
+        """開始前に応答しなくなったワーカーを lost とし、接続を閉じる（割り当て分は送信されない）"""
+        worker['status'] = 'lost'
+        worker['error'] = error
+        logger.error(f"Worker {worker['worker_id']} lost: {error} "
+                     f"({worker['requests']} requests will not be sent)")
+        try:
+            worker['sock'].close()
+        except OSError:
+            pass
+
+    def _collect(self, workers: List[Dict], on_result: Callable[[Dict], None]):
+        """全ワーカーが終わるまで結果を受信（読み取りはワーカーごとのスレッド、処理は呼び出し元のスレッド）"""
+        inbox = queue.SimpleQueue()
+
+        def read_worker(worker: Dict):
+            reader = worker['reader']
+            while True:
+                message = reader.read()
+                inbox.put((worker, message))
+                if message is None or message.get('type') in ('done', 'error'):
+                    return
+
+        for worker in workers:
+            threading.Thread(target=read_worker, args=(worker,), daemon=True,
+                             name=f"coordinator-worker-{worker['worker_id']}").start()
+
+        running = len(workers)
+        while running:
+            worker, message = inbox.get()
+            kind = message.get('type') if message else None
+            if kind == 'heartbeat':
+                continue
+            if kind == 'results':
+                worker_id = worker['worker_id']
+                for record in message['records']:
+                    record['worker_id'] = worker_id
+                    on_result(record)
+                worker['received'] += len(message['records'])
+                continue
+
+            running -= 1
+            if kind == 'done':
+                worker['status'] = 'done'
+                worker['summary'] = message.get('summary')
+                logger.info(f"Worker {worker['worker_id']} finished: {worker['received']} results")
+            else:
+                worker['status'] = 'failed' if kind == 'error' else 'lost'
+                worker['error'] = message.get('message') if message else worker['reader'].error
+                logger.error(f"Worker {worker['worker_id']} {worker['status']}: {worker['error']} "
+                             f"({worker['received']} of {worker['requests']} results received)")
+
+    def close(self):
+        for worker in self._workers:
+            try:
+                worker['sock'].close()
+            except OSError:
+                pass
+        self._server.close()
+
+
+def run_worker(address: Tuple[str, int], run_job: Callable[[Dict, RemoteResults], Dict],
+               connect_timeout: float = 60.0) -> Optional[Dict]:
+    """コーディネーターに接続して割り当てられた1回分のテストを実行する
+
+    run_job(job, results) はテストを実行し、結果レコードを results に追加して、
+    コーディネーターに返すサマリーを返す。割り当てがなかった場合は None を返す。
+    コーディネーターより先に起動してもよいように、connect_timeout 秒までは接続を再試行する。
+    """
+    deadline = time.monotonic() + connect_timeout
+    while True:
+        try:
+            sock = socket.create_connection(address, timeout=10)
+            break
+        except OSError as e:
+            if time.monotonic() >= deadline:
+                raise ConnectionError(f"Could not connect to coordinator {address[0]}:{address[1]}: {e}")
+            time.sleep(0.5)
+    # コーディネーターは全ワーカーの接続を待ってから job を送るので、読み取りにはタイムアウトを付けない
+    configure_socket(sock, None)
+    reader = MessageReader(sock)
+
+    try:
+        send_message(sock, {'type': 'hello', 'version': PROTOCOL_VERSION, 'host': socket.gethostname(),
+                            'pid': os.getpid()})
+        job = reader.read()
+        if not job or job.get('type') != 'job':
+            logger.info("Coordinator has no work for this worker")
+            return None
+        logger.info(f"Worker {job['worker_id']}: {job['num_requests']} requests from attempt {job['attempt_offset']}"
+                    + (f" at {job['rate']:.2f} req/s" if job.get('rate') else ""))
+
+        send_message(sock, {'type': 'ready'})
+        start = reader.read()
+        if not start or start.get('type') != 'start':
+            raise ConnectionError("Coordinator closed the connection before start")
+
+        results = RemoteResults(sock)
+        # 割り当てを終えたら heartbeat と接続の監視を止める（以降の切断は正常な終了）
+        finished = threading.Event()
+        threading.Thread(target=results.watch, args=(reader, finished), daemon=True,
+                         name='worker-watch').start()
+        if job.get('heartbeat_interval'):
+            threading.Thread(target=results.send_heartbeats, args=(job['heartbeat_interval'], finished),
+                             daemon=True, name='worker-heartbeat').start()
+        try:
+            summary = run_job(job, results)
+            results.close()
+        except Exception as e:
+            finished.set()
+            # 接続が切れた場合は error を送れないので、そのまま終了する
+            if results.lost is None:
+                results.send({'type': 'error', 'message': str(e)})
+            raise
+        finally:
+            finished.set()
+        results.send({'type': 'done', 'summary': summary})
+        return summary
+    finally:
+        # 監視スレッドの読み取りを終わらせてから閉じる
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        reader.close()
+        sock.close()
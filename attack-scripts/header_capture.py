@@ -0,0 +1,123 @@
+"""
+レスポンスヘッダーの記録
+
+テスターはこれまで応答ごとに dict(response.headers) と cf- ヘッダーの辞書を結果レコードに保存していましたが、
+Server / Nel / Vary / Content-Type などはほぼすべての応答で同じ値です。HeaderCapture は応答ごとに値が
+変わるヘッダー（Date、CF-RAY、Report-To など）とそれ以外を分け、それ以外の組（ヘッダーセット）を
+1回だけ保持してレコードからはIDで参照します。cf- ヘッダーの抽出もヘッダーセットごとに1回だけ行います。
+
+記録のレベル（--capture-headers）:
+    none: ヘッダーを記録しない
+    cf:   Cloudflare関連のヘッダー（cloudflare_headers）のみ
+    all:  cf に加えて、応答ごとのヘッダー（response_headers）とヘッダーセットのID（header_set）
+
+ヘッダーセットのIDは内容のハッシュなので、別プロセスや別の実行で記録したものと突き合わせても衝突しません。
+"""
+
+import hashlib
+import json
+import threading
+from typing import Dict, Optional
+
+# ヘッダーの記録レベル
+HEADER_CAPTURE_LEVELS = ('none', 'cf', 'all')
+
+# 応答ごとに値が変わるヘッダー（小文字）。ヘッダーセットには含めずレコードに個別に保存する
+PER_RESPONSE_HEADERS = frozenset((
+    'date', 'age', 'expires', 'cf-ray', 'report-to', 'set-cookie', 'content-length'
+))
+
+
+def is_cloudflare_header(name: str) -> bool:
+    """Cloudflare関連のヘッダーか（cf- で始まるか、名前に cloudflare を含む）"""
+    lowered = name.lower()
+    return lowered.startswith('cf-') or 'cloudflare' in lowered
+
+
+def header_set_id(items) -> str:
+    """ヘッダーセットのID（ヘッダー名と値の並びのハッシュ）"""
+    canonical = json.dumps(list(items), ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()[:12]
+
+
+class HeaderCapture:
+    """応答ヘッダーを記録レベルに応じて結果レコードに書き込み、共通部分をヘッダーセットとして保持する"""
+
+    def __init__(self, level: str = 'all'):
+        if level not in HEADER_CAPTURE_LEVELS:
+            raise ValueError(f"Unknown header capture level: {level}")
+        self.level = level
+        # ヘッダーセットのID -> ヘッダーの辞書（結果ファイルの header_sets）
+        self.header_sets = {}
+        # (名前, 値) の並び -> (ID, そのうちの cf- ヘッダー)
+        self._interned = {}
+        # ヘッダー名 -> (応答ごとに変わるか, Cloudflare関連か)
+        self._names = {}
+        self._lock = threading.Lock()
+
+    def capture(self, result: Dict, headers):
+        """応答ヘッダーを結果レコードの response_headers / cloudflare_headers / header_set に記録"""
+        if self.level == 'none':
+            return
+
+        names = self._names
+        shared = []
+        per_response = {}
+        per_response_cf = None
+        for name, value in headers.items():
+            kind = names.get(name)
+            if kind is None:
+                kind = names[name] = (name.lower() in PER_RESPONSE_HEADERS, is_cloudflare_header(name))
+            if kind[0]:
+                per_response[name] = value
+                if kind[1]:
+                    if per_response_cf is None:
+                        per_response_cf = {}
+                    per_response_cf[name] = value
+            else:
+                shared.append((name, value))
+
+        key = tuple(shared)
+        interned = self._interned.get(key)
+        if interned is None:
+            interned = self._intern(key)
+        set_id, shared_cf = interned
+
+        cloudflare_headers = dict(shared_cf)
+        if per_response_cf:
+            cloudflare_headers.update(per_response_cf)
+        result['cloudflare_headers'] = cloudflare_headers
+
+        if self.level == 'all':
+            result['response_headers'] = per_response
+            result['header_set'] = set_id
+
+    def _intern(self, key: tuple):
+        """新しいヘッダーセットを登録（cf- ヘッダーの抽出はここで1回だけ行う）"""
+        set_id = header_set_id(key)
+        shared_cf = {name: value for name, value in key if is_cloudflare_header(name)}
+        with self._lock:
+            interned = self._interned.setdefault(key, (set_id, shared_cf))
+            if self.level == 'all':
+                self.header_sets.setdefault(set_id, dict(key))
+        return interned
+
+    def merge(self, header_sets: Dict[str, Dict]):
+        """別プロセスで記録したヘッダーセットを取り込む（IDは内容のハッシュなのでそのまま使える）"""
+        with self._lock:
+            for set_id, headers in header_sets.items():
+                self.header_sets.setdefault(set_id, headers)
+
+    def summary(self) -> Optional[Dict]:
+        """結果ファイルに保存するヘッダーセットの一覧（all 以外では None）"""
+        if self.level != 'all':
+            return None
+        with self._lock:
+            return dict(self.header_sets)
+
+
+def expand_headers(result: Dict, header_sets: Dict[str, Dict]) -> Dict:
+    """結果レコードのヘッダーセットIDと応答ごとのヘッダーから、応答ヘッダー全体を組み立てる"""
+    headers = dict(header_sets.get(result.get('header_set'), {}))
+    headers.update(result.get('response_headers') or {})
+    return headers
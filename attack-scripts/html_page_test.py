@@ -9,52 +9,137 @@ import time
 import argparse
 import logging
 import json
+import multiprocessing
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Dict, List
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional
 import random
 import string
-import re
 
 import requests
-from bs4 import BeautifulSoup
 
-# ログ設定
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('attack-scripts/html_page_test.log'),
-        logging.StreamHandler()
-    ]
-)
+from header_capture import HEADER_CAPTURE_LEVELS, HeaderCapture
+from http_sessions import SessionManager, merge_connection_stats
+from latency_stats import ResultAggregator, aggregate
+from page_analysis import HTML_ANALYZERS
+from page_cache import PAGE_MODES, PageCache
+from log_setup import configure_attempt_logging, flush_logging, parse_log_sample, result_outcome, setup_logging
+from live_metrics import LiveMetrics, QueuedMetrics, describe_live_metrics, metrics_path
+from load_scheduler import OpenLoopScheduler, parse_rate, shard_budget
+from request_timing import PhaseTimer, describe_phases, phase_fields, phase_report, timed_request
+from result_binary import OUTPUT_FORMATS, write_binary_results
+from result_sink import StreamingResults, detach_streamed_results, result_stream_path
+from result_table import ResultTable, json_default
+
+# ログ設定（書き込みはキュー経由でリスナースレッドが行う）
+setup_logging('attack-scripts/html_page_test.log')
 logger = logging.getLogger(__name__)
+# 試行ごとのログ（--quiet / --log-sample の対象。引数は出力するときにだけ整形される）
+attempt_logger = logging.getLogger(f'{__name__}.attempts')
+
+# ワーカープロセスが送ったライブメトリクスを、シャードの終了後に受け取り切るまで待つ最大秒数
+METRICS_FORWARD_TIMEOUT = 10.0
+
+# ワーカープロセスで結果を親プロセスのライブメトリクスに送る QueuedMetrics（_init_shard で設定）
+_shard_metrics = None
 
 
 class HTMLPageBotTester:
     """実際のHTMLページに対するBotテスタークラス"""
     
-    def __init__(self, target_url: str):
+    # 統計情報で件数を数えるフラグと、平均・分布を出す時間の項目
+    STAT_FLAG_FIELDS = ('success', 'cloudflare_blocked', 'challenge_detected', 'form_found', 'recaptcha_found',
+                        'page_not_modified', 'page_skipped')
+    STAT_TIMING_FIELDS = ('service_time', 'page_time', 'api_time') + phase_fields('page_') + phase_fields('api_')
+    # 結果テーブルの列（結果レコードのキーと同じ順）
+    RESULT_COLUMNS = {
+        'thread_id': 'int',
+        'attempt': 'int',
+        'timestamp': 'timestamp',
+        'success': 'flag',
+        'error': 'category',
+        'response_time': 'float',
+        'intended_start': 'float',
+        'actual_start': 'float',
+        'service_time': 'float',
+        'status_code': 'category',
+        'cloudflare_blocked': 'flag',
+        'challenge_detected': 'flag',
+        'page_title': 'category',
+        'form_found': 'flag',
+        'recaptcha_found': 'flag',
+        'page_not_modified': 'flag',
+        'page_skipped': 'flag',
+        'page_time': 'float',
+        'api_time': 'float',
+        # ページのGETとAPIへのPOSTそれぞれのフェーズごとの所要時間（page_dns_time, ..., api_processing_time）
+        **{field: 'float' for field in phase_fields('page_') + phase_fields('api_')},
+        'api_status_code': 'category',
+        'response_headers': 'mapping',
+        'cloudflare_headers': 'mapping',
+        'header_set': 'category'
+    }
+    
+    def __init__(self, target_url: str, per_worker_sessions: bool = False, pool_size: int = 10,
+                 keep_alive: bool = True, max_retries: int = 0,
+                 stream_results: bool = False, fsync_interval: float = 1.0, html_parser: str = 'fast',
+                 page_mode: str = 'every', capture_headers: str = 'all', output_format: str = 'json',
+                 live_metrics: Optional[LiveMetrics] = None):
         self.target_url = target_url
-        self.results = []
+        # HTML解析の実装（fast: 必要な要素だけを走査 / bs4: BeautifulSoupで全体を解析）
+        self.html_parser = html_parser
+        self.analyze_page = HTML_ANALYZERS[html_parser]
+        # ページ取得のモード（every / conditional / once）と、その解析結果のキャッシュ
+        self.page_mode = page_mode
+        self.page_cache = PageCache()
+        # レスポンスヘッダーの記録（none / cf / all）
+        self.header_capture = HeaderCapture(capture_headers)
+        self.results = ResultTable(self.RESULT_COLUMNS)
+        self.aggregator = ResultAggregator(self.STAT_FLAG_FIELDS, self.STAT_TIMING_FIELDS)
+        self.target_rate = None
+        # Trueの場合、結果をメモリに溜めずJSONLファイルへ逐次書き出す
+        self.stream_results = stream_results
+        self.fsync_interval = fsync_interval
+        # 結果ファイルの形式（json / binary）
+        self.output_format = output_format
+        # 実行中のメトリクス（秒単位のウィンドウ・Prometheusエンドポイント）
+        self.live_metrics = live_metrics
+        # ワーカープロセスで同じ設定のテスターを作るために保持
+        self.session_options = {
+            'per_worker_sessions': per_worker_sessions,
+            'pool_size': pool_size,
+            'keep_alive': keep_alive,
+            'max_retries': max_retries,
+            'html_parser': html_parser,
+            'page_mode': page_mode,
+            'capture_headers': capture_headers
+        }
+        self.shard_connection_stats = None
+        # マルチプロセス実行時のワーカー番号（結果レコードに付与）
+        self.process_id = None
         
         # セッションを作成（Cookieなどを保持）
-        self.session = requests.Session()
-        
         # 実際のブラウザのUser-Agentを設定
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/139.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
-            'Accept-Language': 'ja,en-US;q=0.9,en;q=0.8',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'DNT': '1',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-            'Sec-Fetch-Dest': 'document',
-            'Sec-Fetch-Mode': 'navigate',
-            'Sec-Fetch-Site': 'none',
-            'Sec-Fetch-User': '?1'
-        })
+        self.sessions = SessionManager(
+            headers={
+                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/139.0.0.0 Safari/537.36',
+                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
+                'Accept-Language': 'ja,en-US;q=0.9,en;q=0.8',
+                'Accept-Encoding': 'gzip, deflate, br',
+                'DNT': '1',
+                'Connection': 'keep-alive',
+                'Upgrade-Insecure-Requests': '1',
+                'Sec-Fetch-Dest': 'document',
+                'Sec-Fetch-Mode': 'navigate',
+                'Sec-Fetch-Site': 'none',
+                'Sec-Fetch-User': '?1'
+            },
+            per_worker=per_worker_sessions,
+            pool_size=pool_size,
+            keep_alive=keep_alive,
+            max_retries=max_retries
+        )
+        self.session = self.sessions.shared
     
     def generate_random_email(self) -> str:
         """ランダムなメールアドレスを生成"""
@@ -76,9 +161,13 @@ class HTMLPageBotTester:
         ]
         return random.choice(messages)
     
-    def access_page_and_submit_form(self, thread_id: int, attempt: int) -> Dict:
-        """HTMLページにアクセスしてフォームを送信"""
-        start_time = time.time()
+    def access_page_and_submit_form(self, thread_id: int, attempt: int, intended_start: Optional[float] = None) -> Dict:
+        """HTMLページにアクセスしてフォームを送信
+        
+        intended_start を指定した場合、response_time は予定開始時刻から計測する。
+        """
+        actual_start = time.time()
+        start_time = intended_start if intended_start is not None else actual_start
         result = {
             'thread_id': thread_id,
             'attempt': attempt,
@@ -86,97 +175,131 @@ class HTMLPageBotTester:
             'success': False,
             'error': None,
             'response_time': 0,
+            'intended_start': start_time,
+            'actual_start': actual_start,
+            'service_time': 0,
             'status_code': None,
             'cloudflare_blocked': False,
             'challenge_detected': False,
             'page_title': None,
             'form_found': False,
             'recaptcha_found': False,
+            'page_not_modified': False,
+            'page_skipped': False,
+            'page_time': 0,
+            'api_time': 0,
+            'page_dns_time': 0,
+            'page_connect_time': 0,
+            'page_tls_time': 0,
+            'page_ttfb_time': 0,
+            'page_body_time': 0,
+            'page_processing_time': 0,
+            'api_dns_time': 0,
+            'api_connect_time': 0,
+            'api_tls_time': 0,
+            'api_ttfb_time': 0,
+            'api_body_time': 0,
+            'api_processing_time': 0,
+            'api_status_code': None,
             'response_headers': {},
-            'cloudflare_headers': {}
+            'cloudflare_headers': {},
+            'header_set': None
         }
+        page_timer = PhaseTimer()
+        api_timer = PhaseTimer()
         
         try:
-            logger.info(f"Thread {thread_id}, Attempt {attempt}: Accessing {self.target_url}")
+            attempt_logger.info("Thread %s, Attempt %s: Accessing %s", thread_id, attempt, self.target_url)
             
             # Step 1: HTMLページにアクセス
             # Accept-Encodingを制限してBrotli圧縮を回避
             headers = self.session.headers.copy()
             headers['Accept-Encoding'] = 'gzip, deflate'
             
-            response = self.session.get(
-                self.target_url,
-                timeout=30,
-                headers=headers
-            )
-            
-            result['status_code'] = response.status_code
-            result['response_headers'] = dict(response.headers)
+            session = self.sessions.get()
+            cached_page = self.page_cache.get(session, self.target_url) if self.page_mode != 'every' else None
             
-            # Cloudflare関連のヘッダーを抽出
-            cloudflare_headers = {}
-            for header, value in response.headers.items():
-                if header.lower().startswith('cf-') or 'cloudflare' in header.lower():
-                    cloudflare_headers[header] = value
-            result['cloudflare_headers'] = cloudflare_headers
-            
-            # Cloudflareの検知を確認
-            if response.status_code == 403:
-                result['cloudflare_blocked'] = True
-                result['error'] = "Cloudflare blocked (403)"
-                logger.warning(f"Thread {thread_id}, Attempt {attempt}: Cloudflare blocked (403)")
-                return result
-            
-            elif response.status_code == 429:
-                result['error'] = "Rate limited (429)"
-                logger.warning(f"Thread {thread_id}, Attempt {attempt}: Rate limited (429)")
-                return result
-            
-            elif response.status_code in [503, 520, 521, 522, 523, 524]:
-                result['challenge_detected'] = True
-                result['error'] = f"Cloudflare challenge/error ({response.status_code})"
-                logger.warning(f"Thread {thread_id}, Attempt {attempt}: Cloudflare challenge/error ({response.status_code})")
-                return result
-            
-            if response.status_code != 200:
-                result['error'] = f"HTTP {response.status_code}"
-                logger.warning(f"Thread {thread_id}, Attempt {attempt}: HTTP {response.status_code}")
-                return result
-            
-            # Step 2: HTMLを解析
-            html_content = response.text.lower()
+            if self.page_mode == 'once' and cached_page is not None:
+                # このセッションでは取得済みなので、ページは取得せずAPIへの送信のみ行う
+                result['page_skipped'] = True
+                analysis = cached_page.analysis
+            else:
+                page_headers = headers
+                if cached_page is not None:
+                    page_headers = dict(headers, **cached_page.conditional_headers())
+                
+                page_start = time.time()
+                response, _ = timed_request(
+                    session,
+                    'GET',
+                    self.target_url,
+                    timer=page_timer,
+                    timeout=30,
+                    headers=page_headers
+                )
+                result['page_time'] = time.time() - page_start
+                
+                result['status_code'] = response.status_code
+                
+                # レスポンスヘッダーを記録レベルに応じて保存（Cloudflare関連のヘッダーの抽出を含む）
+                self.header_capture.capture(result, response.headers)
+                
+                # Cloudflareの検知を確認
+                if response.status_code == 403:
+                    result['cloudflare_blocked'] = True
+                    result['error'] = "Cloudflare blocked (403)"
+                    attempt_logger.warning("Thread %s, Attempt %s: Cloudflare blocked (403)", thread_id, attempt)
+                    return result
+                
+                elif response.status_code == 429:
+                    result['error'] = "Rate limited (429)"
+                    attempt_logger.warning("Thread %s, Attempt %s: Rate limited (429)", thread_id, attempt)
+                    return result
+                
+                elif response.status_code in [503, 520, 521, 522, 523, 524]:
+                    result['challenge_detected'] = True
+                    result['error'] = f"Cloudflare challenge/error ({response.status_code})"
+                    attempt_logger.warning("Thread %s, Attempt %s: Cloudflare challenge/error (%s)", thread_id, attempt, response.status_code)
+                    return result
+                
+                if response.status_code == 304 and cached_page is not None:
+                    # ページは変わっていないので前回の解析結果を再利用
+                    result['page_not_modified'] = True
+                    analysis = cached_page.analysis
+                elif response.status_code != 200:
+                    result['error'] = f"HTTP {response.status_code}"
+                    attempt_logger.warning("Thread %s, Attempt %s: HTTP %s", thread_id, attempt, response.status_code)
+                    return result
+                else:
+                    # Step 2: HTMLを解析（必要な要素だけを走査）
+                    processing_start = time.perf_counter()
+                    analysis = self.analyze_page(response.text)
+                    # フォームが見つかったページだけを再利用の対象にする
+                    if self.page_mode != 'every' and analysis['form_found']:
+                        self.page_cache.store(session, self.target_url, response, analysis)
+                    page_timer.add('processing', time.perf_counter() - processing_start)
             
             # Cloudflareチャレンジページの検出
-            if any(keyword in html_content for keyword in ['cloudflare', 'checking your browser', 'ddos protection', 'challenge']):
+            if analysis['challenge_detected']:
                 result['challenge_detected'] = True
-                logger.warning(f"Thread {thread_id}, Attempt {attempt}: Cloudflare challenge page detected")
-            
-            # BeautifulSoupでHTMLを解析
-            soup = BeautifulSoup(response.text, 'html.parser')
+                attempt_logger.warning("Thread %s, Attempt %s: Cloudflare challenge page detected", thread_id, attempt)
             
             # ページタイトルを取得
-            title = soup.find('title')
-            if title:
-                result['page_title'] = title.get_text().strip()
+            result['page_title'] = analysis['page_title']
             
             # フォームの存在確認
-            email_field = soup.find('input', {'id': 'email', 'type': 'email'})
-            message_field = soup.find('textarea', {'id': 'message'})
-            submit_button = soup.find('button', {'type': 'submit'})
-            
-            if email_field and message_field and submit_button:
+            if analysis['form_found']:
                 result['form_found'] = True
-                logger.info(f"Thread {thread_id}, Attempt {attempt}: Contact form found")
+                attempt_logger.info("Thread %s, Attempt %s: Contact form found", thread_id, attempt)
             else:
                 result['error'] = "Contact form not found"
-                logger.warning(f"Thread {thread_id}, Attempt {attempt}: Contact form not found")
+                attempt_logger.warning("Thread %s, Attempt %s: Contact form not found", thread_id, attempt)
                 return result
             
             # reCAPTCHAの存在確認
-            recaptcha_scripts = soup.find_all('script', src=re.compile(r'recaptcha|google\.com'))
-            if recaptcha_scripts or 'recaptcha' in html_content:
+            if analysis['recaptcha_found']:
                 result['recaptcha_found'] = True
-                logger.info(f"Thread {thread_id}, Attempt {attempt}: reCAPTCHA detected")
+                attempt_logger.info("Thread %s, Attempt %s: reCAPTCHA detected", thread_id, attempt)
             
             # Step 3: フォームデータを準備してAPIに送信
             email = self.generate_random_email()
@@ -201,125 +324,281 @@ class HTMLPageBotTester:
                 'Sec-Fetch-Site': 'same-origin'
             })
             
-            api_response = self.session.post(
+            api_start = time.time()
+            api_response, _ = timed_request(
+                session,
+                'POST',
                 api_url,
+                timer=api_timer,
                 json=form_data,
                 timeout=30,
                 headers=api_headers
             )
+            result['api_time'] = time.time() - api_start
+            result['api_status_code'] = api_response.status_code
+            if result['page_skipped']:
+                # ページを取得していない試行では、APIの応答をこの試行のステータスとする
+                result['status_code'] = api_response.status_code
+                self.header_capture.capture(result, api_response.headers)
             
             if api_response.status_code == 200:
                 try:
+                    processing_start = time.perf_counter()
                     api_data = api_response.json()
+                    api_timer.add('processing', time.perf_counter() - processing_start)
                     if api_data.get('success'):
                         result['success'] = True
-                        logger.info(f"Thread {thread_id}, Attempt {attempt}: Form submission successful")
+                        attempt_logger.info("Thread %s, Attempt %s: Form submission successful", thread_id, attempt)
                     else:
                         result['error'] = api_data.get('error', 'API error')
-                        logger.warning(f"Thread {thread_id}, Attempt {attempt}: API error: {result['error']}")
+                        attempt_logger.warning("Thread %s, Attempt %s: API error: %s", thread_id, attempt, result['error'])
                 except json.JSONDecodeError:
                     result['error'] = "Invalid API response"
-                    logger.error(f"Thread {thread_id}, Attempt {attempt}: Invalid API response")
+                    attempt_logger.error("Thread %s, Attempt %s: Invalid API response", thread_id, attempt)
             else:
                 result['error'] = f"API HTTP {api_response.status_code}"
-                logger.warning(f"Thread {thread_id}, Attempt {attempt}: API HTTP {api_response.status_code}")
+                attempt_logger.warning("Thread %s, Attempt %s: API HTTP %s", thread_id, attempt, api_response.status_code)
                 
         except requests.exceptions.Timeout:
             result['error'] = "Request timeout"
-            logger.error(f"Thread {thread_id}, Attempt {attempt}: Request timeout")
+            attempt_logger.error("Thread %s, Attempt %s: Request timeout", thread_id, attempt)
             
         except requests.exceptions.ConnectionError as e:
             result['error'] = f"Connection error: {str(e)}"
-            logger.error(f"Thread {thread_id}, Attempt {attempt}: Connection error: {e}")
+            attempt_logger.error("Thread %s, Attempt %s: Connection error: %s", thread_id, attempt, e)
             
         except Exception as e:
             result['error'] = f"Unexpected error: {str(e)}"
-            logger.error(f"Thread {thread_id}, Attempt {attempt}: Unexpected error: {e}")
+            attempt_logger.error("Thread %s, Attempt %s: Unexpected error: %s", thread_id, attempt, e)
         
         finally:
-            result['response_time'] = time.time() - start_time
+            end_time = time.time()
+            result['response_time'] = end_time - start_time
+            result['service_time'] = end_time - actual_start
+            page_timer.apply(result, 'page_')
+            api_timer.apply(result, 'api_')
         
         return result
     
-    def run_test(self, num_requests: int = 30, num_threads: int = 5, delay: float = 0.2) -> Dict:
-        """テストを実行"""
+    def run_test(self, num_requests: int = 30, num_threads: int = 5, delay: float = 0.2,
+                 rate: Optional[float] = None) -> Dict:
+        """テストを実行
+        
+        rate (req/s) を指定するとオープンループで一定レートで発行し、delay は無視する。
+        """
+        self.target_rate = rate
         logger.info(f"Starting HTML Page Bot Fight Mode test")
         logger.info(f"Target URL: {self.target_url}")
         logger.info(f"Number of requests: {num_requests}")
         logger.info(f"Number of threads: {num_threads}")
-        logger.info(f"Delay between requests: {delay}s")
+        if rate:
+            logger.info(f"Target arrival rate: {rate:.2f} req/s (open-loop)")
+        else:
+            logger.info(f"Delay between requests: {delay}s")
+        
+        self._open_results()
+        start_time = time.time()
+        
+        try:
+            self._execute(num_requests, num_threads, delay, rate)
+        finally:
+            self._close_results()
+        
+        total_time = time.time() - start_time
+        
+        # 統計情報を計算
+        stats = self.calculate_statistics(total_time)
+        
+        # 結果をファイルに保存
+        self.save_results(stats)
+        
+        return stats
+    
+    def run_test_multiprocess(self, num_processes: int, num_requests: int = 30, num_threads: int = 5,
+                              delay: float = 0.2, rate: Optional[float] = None) -> Dict:
+        """リクエスト数をN個のワーカープロセスに分割してテストを実行
+        
+        各プロセスが独自のテスターを持つため、HTML解析やJSON処理がGILで直列化されない。
+        親プロセスで detailed_results を結合し、統計情報を全体で再計算する。
+        """
+        self.target_rate = rate
+        logger.info(f"Starting HTML Page Bot Fight Mode test ({num_processes} processes)")
+        logger.info(f"Target URL: {self.target_url}")
+        logger.info(f"Number of requests: {num_requests}")
+        logger.info(f"Number of threads per process: {num_threads}")
+        if rate:
+            logger.info(f"Target arrival rate: {rate:.2f} req/s (open-loop, split across processes)")
+        else:
+            logger.info(f"Delay between requests: {delay}s (per process)")
         
+        shards = shard_budget(num_requests, num_processes)
+        shard_rate = rate / len(shards) if rate else None
+        
+        # ストリームのファイル名だけ先に決め、ファイルとライブメトリクスのスレッドはワーカープロセスの起動後に開く
+        # （開いたファイルやスレッドのロックを子プロセスに引き継がないように）
+        stream_path = result_stream_path('html_page_test') if self.stream_results else None
+        # ライブメトリクスは各プロセスの完了した結果をキューで受け取って記録する
+        metrics_queue = multiprocessing.Queue() if self.live_metrics is not None else None
+        metrics_fields = self.live_metrics.record_fields() if self.live_metrics is not None else ()
         start_time = time.time()
         
+        with ProcessPoolExecutor(max_workers=len(shards), initializer=_init_shard,
+                                 initargs=(metrics_queue, metrics_fields)) as executor:
+            futures = []
+            for shard_index, (attempt_offset, shard_requests) in enumerate(shards):
+                # ストリーム時は各プロセスが自分のJSONLファイルに書き出す
+                shard_stream_path = None
+                if stream_path:
+                    shard_stream_path = stream_path.replace('.jsonl', f'_shard{shard_index}.jsonl')
+                futures.append(executor.submit(
+                    _run_shard, self.target_url, self.session_options, shard_index, attempt_offset,
+                    shard_requests, num_threads, delay, shard_rate, shard_stream_path, self.fsync_interval
+                ))
+            
+            # ワーカープロセスは submit の時点で起動済み
+            self._open_results(stream_path)
+            forwarder = None
+            if metrics_queue is not None:
+                forwarder = self.live_metrics.forward_from(metrics_queue, len(shards))
+            try:
+                # 各プロセスの結果を結合
+                shard_connection_stats = []
+                for future in as_completed(futures):
+                    try:
+                        shard = future.result()
+                        if shard['result_file']:
+                            self.results.attach(shard['result_file'], shard['result_count'])
+                        else:
+                            self.results.extend(shard['results'])
+                        # 集計済みのヒストグラム・カウンタをマージ
+                        self.aggregator.merge(shard['aggregator'])
+                        self.header_capture.merge(shard['header_sets'])
+                        shard_connection_stats.append(shard['connection_stats'])
+                        logger.info(f"Shard finished: {shard['result_count']} results")
+                    except Exception as e:
+                        logger.error(f"Error processing shard: {e}")
+                if forwarder is not None:
+                    # キューに残っている分を記録し終えてからライブメトリクスを止める
+                    forwarder.join(METRICS_FORWARD_TIMEOUT)
+                    if forwarder.is_alive():
+                        logger.warning("Live metrics: some worker processes did not finish sending their results")
+            finally:
+                self._close_results()
+        
+        total_time = time.time() - start_time
+        self.shard_connection_stats = merge_connection_stats(shard_connection_stats)
+        
+        # 統計情報を全体で再計算
+        stats = self.calculate_statistics(total_time)
+        stats['test_summary']['processes'] = len(shards)
+        
+        # 結果をファイルに保存
+        self.save_results(stats)
+        
+        return stats
+    
+    def _execute(self, num_requests: int, num_threads: int, delay: float, rate: Optional[float] = None,
+                 attempt_offset: int = 0):
+        """リクエストを発行し、完了順に self.results に追加"""
         with ThreadPoolExecutor(max_workers=num_threads) as executor:
             futures = []
             
-            for i in range(num_requests):
-                thread_id = i % num_threads
-                future = executor.submit(self.access_page_and_submit_form, thread_id, i)
-                futures.append(future)
-                
-                # リクエスト間隔制御
-                if delay > 0:
-                    time.sleep(delay)
+            if rate:
+                # オープンループ: 前のリクエストの完了を待たずに時刻表どおり発行
+                for i, intended_start in OpenLoopScheduler(rate).ticks(num_requests):
+                    thread_id = i % num_threads
+                    futures.append(self._observe(executor.submit(self.access_page_and_submit_form, thread_id,
+                                                                 attempt_offset + i, intended_start)))
+            else:
+                for i in range(num_requests):
+                    thread_id = i % num_threads
+                    future = self._observe(executor.submit(self.access_page_and_submit_form, thread_id,
+                                                           attempt_offset + i))
+                    futures.append(future)
+                    
+                    # リクエスト間隔制御
+                    if delay > 0:
+                        time.sleep(delay)
             
             # 結果を収集
             for future in as_completed(futures):
                 try:
                     result = future.result()
-                    self.results.append(result)
+                    if self.process_id is not None:
+                        result['process_id'] = self.process_id
+                    self._record_result(result)
                     
                     # リアルタイムでログ出力
-                    status = "SUCCESS" if result['success'] else "FAILED"
-                    error_info = f" ({result['error']})" if result['error'] else ""
-                    cf_info = ""
-                    if result['cloudflare_blocked']:
-                        cf_info = " [CF-BLOCKED]"
-                    elif result['challenge_detected']:
-                        cf_info = " [CF-CHALLENGE]"
-                    
-                    form_info = " [FORM-FOUND]" if result['form_found'] else " [NO-FORM]"
-                    recaptcha_info = " [RECAPTCHA]" if result['recaptcha_found'] else ""
-                    
-                    logger.info(f"Thread {result['thread_id']}, Attempt {result['attempt']}: {status}{error_info}{cf_info}{form_info}{recaptcha_info}")
+                    self._log_result(result)
                     
                 except Exception as e:
                     logger.error(f"Error processing result: {e}")
+    
+    def _log_result(self, result: Dict):
+        """完了した試行の結果をリアルタイムでログ出力"""
+        if not attempt_logger.isEnabledFor(logging.INFO):
+            return
+        status = "SUCCESS" if result['success'] else "FAILED"
+        error_info = f" ({result['error']})" if result['error'] else ""
+        cf_info = ""
+        if result['cloudflare_blocked']:
+            cf_info = " [CF-BLOCKED]"
+        elif result['challenge_detected']:
+            cf_info = " [CF-CHALLENGE]"
+        outcome = result_outcome(result)
         
-        total_time = time.time() - start_time
-        
-        # 統計情報を計算
-        stats = self.calculate_statistics(total_time)
+        form_info = " [FORM-FOUND]" if result['form_found'] else " [NO-FORM]"
+        recaptcha_info = " [RECAPTCHA]" if result['recaptcha_found'] else ""
         
-        # 結果をファイルに保存
-        self.save_results(stats)
-        
-        return stats
+        attempt_logger.info("Thread %s, Attempt %s: %s%s%s%s%s", result['thread_id'], result['attempt'],
+                            status, error_info, cf_info, form_info, recaptcha_info, extra={'outcome': outcome})
+    
+    def _open_results(self, stream_path: Optional[str] = None):
+        """結果の保存先を準備（ストリーム時はJSONLファイル（stream_path。省略時は新しいファイル名）に逐次書き出す）"""
+        if self.stream_results:
+            self.results = StreamingResults(stream_path or result_stream_path('html_page_test'), self.fsync_interval)
+            logger.info(f"Streaming results to: {self.results.path}")
+        if self.live_metrics is not None:
+            self.live_metrics.start()
+    
+    def _close_results(self):
+        """結果ストリームを閉じる（残りを書き出してfsync）"""
+        if isinstance(self.results, StreamingResults):
+            self.results.close()
+        if self.live_metrics is not None:
+            self.live_metrics.stop()
+    
+    def _observe(self, future):
+        """ライブメトリクスが有効なら、完了した時点で結果を記録させる
+
+        結果の収集ループは送信がすべて終わってから回るので、ライブメトリクスは Future の完了で記録する。
+        """
+        if self.live_metrics is not None:
+            future.add_done_callback(self.live_metrics.observe)
+        return future
+    
+    def _record_result(self, result: Dict):
+        """完了した結果を保存し、集計器を更新"""
+        self.results.append(result)
+        self.aggregator.add(result)
     
     def calculate_statistics(self, total_time: float) -> Dict:
         """統計情報を計算"""
-        total_requests = len(self.results)
-        successful_requests = sum(1 for r in self.results if r['success'])
-        failed_requests = total_requests - successful_requests
-        
-        cloudflare_blocks = sum(1 for r in self.results if r['cloudflare_blocked'])
-        challenges_detected = sum(1 for r in self.results if r['challenge_detected'])
-        forms_found = sum(1 for r in self.results if r['form_found'])
-        recaptcha_found = sum(1 for r in self.results if r['recaptcha_found'])
+        stats = self.aggregator
+        if stats.total != len(self.results):
+            # self.results が外部から設定された場合などは1回の走査で集計し直す
+            stats = aggregate(self.results, self.STAT_FLAG_FIELDS, self.STAT_TIMING_FIELDS)
         
-        response_times = [r['response_time'] for r in self.results if r['response_time'] > 0]
-        avg_response_time = sum(response_times) / len(response_times) if response_times else 0
+        total_requests = stats.total
+        successful_requests = stats.flags['success']
+        failed_requests = total_requests - successful_requests
         
-        # ステータスコード別の統計
-        status_codes = {}
-        for r in self.results:
-            code = r['status_code']
-            if code:
-                status_codes[code] = status_codes.get(code, 0) + 1
+        cloudflare_blocks = stats.flags['cloudflare_blocked']
+        challenges_detected = stats.flags['challenge_detected']
+        forms_found = stats.flags['form_found']
+        recaptcha_found = stats.flags['recaptcha_found']
         
-        # ページタイトルの確認
-        page_titles = [r['page_title'] for r in self.results if r['page_title']]
-        unique_titles = list(set(page_titles))
+        latency = stats.latency_report()
         
         return {
             'test_summary': {
@@ -328,40 +607,109 @@ class HTMLPageBotTester:
                 'total_requests': total_requests,
                 'successful_requests': successful_requests,
                 'failed_requests': failed_requests,
-                'success_rate': (successful_requests / total_requests * 100) if total_requests > 0 else 0
+                'success_rate': stats.rate('success'),
+                'html_parser': self.html_parser
             },
             'cloudflare_detection': {
                 'blocks': cloudflare_blocks,
                 'challenges_detected': challenges_detected,
-                'block_rate': (cloudflare_blocks / total_requests * 100) if total_requests > 0 else 0,
-                'challenge_rate': (challenges_detected / total_requests * 100) if total_requests > 0 else 0
+                'block_rate': stats.rate('cloudflare_blocked'),
+                'challenge_rate': stats.rate('challenge_detected')
             },
             'page_analysis': {
                 'forms_found': forms_found,
-                'form_detection_rate': (forms_found / total_requests * 100) if total_requests > 0 else 0,
+                'form_detection_rate': stats.rate('form_found'),
                 'recaptcha_found': recaptcha_found,
-                'recaptcha_detection_rate': (recaptcha_found / total_requests * 100) if total_requests > 0 else 0,
-                'unique_page_titles': unique_titles
+                'recaptcha_detection_rate': stats.rate('recaptcha_found'),
+                'unique_page_titles': list(stats.page_titles)
+            },
+            'page_fetch': {
+                'mode': self.page_mode,
+                'full_fetches': total_requests - stats.flags['page_not_modified'] - stats.flags['page_skipped'],
+                'not_modified': stats.flags['page_not_modified'],
+                'skipped': stats.flags['page_skipped'],
+                # ページ取得とAPI送信それぞれの所要時間
+                'avg_page_time': stats.mean('page_time'),
+                'avg_api_time': stats.mean('api_time'),
+                'page_time': stats.timings['page_time'].summary(),
+                'api_time': stats.timings['api_time'].summary(),
+                # GETとPOSTそれぞれのフェーズごとの所要時間（接続を再利用した試行の dns / connect / tls は含めない）
+                'page_phases': phase_report(stats, 'page_'),
+                'api_phases': phase_report(stats, 'api_')
             },
             'performance': {
-                'avg_response_time': avg_response_time,
-                'requests_per_second': total_requests / total_time if total_time > 0 else 0
+                'load_model': 'open-loop' if self.target_rate else 'closed-loop',
+                'target_rate': self.target_rate,
+                'avg_response_time': stats.response_times.mean,
+                'avg_service_time': stats.mean('service_time'),
+                # 予定開始時刻から実際の開始までの遅れ（オープンループ時の送信側の詰まり）
+                'avg_start_lag': stats.start_lags.mean,
+                'requests_per_second': total_requests / total_time if total_time > 0 else 0,
+                'latency': latency['overall'],
+                'latency_by_status_code': latency['by_status_code']
             },
-            'status_codes': status_codes,
+            'status_codes': stats.status_codes,
+            'connection_stats': self.shard_connection_stats or self.sessions.connection_stats(),
+            'header_capture': self.header_capture.level,
+            # 共通のレスポンスヘッダー（all の場合のみ。レコードの header_set から参照）
+            'header_sets': self.header_capture.summary(),
+            # 実行中のメトリクスの時系列ファイルと、防御応答が出始めた時刻
+            'live_metrics': self.live_metrics.summary() if self.live_metrics else None,
             'detailed_results': self.results
         }
     
     def save_results(self, stats: Dict):
-        """結果をJSONファイルに保存"""
+        """結果をJSONファイル（output_format が binary の場合は .rbin ファイル）に保存"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        if self.output_format == 'binary':
+            filename = f"attack-scripts/html_page_test_results_{timestamp}.rbin"
+            write_binary_results(filename, stats, self.RESULT_COLUMNS)
+            logger.info(f"Results saved to: {filename}")
+            return
+        
         filename = f"attack-scripts/html_page_test_results_{timestamp}.json"
         
+        # ストリーム済みの詳細結果はJSONLファイルへの参照として保存
+        stats = detach_streamed_results(stats)
+        
         with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(stats, f, ensure_ascii=False, indent=2)
+            json.dump(stats, f, ensure_ascii=False, indent=2, default=json_default)
         
         logger.info(f"Results saved to: {filename}")
 
 
+def _init_shard(metrics_queue, metrics_fields):
+    """ワーカープロセスの初期化（ライブメトリクスが有効なら結果の送り先のキューを設定）"""
+    global _shard_metrics
+    if metrics_queue is not None:
+        _shard_metrics = QueuedMetrics(metrics_queue, metrics_fields)
+
+
+def _run_shard(target_url: str, session_options: Dict, shard_index: int, attempt_offset: int,
+               num_requests: int, num_threads: int, delay: float, rate: Optional[float],
+               stream_path: Optional[str] = None, fsync_interval: float = 1.0) -> Dict:
+    """ワーカープロセスで1シャード分のテストを実行し、結果レコード（またはその書き出し先）と接続統計を返す"""
+    tester = HTMLPageBotTester(target_url=target_url, live_metrics=_shard_metrics, **session_options)
+    tester.process_id = shard_index
+    if stream_path:
+        tester.results = StreamingResults(stream_path, fsync_interval)
+    try:
+        tester._execute(num_requests, num_threads, delay, rate, attempt_offset=attempt_offset)
+    finally:
+        tester._close_results()
+        # ワーカープロセスは atexit を実行せずに終わるので、ここでログを書き出しておく
+        flush_logging()
+    
+    return {
+        'results': [] if stream_path else tester.results,
+        'result_file': stream_path,
+        'result_count': len(tester.results),
+        'aggregator': tester.aggregator,
+        'header_sets': tester.header_capture.header_sets,
+        'connection_stats': tester.sessions.connection_stats()
+    }
+
+
 def main():
     """メイン関数"""
     parser = argparse.ArgumentParser(description='HTML Page Bot Fight Mode Tester')
@@ -373,19 +721,89 @@ def main():
                        help='Number of concurrent threads (default: 5)')
     parser.add_argument('--delay', type=float, default=0.2,
                        help='Delay between requests in seconds (default: 0.2)')
+    parser.add_argument('--per-worker-sessions', action='store_true',
+                       help='Use one HTTP session per worker thread instead of one shared session')
+    parser.add_argument('--pool-size', type=int,
+                       help='Connection pool size per session (default: number of threads)')
+    parser.add_argument('--no-keep-alive', action='store_true',
+                       help='Disable HTTP keep-alive (open a new connection per request)')
+    parser.add_argument('--retries', type=int, default=0,
+                       help='Retries on connection errors (default: 0)')
+    parser.add_argument('--rate', type=parse_rate,
+                       help='Open-loop target arrival rate, e.g. 500/s or 30/m (overrides --delay)')
+    parser.add_argument('--stream-results', action='store_true',
+                       help='Write results incrementally to a JSONL file instead of keeping them in memory')
+    parser.add_argument('--fsync-interval', type=float, default=1.0,
+                       help='Seconds between fsyncs of the result stream (default: 1.0)')
+    parser.add_argument('--live-metrics', action='store_true',
+                       help='Keep per-interval windows of rate, latency, status codes and block/challenge counts '
+                            'and write them to a time-series JSONL file next to the results')
+    parser.add_argument('--metrics-port', type=int,
+                       help='Also serve the live metrics in Prometheus text format on 127.0.0.1:PORT/metrics '
+                            '(implies --live-metrics)')
+    parser.add_argument('--metrics-interval', type=float, default=1.0,
+                       help='Live metrics window length in seconds (default: 1.0)')
+    parser.add_argument('--output-format', choices=OUTPUT_FORMATS, default='json',
+                       help='Result file format: json, or binary (.rbin: fixed-width records read lazily with '
+                            'result_binary.py, exportable to JSON) (default: json)')
+    parser.add_argument('--html-parser', choices=sorted(HTML_ANALYZERS), default='fast',
+                       help='HTML analysis: fast (targeted scan) or bs4 (full BeautifulSoup parse) (default: fast)')
+    parser.add_argument('--page-mode', choices=PAGE_MODES, default='every',
+                       help='Contact page fetching: every (always GET and parse), conditional (revalidate with '
+                            'ETag/Last-Modified and reuse the parse on 304), once (GET once per session, then API only) '
+                            '(default: every)')
+    parser.add_argument('--capture-headers', choices=HEADER_CAPTURE_LEVELS, default='all',
+                       help='Response headers to record: none, cf (Cloudflare headers only) or all '
+                            '(shared header sets stored once and referenced by id) (default: all)')
+    parser.add_argument('--quiet', action='store_true',
+                       help='Do not log per-attempt messages (run-level messages and the summary are still printed)')
+    parser.add_argument('--log-sample', type=parse_log_sample,
+                       help='Log only 1 in N per-attempt messages per outcome/level, e.g. 100 (successes and info) '
+                            'or success=100,info=100,warning=10; blocks and errors are logged in full unless listed')
+    parser.add_argument('--processes', type=int, default=1,
+                       help='Number of worker processes to split the requests across (default: 1)')
     
     args = parser.parse_args()
+    configure_attempt_logging(attempt_logger, quiet=args.quiet, sample=args.log_sample)
+    
+    live_metrics = None
+    if args.live_metrics or args.metrics_port is not None:
+        live_metrics = LiveMetrics('html_page_test', metrics_path('html_page_test'), interval=args.metrics_interval,
+                                   port=args.metrics_port)
     
     # テスターを初期化
-    tester = HTMLPageBotTester(target_url=args.url)
+    tester = HTMLPageBotTester(
+        target_url=args.url,
+        per_worker_sessions=args.per_worker_sessions,
+        pool_size=args.pool_size or max(args.threads, 10),
+        keep_alive=not args.no_keep_alive,
+        max_retries=args.retries,
+        stream_results=args.stream_results,
+        fsync_interval=args.fsync_interval,
+        html_parser=args.html_parser,
+        page_mode=args.page_mode,
+        capture_headers=args.capture_headers,
+        output_format=args.output_format,
+        live_metrics=live_metrics
+    )
     
     try:
         # テスト実行
-        stats = tester.run_test(
-            num_requests=args.requests,
-            num_threads=args.threads,
-            delay=args.delay
-        )
+        if args.processes > 1:
+            stats = tester.run_test_multiprocess(
+                num_processes=args.processes,
+                num_requests=args.requests,
+                num_threads=args.threads,
+                delay=args.delay,
+                rate=args.rate
+            )
+        else:
+            stats = tester.run_test(
+                num_requests=args.requests,
+                num_threads=args.threads,
+                delay=args.delay,
+                rate=args.rate
+            )
         
         # 結果をコンソールに出力
         print("\n" + "="*70)
@@ -399,6 +817,13 @@ def main():
         print(f"Success Rate: {stats['test_summary']['success_rate']:.1f}%")
         print(f"Requests/Second: {stats['performance']['requests_per_second']:.2f}")
         print(f"Avg Response Time: {stats['performance']['avg_response_time']:.2f}s")
+        latency = stats['performance']['latency']
+        print(f"Latency p50/p95/p99: {latency['p50']:.3f}s / {latency['p95']:.3f}s / {latency['p99']:.3f}s "
+              f"(max {latency['max']:.3f}s, stddev {latency['stddev']:.3f}s)")
+        if stats['performance']['target_rate']:
+            print(f"Target Rate: {stats['performance']['target_rate']:.2f} req/s (open-loop)")
+            print(f"Avg Service Time: {stats['performance']['avg_service_time']:.2f}s")
+            print(f"Avg Start Lag: {stats['performance']['avg_start_lag']:.3f}s")
         print(f"Cloudflare Blocks: {stats['cloudflare_detection']['blocks']}")
         print(f"Block Rate: {stats['cloudflare_detection']['block_rate']:.1f}%")
         print(f"Cloudflare Challenges: {stats['cloudflare_detection']['challenges_detected']}")
@@ -407,6 +832,22 @@ def main():
         print(f"Form Detection Rate: {stats['page_analysis']['form_detection_rate']:.1f}%")
         print(f"reCAPTCHA Found: {stats['page_analysis']['recaptcha_found']}")
         print(f"reCAPTCHA Detection Rate: {stats['page_analysis']['recaptcha_detection_rate']:.1f}%")
+        page_fetch = stats['page_fetch']
+        if page_fetch['mode'] != 'every':
+            print(f"Page Fetch Mode: {page_fetch['mode']} (full {page_fetch['full_fetches']}, "
+                  f"304 {page_fetch['not_modified']}, skipped {page_fetch['skipped']})")
+        print(f"Avg Page Time / API Time: {page_fetch['avg_page_time']:.3f}s / {page_fetch['avg_api_time']:.3f}s")
+        print(f"Page GET Phases (avg): {describe_phases(page_fetch['page_phases'])}")
+        print(f"API POST Phases (avg): {describe_phases(page_fetch['api_phases'])}")
+        
+        connection_stats = stats['connection_stats']
+        print(f"HTTP Sessions: {connection_stats['sessions']}")
+        print(f"Connections Opened: {connection_stats['connections_opened']}")
+        print(f"Connection Reuse Rate: {connection_stats['connection_reuse_rate']:.1f}%")
+        if stats['header_sets'] is not None:
+            print(f"Distinct Header Sets: {len(stats['header_sets'])}")
+        if stats['live_metrics'] is not None:
+            print(f"Live Metrics: {describe_live_metrics(stats['live_metrics'])}")
         
         print("\nStatus Code Distribution:")
         for code, count in stats['status_codes'].items():
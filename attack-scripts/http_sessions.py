@@ -0,0 +1,172 @@
+"""
+HTTPセッション管理
+
+requests.Session はスレッドセーフではなく、デフォルトのurllib3プールは10接続までしか
+保持しません。ここではワーカースレッドごとのセッション、プールサイズ・Keep-Alive・
+リトライの設定、および接続の再利用状況の集計を提供します。
+接続クラスは request_timing.timed_request で計測中のリクエストの dns / connect / tls も記録します。
+"""
+
+import threading
+from typing import Dict, List
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+from request_timing import PhaseTimingConnection
+
+
+class CountingHTTPAdapter(HTTPAdapter):
+    """実際にTCP接続を張った回数を数えるHTTPAdapter
+
+    urllib3の num_connections は接続オブジェクトの生成数なので、サーバー側に閉じられた
+    接続を同じオブジェクトで張り直した場合を数えられない。ここでは connect() の呼び出しを数える。
+    """
+
+    def __init__(self, **kwargs):
+        self._count_lock = threading.Lock()
+        self.connections_opened = 0
+        super().__init__(**kwargs)
+
+    def _record_connect(self):
+        with self._count_lock:
+            self.connections_opened += 1
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        adapter = self
+
+        class _HTTPConnection(PhaseTimingConnection, HTTPConnection):
+            def connect(self):
+                adapter._record_connect()
+                super().connect()
+
+        class _HTTPSConnection(PhaseTimingConnection, HTTPSConnection):
+            def connect(self):
+                adapter._record_connect()
+                super().connect()
+
+        class _HTTPConnectionPool(HTTPConnectionPool):
+            ConnectionCls = _HTTPConnection
+
+        class _HTTPSConnectionPool(HTTPSConnectionPool):
+            ConnectionCls = _HTTPSConnection
+
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _HTTPConnectionPool,
+            'https': _HTTPSConnectionPool,
+        }
+
+
+class SessionManager:
+    """設定済みの requests.Session を（必要ならスレッドごとに）払い出すクラス"""
+
+    def __init__(self, headers: Dict[str, str], per_worker: bool = False, pool_size: int = 10,
+                 keep_alive: bool = True, max_retries: int = 0, retry_backoff: float = 0.0):
+        self.headers = dict(headers)
+        self.per_worker = per_worker
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._sessions = []
+
+        # 共有セッション（per_worker=False 時に使用。ヘッダーのテンプレートも兼ねる）
+        self.shared = self._create_session()
+
+    def _create_session(self) -> requests.Session:
+        """プール・リトライ設定を適用したセッションを作成"""
+        session = requests.Session()
+        session.headers.update(self.headers)
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+
+        # 接続エラーのみリトライする（403/429などの応答は計測対象なので再送しない）
+        retry = Retry(total=self.max_retries, connect=self.max_retries, read=0, status=0,
+                      backoff_factor=self.retry_backoff, raise_on_status=False)
+        adapter = CountingHTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size,
+                                      max_retries=retry)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        with self._lock:
+            self._sessions.append(session)
+        return session
+
+    def get(self) -> requests.Session:
+        """現在のスレッドが使うセッションを返す"""
+        if not self.per_worker:
+            return self.shared
+
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._create_session()
+            self._local.session = session
+        return session
+
+    def connection_stats(self) -> Dict:
+        """新規接続数とリクエスト数から接続の再利用率を集計"""
+        connections_opened = 0
+        requests_sent = 0
+        with self._lock:
+            sessions = list(self._sessions)
+        for session in sessions:
+            # http:// と https:// に同じアダプターをマウントしているので重複を除く
+            adapters = {id(adapter): adapter for adapter in session.adapters.values()}
+            for adapter in adapters.values():
+                connections_opened += getattr(adapter, 'connections_opened', 0)
+                pools = adapter.poolmanager.pools
+                for key in pools.keys():
+                    requests_sent += pools[key].num_requests
+
+        # 共有セッションは per_worker 時には使われないので数えない
+        active_sessions = len(sessions) - (1 if self.per_worker else 0)
+        return build_connection_stats(active_sessions, connections_opened, requests_sent, self)
+
+    def close(self):
+        """すべてのセッションを閉じる"""
+        with self._lock:
+            sessions = list(self._sessions)
+        for session in sessions:
+            session.close()
+
+
+def build_connection_stats(sessions: int, connections_opened: int, requests_sent: int,
+                           manager: SessionManager = None) -> Dict:
+    """接続統計の辞書を組み立てる"""
+    reused = max(requests_sent - connections_opened, 0)
+    stats = {
+        'sessions': sessions,
+        'connections_opened': connections_opened,
+        'requests_sent': requests_sent,
+        'connections_reused': reused,
+        'connection_reuse_rate': (reused / requests_sent * 100) if requests_sent > 0 else 0
+    }
+    if manager is not None:
+        stats.update({
+            'per_worker_sessions': manager.per_worker,
+            'pool_size': manager.pool_size,
+            'keep_alive': manager.keep_alive,
+            'max_retries': manager.max_retries
+        })
+    return stats
+
+
+def merge_connection_stats(stats_list: List[Dict]) -> Dict:
+    """複数プロセス分の接続統計を合算"""
+    merged = build_connection_stats(
+        sum(s['sessions'] for s in stats_list),
+        sum(s['connections_opened'] for s in stats_list),
+        sum(s['requests_sent'] for s in stats_list)
+    )
+    if stats_list:
+        for key in ('per_worker_sessions', 'pool_size', 'keep_alive', 'max_retries'):
+            if key in stats_list[0]:
+                merged[key] = stats_list[0][key]
+    return merged
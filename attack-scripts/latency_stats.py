@@ -0,0 +1,387 @@
+"""
+オンライン集計（レイテンシヒストグラムと結果カウンタ）
+
+結果レコードが完了するたびに1回だけ更新される集計器です。レイテンシは対数バケットの
+ヒストグラム（HDR Histogram と同じ考え方で、相対誤差が一定）に記録するため、
+100万リクエストでもメモリ使用量はバケット数（数千）で頭打ちになります。
+ヒストグラム同士はマージできるので、複数プロセス・複数ホストの結果も合算できます。
+"""
+
+import math
+import operator
+from collections import Counter
+from typing import Dict, Iterable, Optional
+
+from result_table import ResultTable
+
+# レポートに出すパーセンタイル
+REPORT_PERCENTILES = (50, 90, 95, 99)
+
+
+class LatencyHistogram:
+    """対数バケットのレイテンシヒストグラム（値は秒）"""
+
+    def __init__(self, precision: float = 0.01, min_value: float = 1e-6):
+        # precision: バケット幅の相対値（0.01 なら誤差はおよそ ±0.5%）
+        self.precision = precision
+        self.min_value = min_value
+        self._log_base = math.log1p(precision)
+        self.counts = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+        # Welford法による分散計算用
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def _bucket_index(self, value: float) -> int:
+        if value < self.min_value:
+            return 0
+        return int(math.log(value / self.min_value) / self._log_base) + 1
+
+    def _bucket_value(self, index: int) -> float:
+        """バケットの代表値（下端と上端の中間）"""
+        if index == 0:
+            return self.min_value / 2
+        lower = self.min_value * math.exp((index - 1) * self._log_base)
+        return lower * (1 + self.precision / 2)
+
+    def record(self, value: float):
+        """値を1件記録"""
+        index = self._bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        delta = value - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (value - self._mean)
+
+    def record_many(self, values: Iterable[float]):
+        """複数の値をまとめて記録（列の一括集計用。1件ずつ record するより速い）"""
+        values = values if isinstance(values, list) else list(values)
+        if not values:
+            return
+        log, log_base, min_value = math.log, self._log_base, self.min_value
+        batch = LatencyHistogram(self.precision, self.min_value)
+        batch.counts = dict(Counter([int(log(value / min_value) / log_base) + 1 if value >= min_value else 0
+                                     for value in values]))
+        batch.count = len(values)
+        batch.total = math.fsum(values)
+        batch.min = min(values)
+        batch.max = max(values)
+        batch._mean = batch.total / batch.count
+        # 二乗和は fsum で正確に求めるので、平均を引いても桁落ちしにくい
+        batch._m2 = max(math.fsum(map(operator.mul, values, values)) - batch.count * batch._mean ** 2, 0.0)
+        self.merge(batch)
+
+    def merge(self, other: 'LatencyHistogram'):
+        """別のヒストグラムの内容を加算（同じ precision / min_value が前提）"""
+        if other.count == 0:
+            return
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        combined = self.count + other.count
+        delta = other._mean - self._mean
+        self._m2 += other._m2 + delta * delta * self.count * other.count / combined
+        self._mean += delta * other.count / combined
+        self.count = combined
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def mean(self) -> float:
+        return self._mean if self.count else 0
+
+    @property
+    def stddev(self) -> float:
+        return math.sqrt(self._m2 / self.count) if self.count > 1 else 0
+
+    def percentiles(self, points: Iterable[float] = REPORT_PERCENTILES) -> Dict[float, float]:
+        """複数のパーセンタイルをバケットを1回走査して求める"""
+        points = sorted(points)
+        if self.count == 0:
+            return {p: 0 for p in points}
+
+        result = {}
+        ranks = [(p, max(1, math.ceil(p / 100 * self.count))) for p in points]
+        cumulative = 0
+        position = 0
+        for index in sorted(self.counts):
+            cumulative += self.counts[index]
+            while position < len(ranks) and cumulative >= ranks[position][1]:
+                # 代表値は実測の最小値・最大値の範囲に収める
+                value = min(max(self._bucket_value(index), self.min), self.max)
+                result[ranks[position][0]] = value
+                position += 1
+            if position == len(ranks):
+                break
+        return result
+
+    def percentile(self, point: float) -> float:
+        return self.percentiles([point])[point]
+
+    def summary(self) -> Dict:
+        """レポート用の要約"""
+        summary = {
+            'count': self.count,
+            'mean': self.mean,
+            'stddev': self.stddev,
+            'min': self.min if self.count else 0,
+            'max': self.max,
+        }
+        for point, value in self.percentiles().items():
+            summary[f'p{point:g}'] = value
+        return summary
+
+
+class ScoreHistogram:
+    """Botスコアの分布（resolution 刻みのバケットごとの件数と、件数・合計・最小・最大）
+
+    スコアは 0〜1 の範囲（reCAPTCHA は0.1刻み、Cloudflare は0.01刻み）なので、バケット数は高々 1 / resolution + 1。
+    """
+
+    def __init__(self, resolution: float = 0.01):
+        self.resolution = resolution
+        self.counts = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def record(self, value: float):
+        index = round(value / self.resolution)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def record_many(self, values: Iterable[float]):
+        values = values if isinstance(values, list) else list(values)
+        if not values:
+            return
+        resolution = self.resolution
+        for index, count in Counter([round(value / resolution) for value in values]).items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += len(values)
+        self.total += math.fsum(values)
+        self.min = min(self.min, min(values))
+        self.max = max(self.max, max(values))
+
+    def merge(self, other: 'ScoreHistogram'):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    def distribution(self) -> Dict[str, int]:
+        """スコア（バケットの値）ごとの件数"""
+        return {f'{index * self.resolution:.2f}': self.counts[index] for index in sorted(self.counts)}
+
+    def summary(self) -> Dict:
+        """レポート用の要約（結果ファイルの bot_scores）"""
+        return {
+            'avg_score': self.mean,
+            'total_scores_received': self.count,
+            'min_score': self.min if self.count else None,
+            'max_score': self.max if self.count else None,
+            # スコアごとの件数（個々のスコアは detailed_results の bot_score）
+            'distribution': self.distribution()
+        }
+
+
+class ResultAggregator:
+    """結果レコードを1件ずつ受け取って統計情報を積み上げる集計器"""
+
+    def __init__(self, flag_fields: Iterable[str] = ('success', 'cloudflare_blocked', 'challenge_detected'),
+                 timing_fields: Iterable[str] = ('service_time',)):
+        self.total = 0
+        self.flags = {field: 0 for field in flag_fields}
+        self.status_codes = {}
+        # 既存の avg_response_time と同じく、0より大きい値だけを記録する
+        self.response_times = LatencyHistogram()
+        self.latency_by_status = {}
+        self.timings = {field: LatencyHistogram() for field in timing_fields}
+        self.start_lags = LatencyHistogram()
+        self.bot_scores = ScoreHistogram()
+        self.page_titles = set()
+
+    def add(self, result: Dict):
+        """結果レコードを1件集計"""
+        self.total += 1
+        for field in self.flags:
+            if result.get(field):
+                self.flags[field] += 1
+
+        code = result.get('status_code')
+        if code:
+            self.status_codes[code] = self.status_codes.get(code, 0) + 1
+
+        response_time = result.get('response_time', 0)
+        if response_time > 0:
+            self.response_times.record(response_time)
+            key = code if code else 'none'
+            histogram = self.latency_by_status.get(key)
+            if histogram is None:
+                histogram = self.latency_by_status[key] = LatencyHistogram()
+            histogram.record(response_time)
+
+        for field, histogram in self.timings.items():
+            value = result.get(field, 0)
+            if value and value > 0:
+                histogram.record(value)
+
+        if 'intended_start' in result:
+            self.start_lags.record(max(result['actual_start'] - result['intended_start'], 0))
+
+        if result.get('bot_score') is not None:
+            self.bot_scores.record(result['bot_score'])
+        if result.get('page_title'):
+            self.page_titles.add(result['page_title'])
+
+    def add_all(self, results: Iterable[Dict]):
+        if isinstance(results, ResultTable):
+            self.add_table(results)
+            return
+        for result in results:
+            self.add(result)
+
+    def add_table(self, table: ResultTable):
+        """列指向の結果テーブルを列ごとにまとめて集計（add を1件ずつ呼ぶのと同じ結果）
+
+        数値列は配列のまま、カテゴリ列はコード列のまま走査し、値のリストを組み立て直さない。
+        """
+        self.total += len(table)
+        for field in self.flags:
+            if table.kind(field) == 'flag':
+                self.flags[field] += table.count_true(field)
+            elif table.has(field):
+                self.flags[field] += sum(1 for value in table.decoded(field) if value)
+
+        codes, code_values = _codes(table, 'status_code')
+        if table.kind('status_code') == 'category':
+            code_counts = table.value_counts('status_code')
+        else:
+            code_counts = Counter(code_values[code] for code in codes)
+        for code, count in code_counts.items():
+            if code:
+                self.status_codes[code] = self.status_codes.get(code, 0) + count
+
+        if table.has('response_time'):
+            # ステータスコード（のコード）ごとに振り分けてから記録し、全体はそれらをマージして作る
+            groups = [[] for _ in code_values]
+            appends = [group.append for group in groups]
+            for code, value in zip(codes, _numeric(table, 'response_time')):
+                if value > 0:
+                    appends[code](value)
+            for code, values in zip(code_values, groups):
+                if not values:
+                    continue
+                key = code if code else 'none'
+                histogram = self.latency_by_status.get(key)
+                if histogram is None:
+                    histogram = self.latency_by_status[key] = LatencyHistogram()
+                batch = LatencyHistogram()
+                batch.record_many(values)
+                histogram.merge(batch)
+                self.response_times.merge(batch)
+
+        for field, histogram in self.timings.items():
+            if table.has(field):
+                histogram.record_many([value for value in _numeric(table, field) if value > 0])
+
+        if table.has('intended_start') and table.has('actual_start'):
+            lags = [actual - intended for actual, intended in
+                    zip(_numeric(table, 'actual_start'), _numeric(table, 'intended_start'))]
+            # NaN（時刻が記録されていない行）は除く
+            self.start_lags.record_many([lag if lag > 0 else 0.0 for lag in lags if lag == lag])
+
+        if table.has('bot_score'):
+            self.bot_scores.record_many([value for value in _numeric(table, 'bot_score') if value == value])
+        if table.has('page_title'):
+            if table.kind('page_title') == 'category':
+                titles = table.value_counts('page_title')
+            else:
+                titles = table.decoded('page_title')
+            self.page_titles.update(title for title in titles if title)
+
+    def merge(self, other: 'ResultAggregator'):
+        """別の集計器（別プロセス・別ホスト分）の内容を加算"""
+        self.total += other.total
+        for field, count in other.flags.items():
+            self.flags[field] = self.flags.get(field, 0) + count
+        for code, count in other.status_codes.items():
+            self.status_codes[code] = self.status_codes.get(code, 0) + count
+        self.response_times.merge(other.response_times)
+        for code, histogram in other.latency_by_status.items():
+            self.latency_by_status.setdefault(code, LatencyHistogram()).merge(histogram)
+        for field, histogram in other.timings.items():
+            self.timings.setdefault(field, LatencyHistogram()).merge(histogram)
+        self.start_lags.merge(other.start_lags)
+        self.bot_scores.merge(other.bot_scores)
+        self.page_titles.update(other.page_titles)
+
+    def rate(self, field: str) -> float:
+        """フラグが立った割合（%）"""
+        return (self.flags.get(field, 0) / self.total * 100) if self.total > 0 else 0
+
+    def mean(self, field: str) -> float:
+        histogram = self.timings.get(field)
+        return histogram.mean if histogram else 0
+
+    def latency_report(self) -> Dict:
+        """レイテンシの要約（全体とステータスコード別）"""
+        return {
+            'overall': self.response_times.summary(),
+            'by_status_code': {
+                str(code): histogram.summary() for code, histogram in sorted(
+                    self.latency_by_status.items(), key=lambda item: str(item[0]))
+            }
+        }
+
+
+def _numeric(table: ResultTable, field: str):
+    """数値列の値（float 列は配列のまま。NaN は比較で落ちるので None の代わりになる）"""
+    if table.kind(field) in ('int', 'float'):
+        return table.values(field)
+    return [value if value is not None else math.nan for value in table.decoded(field)]
+
+
+def _codes(table: ResultTable, field: str):
+    """列のコード列と値の一覧（カテゴリ列はそのまま。それ以外の列と列がない場合はここで符号化する）"""
+    if table.kind(field) == 'category':
+        return table.codes(field)
+    if not table.has(field):
+        return [0] * len(table), [None]
+    values = []
+    index = {}
+    codes = []
+    for value in table.decoded(field):
+        code = index.get(value)
+        if code is None:
+            code = index[value] = len(values)
+            values.append(value)
+        codes.append(code)
+    return codes, values
+
+
+def aggregate(results: Iterable[Dict], flag_fields: Iterable[str], timing_fields: Iterable[str] = ()) -> ResultAggregator:
+    """結果レコードの列を1回走査して集計器を作る"""
+    aggregator = ResultAggregator(flag_fields, timing_fields)
+    aggregator.add_all(results)
+    return aggregator
+
@@ -0,0 +1,372 @@
+"""
+実行中のメトリクス（秒単位のウィンドウ、Prometheus形式のエンドポイント、時系列ファイル）
+
+統計情報は実行の終わりにしか出ないため、実行中に「いつからブロックされ始めたか」が分かりません。
+LiveMetrics は完了した結果を一定間隔（デフォルト1秒）のウィンドウに振り分けて、リクエスト数・
+ステータスコード・ブロック/チャレンジ数・レイテンシのヒストグラムを積み上げます。ウィンドウが閉じるたびに
+時系列ファイル（JSONL、1行1ウィンドウ）に書き出し、オプションでローカルのHTTPエンドポイントから
+Prometheusのテキスト形式で公開します。
+
+    attack-scripts/<スクリプト名>_metrics_YYYYMMDD_HHMMSS.jsonl
+    http://127.0.0.1:<port>/metrics
+
+ウィンドウは結果の完了時刻で振り分けます。リクエストが1件もなかった間隔も0件のウィンドウとして書き出すので、
+対象が応答しなくなった時間も時系列に残ります。
+
+マルチプロセス実行では、各ワーカープロセスの QueuedMetrics が完了した結果を multiprocessing.Queue で
+親プロセスに送り、親プロセスの LiveMetrics.forward_from のスレッドがそれを記録します。
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from latency_stats import LatencyHistogram
+from saturation_search import BLOCK_STATUS_CODES, CHALLENGE_STATUS_CODES, RATE_LIMIT_STATUS_CODES
+
+logger = logging.getLogger(__name__)
+
+# Prometheus のメトリクス名の接頭辞
+METRIC_PREFIX = 'bfm'
+
+# エンドポイントで公開するレイテンシのパーセンタイル
+EXPORTED_QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+# QueuedMetrics が送り終えたことを知らせる印
+_PRODUCER_DONE = None
+
+
+def metrics_path(prefix: str) -> str:
+    """時系列ファイルのファイル名を生成（例: attack-scripts/simple_test_metrics_YYYYMMDD_HHMMSS.jsonl）"""
+    timestamp = time.strftime("%Y%m%d_%H%M%S")
+    return f"attack-scripts/{prefix}_metrics_{timestamp}.jsonl"
+
+
+def describe_live_metrics(summary: Dict) -> str:
+    """コンソール出力用の1行（時系列ファイルと、防御応答が最初に出た時刻）"""
+    labels = {'cloudflare_blocked': 'block', 'blocked_403': '403', 'rate_limited': '429', 'challenged': 'challenge'}
+    onsets = [f"first {labels[key]} at {offset:.1f}s" for key, offset in summary['onset'].items()
+              if offset is not None]
+    return f"{summary['file']} ({', '.join(onsets) or 'no defense responses'})"
+
+
+class MetricsWindow:
+    """1つの間隔に完了した結果の集計"""
+
+    __slots__ = ('index', 'started_at', 'requests', 'flags', 'status_codes', 'latency')
+
+    def __init__(self, index: int, started_at: float, flag_fields: Iterable[str]):
+        self.index = index
+        self.started_at = started_at
+        self.requests = 0
+        self.flags = {field: 0 for field in flag_fields}
+        self.status_codes = {}
+        self.latency = LatencyHistogram()
+
+    def add(self, result: Dict):
+        self.requests += 1
+        for field in self.flags:
+            if result.get(field):
+                self.flags[field] += 1
+        code = result.get('status_code')
+        key = code if code else 'none'
+        self.status_codes[key] = self.status_codes.get(key, 0) + 1
+        response_time = result.get('response_time', 0)
+        if response_time > 0:
+            self.latency.record(response_time)
+
+    def count_status(self, codes: Iterable[int]) -> int:
+        return sum(self.status_codes.get(code, 0) for code in codes)
+
+    def to_dict(self, interval: float) -> Dict:
+        latency = self.latency.summary() if self.latency.count else None
+        return {
+            't': round(self.index * interval, 3),
+            'time': datetime.fromtimestamp(self.started_at).isoformat(timespec='milliseconds'),
+            'requests': self.requests,
+            'rate': self.requests / interval,
+            **self.flags,
+            'blocked_403': self.count_status(BLOCK_STATUS_CODES),
+            'rate_limited': self.count_status(RATE_LIMIT_STATUS_CODES),
+            'challenged': self.count_status(CHALLENGE_STATUS_CODES),
+            'status_codes': {str(code): count for code, count in self.status_codes.items()},
+            'latency': {key: latency[key] for key in ('p50', 'p95', 'p99', 'max')} if latency else None
+        }
+
+
+class LiveMetrics:
+    """完了した結果を間隔ごとのウィンドウに集計し、時系列ファイルとPrometheusエンドポイントに出す"""
+
+    def __init__(self, script: str, path: Optional[str] = None, interval: float = 1.0, rolling: int = 10,
+                 port: Optional[int] = None, host: str = '127.0.0.1',
+                 flag_fields: Iterable[str] = ('success', 'cloudflare_blocked', 'challenge_detected')):
+        if interval <= 0:
+            raise ValueError(f"Metrics interval must be positive: {interval}")
+        self.script = script
+        self.path = path
+        self.interval = interval
+        # エンドポイントのレートとパーセンタイルは直近 rolling 個のウィンドウから計算する
+        self.rolling = rolling
+        self.port = port
+        self.host = host
+        self.flag_fields = tuple(flag_fields)
+        # 実行中だけの値を返す追加のゲージ（名前 -> 値を返す関数。適応的な同時実行数の上限など）
+        self.gauges = {}
+
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=rolling)
+        self._current = None
+        self._origin = None
+        self._file = None
+        self._ticker = None
+        self._stop = threading.Event()
+        self._server = None
+
+        # 実行全体の累積値（Prometheus の counter）
+        self.total = 0
+        self.flag_totals = {field: 0 for field in self.flag_fields}
+        self.status_totals = {}
+        self.latency_total = LatencyHistogram()
+        self.windows = 0
+        # 防御応答が最初に出たウィンドウの開始時刻（実行開始からの秒）
+        self.onset = {'cloudflare_blocked': None, 'blocked_403': None, 'rate_limited': None, 'challenged': None}
+        self.peak_rate = 0.0
+
+    def add_gauge(self, name: str, read: Callable[[], float]):
+        self.gauges[name] = read
+
+    def start(self):
+        """ウィンドウの切り替え・書き出しと、エンドポイント（port 指定時）を開始する"""
+        self._origin = time.monotonic()
+        self._current = MetricsWindow(0, time.time(), self.flag_fields)
+        if self.path:
+            self._file = open(self.path, 'w', encoding='utf-8')
+            logger.info(f"Writing live metrics to: {self.path}")
+        self._stop.clear()
+        self._ticker = threading.Thread(target=self._run_ticker, name='live-metrics', daemon=True)
+        self._ticker.start()
+        if self.port is not None:
+            self._start_server()
+
+    def record(self, result: Dict):
+        """完了した結果を1件、現在のウィンドウと累積値に加える"""
+        with self._lock:
+            window = self._current
+            if window is None:
+                return
+            window.add(result)
+            self.total += 1
+            for field in self.flag_fields:
+                if result.get(field):
+                    self.flag_totals[field] += 1
+            code = result.get('status_code')
+            key = code if code else 'none'
+            self.status_totals[key] = self.status_totals.get(key, 0) + 1
+            response_time = result.get('response_time', 0)
+            if response_time > 0:
+                self.latency_total.record(response_time)
+
+    def observe(self, future):
+        """concurrent.futures / asyncio の Future に付ける完了コールバック（完了した時点で記録する）"""
+        if not future.cancelled() and future.exception() is None:
+            self.record(future.result())
+
+    def record_fields(self) -> Tuple[str, ...]:
+        """ウィンドウの集計に使う結果レコードのキー（別プロセスからはこの項目だけを送る）"""
+        return self.flag_fields + ('status_code', 'response_time')
+
+    def forward_from(self, queue, producers: int) -> threading.Thread:
+        """別プロセスの QueuedMetrics が送る結果を記録するスレッドを開始（producers 個の送信元が止まると終わる）"""
+        def run():
+            remaining = producers
+            while remaining:
+                record = queue.get()
+                if record is _PRODUCER_DONE:
+                    remaining -= 1
+                else:
+                    self.record(record)
+
+        thread = threading.Thread(target=run, name='live-metrics-forward', daemon=True)
+        thread.start()
+        return thread
+
+    def _run_ticker(self):
+        index = 0
+        while True:
+            index += 1
+            deadline = self._origin + index * self.interval
+            if self._stop.wait(max(deadline - time.monotonic(), 0)):
+                return
+            self._rotate(index)
+
+    def _rotate(self, index: Optional[int]):
+        """現在のウィンドウを閉じて書き出し、次のウィンドウを始める（index が None なら最後のウィンドウ）"""
+        with self._lock:
+            closed = self._current
+            if closed is None:
+                return
+            self._current = MetricsWindow(index, time.time(), self.flag_fields) if index is not None else None
+            self._recent.append(closed)
+        self._close_window(closed)
+
+    def _close_window(self, window: MetricsWindow):
+        record = window.to_dict(self.interval)
+        self.windows += 1
+        self.peak_rate = max(self.peak_rate, record['rate'])
+        for key in self.onset:
+            if self.onset[key] is None and record[key]:
+                self.onset[key] = record['t']
+                logger.info(f"Live metrics: first {key} response in the window at {record['t']:.1f}s")
+        if self._file:
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._file.flush()
+
+    def stop(self):
+        """最後の（途中までの）ウィンドウを書き出して停止する"""
+        if self._ticker is None:
+            return
+        self._stop.set()
+        self._ticker.join()
+        self._ticker = None
+        self._rotate(None)
+        if self._file:
+            self._file.close()
+            self._file = None
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def summary(self) -> Dict:
+        """結果ファイル用の要約（時系列ファイルのパスと、防御応答が出始めた時刻）"""
+        return {
+            'file': self.path,
+            'interval': self.interval,
+            'windows': self.windows,
+            'peak_rate': self.peak_rate,
+            'onset': dict(self.onset)
+        }
+
+    # ---- Prometheus エンドポイント ----
+
+    def _start_server(self):
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                body = metrics.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # スクレイプごとのアクセスログは出さない
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), MetricsHandler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name='live-metrics-http', daemon=True).start()
+        logger.info(f"Serving live metrics on http://{self.host}:{self.port}/metrics")
+
+    def render_prometheus(self) -> str:
+        """現在の値をPrometheusのテキスト形式で返す"""
+        with self._lock:
+            recent = list(self._recent)
+            total = self.total
+            flag_totals = dict(self.flag_totals)
+            status_totals = dict(self.status_totals)
+            latency_total = (self.latency_total.count, self.latency_total.total)
+            rolling = LatencyHistogram()
+            for window in recent:
+                rolling.merge(window.latency)
+
+        labels = f'script="{self.script}"'
+        name = METRIC_PREFIX
+        lines = [
+            f'# HELP {name}_requests_total Completed requests.',
+            f'# TYPE {name}_requests_total counter',
+            f'{name}_requests_total{{{labels}}} {total}',
+            f'# HELP {name}_responses_total Completed requests by status code ("none" for connection errors).',
+            f'# TYPE {name}_responses_total counter'
+        ]
+        for code, count in sorted(status_totals.items(), key=lambda item: str(item[0])):
+            lines.append(f'{name}_responses_total{{{labels},status="{code}"}} {count}')
+        for field, count in flag_totals.items():
+            lines.extend([
+                f'# HELP {name}_{field}_total Completed requests flagged {field}.',
+                f'# TYPE {name}_{field}_total counter',
+                f'{name}_{field}_total{{{labels}}} {count}'
+            ])
+
+        # 直近のウィンドウのレートと各ステータスの割合
+        span = len(recent) * self.interval
+        recent_requests = sum(window.requests for window in recent)
+        lines.extend([
+            f'# HELP {name}_request_rate Requests per second over the last {self.rolling} windows.',
+            f'# TYPE {name}_request_rate gauge',
+            f'{name}_request_rate{{{labels}}} {recent_requests / span if span else 0}'
+        ])
+        for key, codes in (('block', BLOCK_STATUS_CODES), ('rate_limit', RATE_LIMIT_STATUS_CODES),
+                           ('challenge', CHALLENGE_STATUS_CODES)):
+            count = sum(window.count_status(codes) for window in recent)
+            lines.extend([
+                f'# HELP {name}_{key}_ratio Share of {key} responses over the last {self.rolling} windows.',
+                f'# TYPE {name}_{key}_ratio gauge',
+                f'{name}_{key}_ratio{{{labels}}} {count / recent_requests if recent_requests else 0}'
+            ])
+
+        lines.extend([
+            f'# HELP {name}_latency_seconds Response time (quantiles over the last {self.rolling} windows).',
+            f'# TYPE {name}_latency_seconds summary'
+        ])
+        if rolling.count:
+            percentiles = rolling.percentiles([quantile * 100 for quantile in EXPORTED_QUANTILES])
+            for quantile in EXPORTED_QUANTILES:
+                lines.append(f'{name}_latency_seconds{{{labels},quantile="{quantile}"}} '
+                             f'{percentiles[quantile * 100]}')
+        lines.append(f'{name}_latency_seconds_count{{{labels}}} {latency_total[0]}')
+        lines.append(f'{name}_latency_seconds_sum{{{labels}}} {latency_total[1]}')
+
+        for gauge, read in self.gauges.items():
+            try:
+                value = read()
+            except Exception:
+                continue
+            lines.extend([
+                f'# TYPE {name}_{gauge} gauge',
+                f'{name}_{gauge}{{{labels}}} {value}'
+            ])
+        return '\n'.join(lines) + '\n'
+
+
+class QueuedMetrics:
+    """ワーカープロセスで LiveMetrics の代わりに使い、完了した結果を親プロセスの LiveMetrics に送る"""
+
+    def __init__(self, queue, fields: Iterable[str]):
+        self.queue = queue
+        self.fields = tuple(fields)
+
+    def start(self):
+        pass
+
+    def record(self, result: Dict):
+        self.queue.put({field: result.get(field) for field in self.fields})
+
+    def observe(self, future):
+        if not future.cancelled() and future.exception() is None:
+            self.record(future.result())
+
+    def stop(self):
+        """送り終えたことを知らせる（同じキューの結果より後に届く）"""
+        self.queue.put(_PRODUCER_DONE)
@@ -0,0 +1,88 @@
+"""
+オープンループ（一定到着レート）スケジューラ
+
+前のリクエストが完了しているかどうかに関係なく、指定したレートの時刻表どおりに
+リクエストを発行します。各リクエストには「予定開始時刻」を渡し、レイテンシは
+予定開始時刻から計測することでcoordinated omission（対象が遅くなると負荷が
+自動的に下がり、レイテンシが実際より良く見える問題）を補正します。
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Iterator, List, Tuple
+
+# レート指定の単位（秒あたりに換算する係数）
+RATE_UNITS = {
+    's': 1.0,
+    'sec': 1.0,
+    'm': 1.0 / 60,
+    'min': 1.0 / 60,
+    'h': 1.0 / 3600,
+}
+
+
+def parse_rate(text: str) -> float:
+    """'500/s'、'30/m'、'10' のようなレート指定を req/s に変換"""
+    value = text.strip().lower()
+    unit = 's'
+    if '/' in value:
+        value, unit = value.split('/', 1)
+    try:
+        rate = float(value) * RATE_UNITS[unit.strip()]
+    except (KeyError, ValueError):
+        raise argparse.ArgumentTypeError(f"Invalid rate: {text!r} (expected e.g. 500/s, 30/m)")
+    if rate <= 0:
+        raise argparse.ArgumentTypeError(f"Rate must be positive: {text!r}")
+    return rate
+
+
+def shard_budget(num_requests: int, num_shards: int) -> List[Tuple[int, int]]:
+    """リクエスト数をシャードに分割し、(attempt番号の開始位置, リクエスト数) のリストを返す
+
+    余りは先頭のシャードから1件ずつ割り当てる。リクエストが0件になるシャードは作らない。
+    """
+    num_shards = max(1, min(num_shards, num_requests))
+    base, remainder = divmod(num_requests, num_shards)
+    shards = []
+    offset = 0
+    for index in range(num_shards):
+        count = base + (1 if index < remainder else 0)
+        shards.append((offset, count))
+        offset += count
+    return shards
+
+
+class OpenLoopScheduler:
+    """一定の到着レートでリクエストの予定開始時刻を刻むスケジューラ"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.interval = 1.0 / rate
+
+    def _timetable(self, num_requests: int) -> Iterator[Tuple[int, float, float]]:
+        """(リクエスト番号, 予定開始時刻[epoch], 予定開始時刻[perf_counter]) を生成"""
+        epoch_origin = time.time()
+        perf_origin = time.perf_counter()
+        for i in range(num_requests):
+            offset = i * self.interval
+            yield i, epoch_origin + offset, perf_origin + offset
+
+    def ticks(self, num_requests: int) -> Iterator[Tuple[int, float]]:
+        """予定時刻まで待機してから (リクエスト番号, 予定開始時刻) を返す
+
+        発行側が遅れた場合は待機せずに即座に返し、予定時刻は動かさない。
+        """
+        for i, intended_start, deadline in self._timetable(num_requests):
+            remaining = deadline - time.perf_counter()
+            if remaining > 0:
+                time.sleep(remaining)
+            yield i, intended_start
+
+    async def ticks_async(self, num_requests: int):
+        """ticks() のasyncio版（イベントループをブロックしない）"""
+        for i, intended_start, deadline in self._timetable(num_requests):
+            remaining = deadline - time.perf_counter()
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+            yield i, intended_start
@@ -0,0 +1,156 @@
+"""
+ログ出力の設定（キュー経由の書き出し・サンプリング・--quiet）
+
+各テスターはこれまで logging.basicConfig でファイルとコンソールのハンドラーを直接ルートロガーに付けており、
+ワーカースレッドはログ1行ごとにハンドラーのロックを取ってファイル・コンソールへ書き込んでいました。
+setup_logging はルートロガーにはキューへ入れるだけのハンドラーを付け、整形と書き込みは
+リスナースレッドで行います。ワーカースレッドの処理は LogRecord をキューに入れるところまでです。
+
+試行ごとのログは各テスターの「<モジュール名>.attempts」ロガーに出し、configure_attempt_logging で
+--quiet（試行ごとのログを出さない）と --log-sample（成功などを N 件に1件だけ出す）を設定します。
+"""
+
+import atexit
+import itertools
+import logging
+import logging.handlers
+import os
+import queue
+from typing import Dict, Optional
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# --log-sample N のように数だけ指定した場合に間引く対象（成功の結果行と、試行ごとの経過の INFO ログ）
+DEFAULT_SAMPLED = ('success', 'info')
+
+# setup_logging で開始したリスナー（フォーク後の再開と flush_logging 用）と、それが動いているか
+_listener = None
+_listener_running = False
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """LogRecord を整形せずにキューへ入れるハンドラー（メッセージの組み立てはリスナースレッドで行う）
+
+    標準の QueueHandler は呼び出し元のスレッドでメッセージを整形してからキューに入れるため、
+    そのコストがワーカースレッドに残る。同じプロセス内のキューなので、レコードはそのまま渡す。
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """結果（outcome 属性）またはレベルごとに、N 件に1件だけ通すフィルター
+
+    キーはログ呼び出し時に extra={'outcome': ...} で付けた結果の種類（success / failed / blocked / challenge）か、
+    それがない場合はレベル名の小文字（info / warning / error）。指定のないキーはすべて通す。
+    """
+
+    def __init__(self, rates: Dict[str, int]):
+        super().__init__()
+        self.rates = {key: rate for key, rate in rates.items() if rate > 1}
+        self._counters = {key: itertools.count() for key in self.rates}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = getattr(record, 'outcome', None) or record.levelname.lower()
+        counter = self._counters.get(key)
+        # 各キーの最初の1件は必ず通す
+        return counter is None or next(counter) % self.rates[key] == 0
+
+
+def parse_log_sample(text: str) -> Dict[str, int]:
+    """--log-sample の値を解析（"100" または "success=100,info=10,warning=5"）"""
+    text = text.strip()
+    try:
+        if '=' not in text:
+            rate = int(text)
+            rates = {key: rate for key in DEFAULT_SAMPLED}
+        else:
+            rates = {}
+            for part in text.split(','):
+                key, value = part.split('=', 1)
+                rates[key.strip().lower()] = int(value)
+    except ValueError:
+        raise ValueError(f"Invalid log sample: {text!r} (expected N or key=N[,key=N...])")
+    if any(rate < 1 for rate in rates.values()):
+        raise ValueError(f"Invalid log sample: {text!r} (rates must be >= 1)")
+    return rates
+
+
+def setup_logging(log_file: str, level: int = logging.INFO) -> Optional[logging.handlers.QueueListener]:
+    """ファイルとコンソールへのログ出力を、キューとリスナースレッド経由で設定する
+
+    basicConfig と同じく、ルートロガーにハンドラーが設定済みの場合は何もしない（None を返す）。
+    """
+    global _listener, _listener_running
+    root = logging.getLogger()
+    if root.handlers:
+        return None
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = [logging.FileHandler(log_file), logging.StreamHandler()]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    root.addHandler(DeferredQueueHandler(log_queue))
+    root.setLevel(level)
+    _listener.start()
+    _listener_running = True
+    # 終了時にキューに残ったログを書き出す（フォーク後は子プロセスで作り直したリスナーを止める）
+    atexit.register(_stop_listener)
+    return _listener
+
+
+def _stop_listener():
+    global _listener_running
+    if _listener is not None and _listener_running:
+        _listener.stop()
+        _listener_running = False
+
+
+def flush_logging():
+    """キューに溜まったログをすべて書き出す
+
+    ワーカープロセスは atexit を実行せずに終了するため、シャードの終わりに呼んで取りこぼしを防ぐ。
+    """
+    if _listener is not None and _listener_running:
+        _listener.stop()
+        _listener.start()
+
+
+def _restart_listener_after_fork():
+    # フォークした子プロセスにはリスナースレッドが引き継がれないので、同じキューとハンドラーで
+    # 新しいリスナーを作って起動する（親のリスナーは子プロセスでは止まったスレッドを持ったままになる）
+    global _listener
+    if _listener is not None and _listener_running:
+        _listener = logging.handlers.QueueListener(_listener.queue, *_listener.handlers,
+                                                   respect_handler_level=_listener.respect_handler_level)
+        _listener.start()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_listener_after_fork)
+
+
+def result_outcome(result: Dict) -> str:
+    """結果レコードのサンプリング上の分類（blocked / challenge / failed / success）
+
+    成功した試行はチャレンジの兆候があっても success とし、失敗した試行だけを原因で分ける。
+    """
+    if result.get('cloudflare_blocked'):
+        return 'blocked'
+    if result.get('success'):
+        return 'success'
+    return 'challenge' if result.get('challenge_detected') else 'failed'
+
+
+def configure_attempt_logging(attempt_logger: logging.Logger, quiet: bool = False,
+                              sample: Optional[Dict[str, int]] = None):
+    """試行ごとのログの出し方を設定（quiet: 出さない / sample: 結果・レベルごとの間引き）"""
+    if quiet:
+        # LogRecord を作る前のレベル判定で落とす（警告・エラーも含めて出さない）
+        attempt_logger.setLevel(logging.CRITICAL + 1)
+    if sample:
+        attempt_logger.addFilter(SamplingFilter(sample))
@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+"""
+ローカル用のスタンドインサーバー
+
+/contact、/api/contact、/api/contact2 を Next.js のルートと同じ形の応答で返す
+ローカルHTTPサーバーです。cf-* ヘッダーの付与、403/429/503 応答、チャレンジページ、
+遅延の注入ができるので、ネットワークなしで3つのテスターを高レートで計測・回帰確認できます。
+
+標準ライブラリだけで動きます。
+
+使用例:
+    python attack-scripts/mock_server.py --port 8787 --latency 0.02 --block-rate 0.05
+    python attack-scripts/simple_test.py --url http://127.0.0.1:8787/contact --requests 1000 --delay 0
+"""
+
+import argparse
+import json
+import logging
+import random
+import re
+import secrets
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+from load_scheduler import parse_rate
+
+logger = logging.getLogger(__name__)
+
+# ページのHTML（フォームの要素・クラス名はテスターが参照するものに合わせる）
+CONTACT_PAGE = """<!DOCTYPE html>
+<html lang="ja">
+<head>
+<meta charset="utf-8">
+<title>お問い合わせ | Bot Fight Mode Sandbox</title>
+<script src="https://www.google.com/recaptcha/enterprise.js?render=local-site-key" async></script>
+</head>
+<body>
+<div class="w-full max-w-md mx-auto">
+<h2 class="text-2xl font-bold mb-4">お問い合わせ</h2>
+<form id="contact-form" class="flex flex-col gap-4">
+<div><label for="email">メールアドレス</label><input id="email" type="email" required></div>
+<div><label for="message">お問い合わせ内容</label><textarea id="message" required></textarea></div>
+<button type="submit">送信</button>
+<div id="status"></div>
+</form>
+</div>
+<div data-testid="bot-score-display">reCAPTCHA: <span id="bot-score">-</span></div>
+<script>
+document.getElementById('contact-form').addEventListener('submit', async function (e) {
+  e.preventDefault();
+  var status = document.getElementById('status');
+  var ok = false, data = {};
+  try {
+    var response = await fetch('/api/contact', {
+      method: 'POST',
+      headers: {'Content-Type': 'application/json'},
+      body: JSON.stringify({
+        email: document.getElementById('email').value,
+        message: document.getElementById('message').value,
+        recaptchaToken: 'local-token'
+      })
+    });
+    ok = response.ok;
+    data = await response.json();
+  } catch (err) {
+    data = {error: 'エラーが発生しました。もう一度お試しください。'};
+  }
+  if (ok && data.scores && data.scores.recaptcha !== null) {
+    document.getElementById('bot-score').textContent = data.scores.recaptcha.toFixed(2);
+  }
+  status.className = 'mt-4 p-3 rounded ' + (ok ? 'bg-green-100 text-green-800' : 'bg-red-100 text-red-800');
+  status.textContent = ok ? 'お問い合わせありがとうございます。確認次第ご連絡いたします。'
+                          : (data.error || 'エラーが発生しました。もう一度お試しください。');
+});
+</script>
+</body>
+</html>
+"""
+
+CHALLENGE_PAGE = """<!DOCTYPE html>
+<html lang="en-US">
+<head><title>Just a moment...</title></head>
+<body>
+<h1>Checking your browser before accessing the site.</h1>
+<p>This process is automatic. Your browser will redirect to your requested content shortly.</p>
+<p>DDoS protection by Cloudflare</p>
+</body>
+</html>
+"""
+
+BLOCK_PAGE = """<!DOCTYPE html>
+<html lang="en-US">
+<head><title>Attention Required! | Cloudflare</title></head>
+<body>
+<h1>Sorry, you have been blocked</h1>
+<p>This website is using a security service to protect itself from online attacks.</p>
+</body>
+</html>
+"""
+
+# 注入する異常応答の種類
+FAULT_KINDS = ('block', 'rate_limit', 'unavailable', 'challenge')
+
+
+class MockServerConfig:
+    """スタンドインサーバーの挙動の設定"""
+
+    def __init__(self, latency: float = 0.0, latency_jitter: float = 0.0,
+                 block_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 unavailable_rate: float = 0.0, challenge_rate: float = 0.0,
+                 challenge_status: int = 503, rate_limit: Optional[float] = None,
+                 cf_headers: bool = True, etag: bool = True, colo: str = 'NRT',
+                 seed: Optional[int] = None):
+        # 応答前に入れる遅延（秒）。latency_jitter を指定すると ±jitter の一様乱数を加える
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        # 各異常応答を返す割合（0〜1）
+        self.block_rate = block_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.unavailable_rate = unavailable_rate
+        self.challenge_rate = challenge_rate
+        self.challenge_status = challenge_status
+        # クライアントIPごとのレート上限（req/s）。超えた分は429を返す
+        self.rate_limit = rate_limit
+        self.cf_headers = cf_headers
+        self.etag = etag
+        self.colo = colo
+        self.seed = seed
+
+
+class MockServerState:
+    """リクエストごとの判定に使う乱数・レート制限と、応答の集計"""
+
+    def __init__(self, config: MockServerConfig):
+        self.config = config
+        self._random = random.Random(config.seed)
+        self._lock = threading.Lock()
+        # クライアントIPごとのトークンバケット: ip -> (tokens, last_refill)
+        self._buckets = {}
+        self.requests = {}
+        self.status_codes = {}
+
+    def delay(self) -> float:
+        config = self.config
+        if config.latency_jitter <= 0:
+            return config.latency
+        with self._lock:
+            jitter = self._random.uniform(-config.latency_jitter, config.latency_jitter)
+        return max(config.latency + jitter, 0.0)
+
+    def pick_fault(self) -> Optional[str]:
+        """設定された割合に従って、注入する異常応答の種類を決める"""
+        config = self.config
+        with self._lock:
+            roll = self._random.random()
+        for kind, rate in zip(FAULT_KINDS, (config.block_rate, config.rate_limit_rate,
+                                            config.unavailable_rate, config.challenge_rate)):
+            if roll < rate:
+                return kind
+            roll -= rate
+        return None
+
+    def allow(self, client_ip: str) -> bool:
+        """トークンバケットでクライアントIPごとのレートを制限する"""
+        limit = self.config.rate_limit
+        if not limit:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            tokens, last_refill = self._buckets.get(client_ip, (limit, now))
+            tokens = min(limit, tokens + (now - last_refill) * limit)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[client_ip] = (tokens, now)
+        return allowed
+
+    def record(self, path: str, status_code: int):
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+            self.status_codes[status_code] = self.status_codes.get(status_code, 0) + 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                'requests': dict(self.requests),
+                'status_codes': {str(code): count for code, count in self.status_codes.items()}
+            }
+
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    """Next.js のルートを模したリクエストハンドラー"""
+
+    protocol_version = 'HTTP/1.1'
+    # ヘッダーと本文は別々に書き込まれるので、Nagle と遅延ACKで Keep-Alive 接続の本文が約40ms遅れないようにする
+    disable_nagle_algorithm = True
+
+    def version_string(self) -> str:
+        return 'cloudflare'
+
+    # 既定のアクセスログ（1リクエストごとに stderr へ出力）は高レート時に遅いので出さない
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def state(self) -> MockServerState:
+        return self.server.state
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == '/__stats':
+            self._send_json(200, self.state.snapshot(), path)
+            return
+        if self._inject_fault(path):
+            return
+        if path in ('/contact', '/contact/'):
+            self._send_contact_page(path)
+        else:
+            self._send_json(404, {'error': 'Not Found'}, path)
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if self._inject_fault(path):
+            return
+
+        try:
+            data = json.loads(body or b'{}')
+        except json.JSONDecodeError:
+            self._send_json(500, {'error': 'お問い合わせ処理中にエラーが発生しました'}, path)
+            return
+
+        if path == '/api/contact':
+            self._handle_contact(path, data)
+        elif path == '/api/contact2':
+            self._handle_contact2(path, data)
+        else:
+            self._send_json(404, {'error': 'Not Found'}, path)
+
+    def _handle_contact(self, path: str, data: Dict):
+        """app/api/contact/route.ts と同じ形の応答"""
+        if not data.get('email') or not data.get('message'):
+            self._send_json(400, {'error': 'メールアドレスとお問い合わせ内容は必須です'}, path)
+            return
+
+        # トークンがあれば検証に成功したものとしてスコアを返す（実サーバーは空トークンならnull）
+        recaptcha_score = 0.9 if data.get('recaptchaToken') else None
+        cf_bot_score = self.headers.get('cf-bot-score')
+        js_detection = self.headers.get('x-cf-js-detection-status')
+        if js_detection:
+            js_detection_passed = js_detection.lower() == 'passed'
+        else:
+            js_detection_passed = (data.get('botDetection') or {}).get('cloudflareJsDetectionPassed')
+
+        scores = {'recaptcha': recaptcha_score}
+        # NextResponse.json（JSON.stringify）は値が undefined のキーを出力しないので、cf-bot-score がない場合は
+        # cloudflare キー自体を含めない（数値として読めない場合は NaN になり null が出力される）
+        if cf_bot_score:
+            score_match = re.match(r'\s*[+-]?\d+', cf_bot_score)
+            scores['cloudflare'] = int(score_match.group()) / 100 if score_match else None
+        scores['jsDetectionPassed'] = js_detection_passed
+
+        self._send_json(200, {
+            'success': True,
+            'message': 'お問い合わせを受け付けました',
+            'scores': scores,
+            'debug': {
+                'hasCfClearance': 'cf_clearance=' in (self.headers.get('Cookie') or ''),
+                'headers': {
+                    'cfRay': self.headers.get('cf-ray'),
+                    'cfConnectingIp': self.headers.get('cf-connecting-ip'),
+                    'cfIpCountry': self.headers.get('cf-ipcountry')
+                }
+            }
+        }, path, {'X-Bot-Detection-Type': 'Cloudflare-Bot-Fight-Mode'})
+
+    def _handle_contact2(self, path: str, data: Dict):
+        """app/api/contact2/route.ts と同じ形の応答（Turnstileトークン必須）"""
+        if not data.get('email') or not data.get('message'):
+            self._send_json(400, {'error': 'メールアドレスとお問い合わせ内容は必須です'}, path)
+            return
+        if not data.get('turnstileToken'):
+            self._send_json(400, {'error': 'Bot検証が必要です'}, path)
+            return
+
+        now = datetime.now(timezone.utc).isoformat()
+        self._send_json(200, {
+            'success': True,
+            'message': 'お問い合わせを受け付けました',
+            'turnstile': {
+                'success': True,
+                'hostname': self.headers.get('Host', '').split(':')[0],
+                'challenge_ts': now
+            },
+            'debug': {
+                'userAgent': self.headers.get('User-Agent', ''),
+                'timestamp': now
+            }
+        }, path, {'X-Bot-Detection-Type': 'Cloudflare-Turnstile'})
+
+    def _send_contact_page(self, path: str):
+        body = self.server.contact_page
+        etag = self.server.contact_etag
+        if etag and self.headers.get('If-None-Match') == etag:
+            self._send(304, b'', path, {'ETag': etag})
+            return
+        headers = {'Content-Type': 'text/html; charset=utf-8'}
+        if etag:
+            headers['ETag'] = etag
+            headers['Last-Modified'] = self.server.contact_last_modified
+        self._send(200, body, path, headers)
+
+    def _inject_fault(self, path: str) -> bool:
+        """レート制限・異常応答の注入。応答を返した場合はTrue"""
+        if not self.state.allow(self.client_address[0]):
+            self._send_html(429, 'Too Many Requests', path, {'Retry-After': '1'})
+            return True
+
+        fault = self.state.pick_fault()
+        if fault is None:
+            return False
+        if fault == 'block':
+            self._send_html(403, BLOCK_PAGE, path)
+        elif fault == 'rate_limit':
+            self._send_html(429, 'Too Many Requests', path, {'Retry-After': '1'})
+        elif fault == 'unavailable':
+            self._send_html(503, 'Service Unavailable', path)
+        else:
+            self._send_html(self.state.config.challenge_status, CHALLENGE_PAGE, path,
+                            {'cf-mitigated': 'challenge'})
+        return True
+
+    def _send_json(self, status_code: int, payload: Dict, path: str, headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self._send(status_code, body, path, dict(headers or {}, **{'Content-Type': 'application/json'}))
+
+    def _send_html(self, status_code: int, html: str, path: str, headers: Optional[Dict[str, str]] = None):
+        self._send(status_code, html.encode('utf-8'), path,
+                   dict(headers or {}, **{'Content-Type': 'text/html; charset=utf-8'}))
+
+    def _send(self, status_code: int, body: bytes, path: str, headers: Dict[str, str]):
+        delay = self.state.delay()
+        if delay > 0:
+            time.sleep(delay)
+
+        self.send_response(status_code)
+        if self.state.config.cf_headers:
+            self.send_header('CF-RAY', f"{secrets.token_hex(8)}-{self.state.config.colo}")
+            self.send_header('CF-Cache-Status', 'DYNAMIC')
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body and self.command != 'HEAD':
+            self.wfile.write(body)
+        self.state.record(path, status_code)
+
+
+class MockCloudflareServer(ThreadingHTTPServer):
+    """スタンドインサーバー本体（接続ごとにスレッドで処理）"""
+
+    daemon_threads = True
+    # 高レートで接続が集中してもSYNを取りこぼさないよう、listenのバックログを大きくする
+    request_queue_size = 1024
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 8787, config: Optional[MockServerConfig] = None):
+        self.state = MockServerState(config or MockServerConfig())
+        self.contact_page = CONTACT_PAGE.encode('utf-8')
+        self.contact_etag = f'"{secrets.token_hex(8)}"' if self.state.config.etag else None
+        self.contact_last_modified = formatdate(time.time(), usegmt=True)
+        self._thread = None
+        super().__init__((host, port), MockRequestHandler)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'MockCloudflareServer':
+        """バックグラウンドスレッドで起動（テストやベンチマークから使う）"""
+        self._thread = threading.Thread(target=self.serve_forever, name='mock-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> 'MockCloudflareServer':
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    """メイン関数"""
+    parser = argparse.ArgumentParser(description='Local stand-in for the contact page and APIs behind Cloudflare')
+    parser.add_argument('--host', default='127.0.0.1',
+                       help='Address to bind (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8787,
+                       help='Port to listen on (default: 8787)')
+    parser.add_argument('--latency', type=float, default=0.0,
+                       help='Seconds of latency added to every response (default: 0)')
+    parser.add_argument('--latency-jitter', type=float, default=0.0,
+                       help='Uniform +/- jitter in seconds added to --latency (default: 0)')
+    parser.add_argument('--block-rate', type=float, default=0.0,
+                       help='Fraction of requests answered with a 403 block page (default: 0)')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0,
+                       help='Fraction of requests answered with 429 (default: 0)')
+    parser.add_argument('--unavailable-rate', type=float, default=0.0,
+                       help='Fraction of requests answered with 503 (default: 0)')
+    parser.add_argument('--challenge-rate', type=float, default=0.0,
+                       help='Fraction of requests answered with a challenge page (default: 0)')
+    parser.add_argument('--challenge-status', type=int, default=503,
+                       help='HTTP status of the challenge page (default: 503)')
+    parser.add_argument('--rate-limit', type=parse_rate,
+                       help='Per-client-IP rate limit, e.g. 200/s; excess requests get 429')
+    parser.add_argument('--no-cf-headers', action='store_true',
+                       help='Do not add CF-RAY / CF-Cache-Status headers')
+    parser.add_argument('--no-etag', action='store_true',
+                       help='Serve /contact without ETag / Last-Modified')
+    parser.add_argument('--seed', type=int,
+                       help='Random seed for fault injection and jitter')
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    config = MockServerConfig(
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        block_rate=args.block_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        unavailable_rate=args.unavailable_rate,
+        challenge_rate=args.challenge_rate,
+        challenge_status=args.challenge_status,
+        rate_limit=args.rate_limit,
+        cf_headers=not args.no_cf_headers,
+        etag=not args.no_etag,
+        seed=args.seed
+    )
+    server = MockCloudflareServer(args.host, args.port, config)
+    logger.info(f"Mock server listening on {server.base_url} (/contact, /api/contact, /api/contact2, /__stats)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Shutting down")
+    finally:
+        server.server_close()
+        logger.info(f"Served: {json.dumps(server.state.snapshot(), ensure_ascii=False)}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
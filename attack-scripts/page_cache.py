@@ -0,0 +1,64 @@
+"""
+コンタクトページのキャッシュ
+
+HTMLPageBotTester は試行ごとに /contact を取得して解析してからAPIへPOSTしますが、
+ページ自体はほとんど変わりません。PageCache はセッションごとに直前のページの
+ETag / Last-Modified と解析結果を保持し、条件付きGET（If-None-Match / If-Modified-Since）
+で 304 が返った場合は保持している解析結果を再利用できるようにします。
+
+セッション単位で保持するのは、実際のブラウザと同じく「クライアントごとのHTTPキャッシュ」を
+再現するためです（--per-worker-sessions 時はワーカーごとに別のクライアントになります）。
+"""
+
+import threading
+from typing import Dict, Optional
+
+import requests
+
+# ページ取得のモード
+# every: 毎回ページを取得して解析（従来の動作）
+# conditional: 条件付きGETで再検証し、304なら解析結果を再利用
+# once: セッションごとに1回だけページを取得し、以降はAPIへのPOSTのみ
+PAGE_MODES = ('every', 'conditional', 'once')
+
+
+class CachedPage:
+    """キャッシュしたページの検証子と解析結果"""
+
+    __slots__ = ('etag', 'last_modified', 'analysis')
+
+    def __init__(self, etag: Optional[str], last_modified: Optional[str], analysis: Dict):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.analysis = analysis
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """再検証用のリクエストヘッダー"""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class PageCache:
+    """セッションとURLごとにページの解析結果を保持するキャッシュ"""
+
+    def __init__(self):
+        self._pages = {}
+        self._lock = threading.Lock()
+
+    def get(self, session: requests.Session, url: str) -> Optional[CachedPage]:
+        with self._lock:
+            return self._pages.get((id(session), url))
+
+    def store(self, session: requests.Session, url: str, response: requests.Response, analysis: Dict):
+        """200応答の検証子と解析結果を保持する"""
+        page = CachedPage(response.headers.get('ETag'), response.headers.get('Last-Modified'), analysis)
+        with self._lock:
+            self._pages[(id(session), url)] = page
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
@@ -0,0 +1,135 @@
+"""
+ページ内のイベントで待つ WebDriver の待機
+
+WebDriverWait でチャレンジの終了や結果のメッセージを待つと、0.5秒ごとに WebDriver への往復が発生し、
+page_source で待つ場合は毎回DOM全体をシリアライズして転送します。ブラウザを多数並べると、この往復と転送が
+試行ごとのCPU時間と、状態の変化に気づくまでの遅れの大部分になります。
+
+ここでの待機は execute_async_script でページ内に MutationObserver を仕掛け、条件が成り立った時点で
+（ポーリングせずに）結果を返します。待機中の WebDriver への往復は1回だけです。
+待機中にページが遷移した場合（チャレンジの通過後のリダイレクトなど）は、遷移先のページで待ち直します。
+"""
+
+import time
+from typing import Dict
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+# 非同期スクリプトのタイムアウト（ページ内の待機はそれぞれの timeout で打ち切るので、それより長くしておく）
+SCRIPT_TIMEOUT = 120
+
+# Cloudflare のチャレンジページに含まれる文言
+CHALLENGE_TEXT = 'checking your browser'
+
+# 条件（check 関数の本体。成り立ったら null 以外を返す）が成り立つまで待つスクリプト
+_OBSERVE_SCRIPT = """
+const timeoutMs = arguments[0];
+const done = arguments[arguments.length - 1];
+function check() {
+%s
+}
+const initial = check();
+if (initial !== null) {
+    done(initial);
+    return;
+}
+let timer = null;
+const observer = new MutationObserver(() => {
+    const value = check();
+    if (value !== null) {
+        observer.disconnect();
+        clearTimeout(timer);
+        done(value);
+    }
+});
+observer.observe(document, {childList: true, subtree: true, characterData: true});
+timer = setTimeout(() => {
+    observer.disconnect();
+    done(null);
+}, timeoutMs);
+"""
+
+# タイトルか本文でチャレンジページかを判定する
+_HAS_CHALLENGE = f"""
+const text = (document.documentElement.textContent || '').toLowerCase();
+return document.title.toLowerCase().includes('cloudflare') || text.includes('{CHALLENGE_TEXT}');
+"""
+
+# チャレンジの文言が消えたら true
+_CHALLENGE_CLEARED = f"""
+    const text = (document.documentElement.textContent || '').toLowerCase();
+    return text.includes('{CHALLENGE_TEXT}') ? null : true;
+"""
+
+# フォームの要素が揃ったら、要素と reCAPTCHA の有無を返す
+_FORM_READY = """
+    const email = document.getElementById('email');
+    const message = document.getElementById('message');
+    const submit = document.querySelector("button[type='submit']");
+    if (!(email && message && submit)) {
+        return null;
+    }
+    const recaptcha = document.querySelector(".g-recaptcha, iframe[src*='recaptcha']") !== null;
+    return {email: email, message: message, submit: submit, recaptcha: recaptcha};
+"""
+
+# 成功・エラーのメッセージが出たら、成功かどうかとBotスコアの表示を返す
+_RESULT_SHOWN = """
+    const banner = document.querySelector(".bg-green-100, .bg-red-100, [class*='error']");
+    if (!banner) {
+        return null;
+    }
+    const html = document.documentElement.outerHTML.toLowerCase();
+    const score = document.querySelector("[data-testid='bot-score-display']");
+    return {
+        success: html.includes('お問い合わせありがとうございます') || html.includes('success'),
+        bot_score_text: score ? score.textContent : null
+    };
+"""
+
+# ページの遷移で待機が打ち切られたときの chromedriver のエラー
+_NAVIGATION_ERRORS = ('document unloaded', 'execution context was destroyed', 'inspected target navigated')
+
+
+def prepare_driver(driver):
+    """ドライバーの非同期スクリプトのタイムアウトを設定する（ドライバーの作成時に1回呼ぶ）"""
+    driver.set_script_timeout(SCRIPT_TIMEOUT)
+
+
+def has_challenge(driver) -> bool:
+    """チャレンジページが表示されているか（DOMを転送せずにページ内で判定する）"""
+    return bool(driver.execute_script(_HAS_CHALLENGE))
+
+
+def wait_for(driver, condition: str, timeout: float, description: str):
+    """ページ内で condition が null 以外を返すまで待ち、その値を返す（timeout 秒で TimeoutException）"""
+    script = _OBSERVE_SCRIPT % condition
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            value = driver.execute_async_script(script, int(remaining * 1000))
+        except WebDriverException as e:
+            # 待機中にページが遷移した場合は、遷移先のページで待ち直す
+            if any(marker in str(e).lower() for marker in _NAVIGATION_ERRORS):
+                continue
+            raise
+        if value is not None:
+            return value
+    raise TimeoutException(f"Timed out after {timeout}s waiting for {description}")
+
+
+def wait_for_challenge_cleared(driver, timeout: float = 30):
+    wait_for(driver, _CHALLENGE_CLEARED, timeout, 'the challenge to clear')
+
+
+def wait_for_form(driver, timeout: float = 10) -> Dict:
+    """フォームの要素（email / message / submit の WebElement）と reCAPTCHA の有無（recaptcha）を返す"""
+    return wait_for(driver, _FORM_READY, timeout, 'the contact form')
+
+
+def wait_for_result(driver, timeout: float = 10) -> Dict:
+    """送信後の成功・エラーのメッセージを待ち、{success, bot_score_text} を返す"""
+    return wait_for(driver, _RESULT_SHOWN, timeout, 'the submission result')
@@ -0,0 +1,226 @@
+"""
+リクエストのフェーズごとの所要時間（DNS・TCP接続・TLS・TTFB・本文受信・クライアント側の処理）
+
+response_time はリクエスト全体の経過時間なので、遅いのが Cloudflare のハンドシェイクなのか、
+オリジンの応答なのか、こちらの解析処理なのかを区別できません。ここでは1リクエストを次のフェーズに分けて計測します。
+
+    dns         名前解決（接続を再利用した場合や、IPアドレスを直接指定した場合は0）
+    connect     TCP接続（接続を再利用した場合は0）
+    tls         TLSハンドシェイク（http:// や接続を再利用した場合は0）
+    ttfb        接続の確立後、リクエストを送ってからレスポンスヘッダーを受け取るまで
+    body        レスポンス本文の受信
+    processing  クライアント側の処理（レスポンスの解析など）
+
+requests（スレッドエンジン）では、http_sessions の接続クラスが現在のスレッドで計測中の
+PhaseTimer に dns / connect / tls を書き込みます。aiohttp（asyncioエンジン）ではトレースの
+コールバックで計測します。aiohttp は TCP接続と TLS を分けて通知しないので、tls は connect に含まれます。
+"""
+
+import ipaddress
+import socket
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import requests
+from urllib3.connection import HTTPSConnection
+from urllib3.exceptions import ConnectTimeoutError
+from urllib3.util.connection import allowed_gai_family
+
+PHASES = ('dns', 'connect', 'tls', 'ttfb', 'body', 'processing')
+
+# 現在のスレッドで計測中の PhaseTimer（http_sessions の接続クラスが参照する）
+_active = threading.local()
+
+# 接頭辞ごとのフィールド名（試行ごとに組み立てないようにキャッシュする）
+_field_names = {}
+
+
+def phase_fields(prefix: str = '') -> Tuple[str, ...]:
+    """結果レコードのフィールド名（例: prefix='api_' なら api_dns_time, ..., api_processing_time）"""
+    fields = _field_names.get(prefix)
+    if fields is None:
+        fields = _field_names[prefix] = tuple(f"{prefix}{phase}_time" for phase in PHASES)
+    return fields
+
+
+def phase_report(aggregator, prefix: str = '') -> Dict:
+    """フェーズごとの所要時間の要約（値が0の試行、例えば接続を再利用した試行の dns / connect / tls は含めない）"""
+    return {phase: aggregator.timings[field].summary() for phase, field in zip(PHASES, phase_fields(prefix))}
+
+
+def describe_phases(report: Dict) -> str:
+    """コンソール出力用の1行（フェーズごとの平均）"""
+    return ' / '.join(f"{phase} {report[phase]['mean'] * 1000:.1f}ms" for phase in PHASES)
+
+
+class PhaseTimer:
+    """1リクエスト分のフェーズごとの所要時間（秒）"""
+
+    __slots__ = PHASES
+
+    def __init__(self):
+        self.dns = self.connect = self.tls = self.ttfb = self.body = self.processing = 0.0
+
+    def add(self, phase: str, seconds: float):
+        # 接続エラーのリトライで接続し直した場合は合計する
+        setattr(self, phase, getattr(self, phase) + max(seconds, 0.0))
+
+    def handshake(self) -> float:
+        return self.dns + self.connect + self.tls
+
+    def apply(self, result: Dict, prefix: str = ''):
+        """結果レコードの {prefix}{phase}_time に書き込む"""
+        dns, connect, tls, ttfb, body, processing = phase_fields(prefix)
+        result[dns] = self.dns
+        result[connect] = self.connect
+        result[tls] = self.tls
+        result[ttfb] = self.ttfb
+        result[body] = self.body
+        result[processing] = self.processing
+
+
+def current_timer() -> Optional[PhaseTimer]:
+    return getattr(_active, 'timer', None)
+
+
+def timed_request(session: requests.Session, method: str, url: str,
+                  timer: Optional[PhaseTimer] = None, **kwargs) -> Tuple[requests.Response, PhaseTimer]:
+    """リクエストを送り、ヘッダーの受信と本文の受信を分けて計測する
+
+    本文は stream=True で受け取ってからこの関数の中で読み切るので、戻り値の response は通常どおり使える。
+    processing は呼び出し側で計測して timer.add('processing', ...) する。
+    """
+    timer = timer if timer is not None else PhaseTimer()
+    _active.timer = timer
+    started = time.perf_counter()
+    try:
+        response = session.request(method, url, stream=True, **kwargs)
+    finally:
+        _active.timer = None
+    headers_received = time.perf_counter()
+    timer.add('ttfb', headers_received - started - timer.handshake())
+    # 本文を読み切る（読み終わると接続はプールに戻る）
+    response.content
+    timer.add('body', time.perf_counter() - headers_received)
+    return response, timer
+
+
+def _is_ip_address(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host.strip('[]'))
+        return True
+    except ValueError:
+        return False
+
+
+class PhaseTimingConnection:
+    """urllib3 の HTTPConnection / HTTPSConnection に混ぜて、接続時の dns / connect / tls を計測する
+
+    計測中でない（timed_request の外からの）リクエストでは何もしない。
+    """
+
+    def _new_conn(self):
+        timer = current_timer()
+        if timer is None:
+            return super()._new_conn()
+
+        host = self._dns_host
+        addresses = []
+        if not _is_ip_address(host):
+            dns_start = time.perf_counter()
+            try:
+                addresses = socket.getaddrinfo(host, self.port, allowed_gai_family(), socket.SOCK_STREAM)
+            except (socket.gaierror, UnicodeError):
+                # 名前解決のエラーは urllib3 に任せて、計測しない場合と同じ例外にする
+                pass
+            timer.add('dns', time.perf_counter() - dns_start)
+
+        # 解決済みの最初のアドレスに接続する（複数のアドレスがあって失敗した場合は、urllib3 が
+        # 全アドレスを順に試す通常の接続に戻す）
+        connect_start = time.perf_counter()
+        if addresses:
+            self._dns_host = addresses[0][4][0]
+            try:
+                sock = super()._new_conn()
+            except ConnectTimeoutError:
+                if len(addresses) == 1:
+                    raise
+                self._dns_host = host
+                sock = super()._new_conn()
+            finally:
+                self._dns_host = host
+        else:
+            sock = super()._new_conn()
+        timer.add('connect', time.perf_counter() - connect_start)
+        return sock
+
+    def connect(self):
+        timer = current_timer()
+        if timer is None:
+            return super().connect()
+
+        # connect() のうち、_new_conn（dns + connect）以外の時間が TLS ハンドシェイク
+        before = timer.dns + timer.connect
+        started = time.perf_counter()
+        super().connect()
+        elapsed = time.perf_counter() - started
+        if isinstance(self, HTTPSConnection):
+            timer.add('tls', elapsed - (timer.dns + timer.connect - before))
+
+
+def trace_phases(trace_config):
+    """aiohttp.TraceConfig にフェーズ計測のコールバックを追加する
+
+    リクエストごとに trace_request_ctx={'timer': PhaseTimer()} を渡すと、その timer に dns / connect / ttfb を
+    書き込む（本文の受信と processing は呼び出し側で計測する）。
+    """
+
+    def timer_of(context) -> Optional[PhaseTimer]:
+        request_ctx = context.trace_request_ctx
+        return request_ctx.get('timer') if isinstance(request_ctx, dict) else None
+
+    async def on_request_start(session, context, params):
+        context.request_start = time.perf_counter()
+        context.queued = 0.0
+
+    async def on_connection_queued_start(session, context, params):
+        context.queued_start = time.perf_counter()
+
+    async def on_connection_queued_end(session, context, params):
+        # 接続数の上限で空きを待った時間は ttfb に含めない
+        context.queued += time.perf_counter() - context.queued_start
+
+    async def on_dns_resolvehost_start(session, context, params):
+        context.dns_start = time.perf_counter()
+
+    async def on_dns_resolvehost_end(session, context, params):
+        timer = timer_of(context)
+        if timer is not None:
+            timer.add('dns', time.perf_counter() - context.dns_start)
+
+    async def on_connection_create_start(session, context, params):
+        timer = timer_of(context)
+        context.connect_start = time.perf_counter()
+        context.dns_before_connect = timer.dns if timer is not None else 0.0
+
+    async def on_connection_create_end(session, context, params):
+        timer = timer_of(context)
+        if timer is not None:
+            # 名前解決は接続の作成の中で行われるので除く（TLS はここに含まれる）
+            dns = timer.dns - context.dns_before_connect
+            timer.add('connect', time.perf_counter() - context.connect_start - dns)
+
+    async def on_request_end(session, context, params):
+        timer = timer_of(context)
+        if timer is not None:
+            timer.add('ttfb', time.perf_counter() - context.request_start - context.queued - timer.handshake())
+
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_connection_queued_start.append(on_connection_queued_start)
+    trace_config.on_connection_queued_end.append(on_connection_queued_end)
+    trace_config.on_dns_resolvehost_start.append(on_dns_resolvehost_start)
+    trace_config.on_dns_resolvehost_end.append(on_dns_resolvehost_end)
+    trace_config.on_connection_create_start.append(on_connection_create_start)
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    trace_config.on_request_end.append(on_request_end)
@@ -0,0 +1,400 @@
+"""
+固定長レコードのバイナリ結果ファイル（.rbin）
+
+インデント付きのJSON結果ファイルは、どのフィールドを読むにも全体を解析する必要があります。
+.rbin は結果レコードを固定長のバイナリレコードとして並べ、辞書やエラー文言などの可変長の値は
+別領域（ヒープ）に置きます。読み込み側はファイルをメモリマップし、必要なレコード・フィールドだけを
+その場でデコードします（全件を読み込まずに反復・絞り込みができます）。
+
+ファイルの構成:
+
+    MAGIC (8バイト)
+    レコード領域   count 件 × record_size バイト（struct の書式は footer の struct）
+    ヒープ         mapping / object 列とスキーマにないフィールドのJSON（UTF-8）
+    footer         JSON（スキーマ、struct の書式、カテゴリ列の値の一覧、統計情報）
+    footer の長さ (8バイト) + MAGIC (8バイト)
+
+列の種類ごとの格納方法は result_table.ResultTable と同じです（flag は1バイト、int は8バイト、float は
+8バイトで None は NaN、timestamp はエポックからのマイクロ秒、category は値の一覧へのコード）。
+mapping / object はヒープ上のJSONの位置と長さを持ちます。export_json で従来のJSON結果ファイルと
+同じ形式に戻せます。
+"""
+
+import argparse
+import json
+import mmap
+import shutil
+import struct
+import tempfile
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+from result_table import _from_float, _from_micros, _to_micros, json_default
+
+# 保存形式（テスターの --output-format）
+OUTPUT_FORMATS = ('json', 'binary')
+
+MAGIC = b'BFMRES01'
+FORMAT_VERSION = 1
+
+# 列の種類ごとの struct の書式（mapping / object はヒープ上の位置と長さ）
+KIND_FORMATS = {
+    'flag': 'b',
+    'int': 'q',
+    'float': 'd',
+    'category': 'I',
+    'timestamp': 'q',
+    'mapping': 'QI',
+    'object': 'QI'
+}
+
+# ヒープ参照が None（値なし）であることを表す位置
+_NO_REFERENCE = 2 ** 64 - 1
+
+# スキーマにないフィールド（worker_id など）をまとめて入れる列
+_EXTRA_FIELD = ''
+
+_TRAILER = struct.Struct('<Q8s')
+
+
+def _encode_json(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=json_default).encode('utf-8')
+
+
+class BinaryResultWriter:
+    """結果レコードを .rbin ファイルに書き出す（レコードは1件ずつ書くので全件をメモリに持たない）"""
+
+    def __init__(self, path: str, schema: Dict[str, str]):
+        unknown = [kind for kind in schema.values() if kind not in KIND_FORMATS]
+        if unknown:
+            raise ValueError(f"Unknown column kinds: {unknown}")
+        self.path = path
+        self.schema = dict(schema)
+        fields = list(self.schema.items()) + [(_EXTRA_FIELD, 'object')]
+        self._fields = fields
+        self._struct = struct.Struct('<' + ''.join(KIND_FORMATS[kind] for _, kind in fields))
+        self._categories = {name: {} for name, kind in fields if kind == 'category'}
+        self._count = 0
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC)
+        # ヒープはレコード領域の後ろに置くので、書き終わるまで一時ファイルに溜める
+        self._heap = tempfile.TemporaryFile()
+        self._heap_size = 0
+
+    def _reference(self, value):
+        if value is None:
+            return _NO_REFERENCE, 0
+        data = _encode_json(value)
+        offset = self._heap_size
+        self._heap.write(data)
+        self._heap_size += len(data)
+        return offset, len(data)
+
+    def write(self, record: Dict):
+        values = []
+        for name, kind in self._fields:
+            if kind == 'object' and name == _EXTRA_FIELD:
+                extra = {key: value for key, value in record.items() if key not in self.schema}
+                values.extend(self._reference(extra or None))
+                continue
+            value = record.get(name)
+            if kind == 'flag':
+                values.append(1 if value else 0)
+            elif kind == 'int':
+                values.append(value or 0)
+            elif kind == 'float':
+                values.append(float('nan') if value is None else value)
+            elif kind == 'category':
+                codes = self._categories[name]
+                code = codes.get(value)
+                if code is None:
+                    code = codes[value] = len(codes)
+                values.append(code)
+            elif kind == 'timestamp':
+                values.append(_to_micros(value))
+            else:
+                # 空の辞書は ResultTable と同じく値なしとして持つ
+                values.extend(self._reference(value or None))
+        self._file.write(self._struct.pack(*values))
+        self._count += 1
+
+    def write_all(self, records: Iterable[Dict]):
+        for record in records:
+            self.write(record)
+
+    def close(self, stats: Optional[Dict] = None):
+        """ヒープと footer を書いてファイルを閉じる（stats は detailed_results 以外の統計情報）"""
+        heap_offset = self._file.tell()
+        self._heap.seek(0)
+        shutil.copyfileobj(self._heap, self._file)
+        self._heap.close()
+        footer = {
+            'version': FORMAT_VERSION,
+            'fields': [[name, kind] for name, kind in self._fields],
+            'struct': self._struct.format,
+            'record_size': self._struct.size,
+            'count': self._count,
+            'records_offset': len(MAGIC),
+            'heap_offset': heap_offset,
+            'heap_size': self._heap_size,
+            'categories': {name: list(codes) for name, codes in self._categories.items()},
+            'stats': stats or {}
+        }
+        data = _encode_json(footer)
+        self._file.write(data)
+        self._file.write(_TRAILER.pack(len(data), MAGIC))
+        self._file.close()
+
+
+def write_binary_results(path: str, stats: Dict, schema: Dict[str, str]):
+    """統計情報と detailed_results を .rbin ファイルに保存（ストリーム済みの結果はJSONLから読み直して入れる）"""
+    writer = BinaryResultWriter(path, schema)
+    try:
+        writer.write_all(stats.get('detailed_results') or [])
+    except BaseException:
+        writer._file.close()
+        raise
+    # detailed_results は元の位置を残したまま None にしておく（JSONへの書き出しでキーの順序を保つため）
+    summary = {key: (None if key == 'detailed_results' else value) for key, value in stats.items()}
+    writer.close(json.loads(_encode_json(summary)))
+
+
+class BinaryResults:
+    """.rbin ファイルをメモリマップして読む（反復・添字・列・絞り込みはその場でデコードする）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        size = len(self._map)
+        if size < len(MAGIC) + _TRAILER.size or self._map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"Not a binary result file: {path}")
+        footer_size, magic = _TRAILER.unpack_from(self._map, size - _TRAILER.size)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"Truncated binary result file: {path}")
+        footer_start = size - _TRAILER.size - footer_size
+        footer = json.loads(self._map[footer_start:size - _TRAILER.size].decode('utf-8'))
+        if footer['version'] != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"Unsupported binary result version {footer['version']}: {path}")
+
+        self.footer = footer
+        self.fields = [tuple(field) for field in footer['fields']]
+        self.schema = {name: kind for name, kind in self.fields if name != _EXTRA_FIELD}
+        self.categories = footer['categories']
+        self._struct = struct.Struct(footer['struct'])
+        self._count = footer['count']
+        self._records_offset = footer['records_offset']
+        self._heap_offset = footer['heap_offset']
+
+        # フィールドごとの、レコード内の値の位置（unpack したタプルの添字）と単独で読むための struct
+        self._slots = {}
+        self._field_structs = {}
+        slot = 0
+        offset = 0
+        for name, kind in self.fields:
+            field_format = '<' + KIND_FORMATS[kind]
+            self._slots[name] = slot
+            self._field_structs[name] = (struct.Struct(field_format), offset)
+            slot += len(KIND_FORMATS[kind])
+            offset += struct.calcsize(field_format)
+
+    @property
+    def stats(self) -> Dict:
+        """保存時の統計情報（detailed_results を除く）"""
+        return {key: value for key, value in self.footer['stats'].items() if key != 'detailed_results'}
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _heap_value(self, offset: int, length: int):
+        if offset == _NO_REFERENCE:
+            return None
+        start = self._heap_offset + offset
+        return json.loads(self._map[start:start + length].decode('utf-8'))
+
+    def _decode(self, name: str, kind: str, raw: tuple, slot: int):
+        value = raw[slot]
+        if kind == 'flag':
+            return value == 1
+        if kind == 'float':
+            return _from_float(value)
+        if kind == 'category':
+            return self.categories[name][value]
+        if kind == 'timestamp':
+            return _from_micros(value)
+        if kind in ('mapping', 'object'):
+            decoded = self._heap_value(value, raw[slot + 1])
+            return {} if decoded is None and kind == 'mapping' else decoded
+        return value
+
+    def _build(self, raw: tuple, fields: Optional[Sequence[str]] = None) -> Dict:
+        record = {}
+        for name, kind in self.fields:
+            if name == _EXTRA_FIELD:
+                if fields is None or any(field not in self.schema for field in fields):
+                    extra = self._decode(name, kind, raw, self._slots[name]) or {}
+                    record.update(extra if fields is None else
+                                  {key: value for key, value in extra.items() if key in fields})
+            elif fields is None or name in fields:
+                record[name] = self._decode(name, kind, raw, self._slots[name])
+        return record
+
+    def _raw_records(self) -> Iterator[tuple]:
+        """レコード領域を1MB程度ずつ切り出して unpack する（途中で反復をやめてもマップを閉じられるように
+        memoryview は使わない）"""
+        size = self._struct.size
+        chunk = max(1, (1 << 20) // size) * size
+        end = self._records_offset + self._count * size
+        for start in range(self._records_offset, end, chunk):
+            yield from self._struct.iter_unpack(self._map[start:min(start + chunk, end)])
+
+    def row(self, index: int, fields: Optional[Sequence[str]] = None) -> Dict:
+        """1件分のレコード（fields を指定するとそのフィールドだけをデコード）"""
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('result index out of range')
+        raw = self._struct.unpack_from(self._map, self._records_offset + index * self._struct.size)
+        return self._build(raw, fields)
+
+    def __getitem__(self, index: int) -> Dict:
+        return self.row(index)
+
+    def __iter__(self) -> Iterator[Dict]:
+        for raw in self._raw_records():
+            yield self._build(raw)
+
+    def column(self, name: str) -> Iterator:
+        """1フィールドの値だけを順に返す（ほかのフィールドとヒープは読まない）"""
+        kind = self.schema.get(name)
+        if kind is None:
+            raise KeyError(f"Unknown field: {name}")
+        field_struct, offset = self._field_structs[name]
+        base = self._records_offset + offset
+        size = self._struct.size
+        for index in range(self._count):
+            raw = field_struct.unpack_from(self._map, base + index * size)
+            yield self._decode(name, kind, raw, 0)
+
+    def select(self, fields: Optional[Sequence[str]] = None, **equals) -> Iterator[Dict]:
+        """条件（フィールド=値）に一致するレコードを返す
+
+        flag / int / category 列の条件はデコード前の値で比べるので、一致しないレコードは組み立てない。
+        """
+        checks = []
+        for name, expected in equals.items():
+            kind = self.schema.get(name)
+            if kind is None:
+                raise KeyError(f"Unknown field: {name}")
+            slot = self._slots[name]
+            if kind == 'category':
+                values = self.categories[name]
+                if expected not in values:
+                    return
+                checks.append((slot, values.index(expected)))
+            elif kind == 'flag':
+                checks.append((slot, 1 if expected else 0))
+            elif kind == 'int':
+                checks.append((slot, expected))
+            else:
+                checks.append((slot, name, kind, expected))
+
+        for raw in self._raw_records():
+            matched = True
+            for check in checks:
+                if len(check) == 2:
+                    matched = raw[check[0]] == check[1]
+                else:
+                    slot, name, kind, expected = check
+                    matched = self._decode(name, kind, raw, slot) == expected
+                if not matched:
+                    break
+            if matched:
+                yield self._build(raw, fields)
+
+    def export_json(self, path: str):
+        """従来のJSON結果ファイルと同じ形式で書き出す（レコードは1件ずつ書き、全件をメモリに持たない）"""
+        placeholder = f'\0detailed_results:{id(self)}\0'
+        stats = dict(self.footer['stats'])
+        stats['detailed_results'] = placeholder
+        text = json.dumps(stats, ensure_ascii=False, indent=2, default=json_default)
+        head, tail = text.split(json.dumps(placeholder, ensure_ascii=False), 1)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(head)
+            if self._count == 0:
+                f.write('[]')
+            else:
+                f.write('[')
+                for index, record in enumerate(self):
+                    if index:
+                        f.write(',')
+                    # json.dump(indent=2) で detailed_results の要素が入る深さ（4スペース）に合わせる
+                    encoded = json.dumps(record, ensure_ascii=False, indent=2, default=json_default)
+                    f.write('\n    ' + encoded.replace('\n', '\n    '))
+                f.write('\n  ]')
+            f.write(tail)
+
+    def close(self):
+        if getattr(self, '_map', None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self) -> 'BinaryResults':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _parse_condition(text: str):
+    name, separator, value = text.partition('=')
+    if not separator:
+        raise argparse.ArgumentTypeError(f"Invalid condition: {text!r} (expected field=value)")
+    try:
+        return name, json.loads(value)
+    except ValueError:
+        return name, value
+
+
+def main():
+    """メイン関数"""
+    parser = argparse.ArgumentParser(description='Read binary (.rbin) test result files')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = commands.add_parser('export', help='Convert to the JSON result file format')
+    export_parser.add_argument('path')
+    export_parser.add_argument('-o', '--output', help='Output file (default: same name with .json)')
+
+    dump_parser = commands.add_parser('dump', help='Print matching records as JSON lines')
+    dump_parser.add_argument('path')
+    dump_parser.add_argument('--where', type=_parse_condition, action='append', default=[],
+                             help='Only records with field=value, e.g. status_code=403 (repeatable)')
+    dump_parser.add_argument('--fields', help='Comma-separated fields to print (default: all)')
+    dump_parser.add_argument('--limit', type=int, help='Print at most this many records')
+
+    summary_parser = commands.add_parser('summary', help='Print the saved statistics without the records')
+    summary_parser.add_argument('path')
+
+    args = parser.parse_args()
+    with BinaryResults(args.path) as results:
+        if args.command == 'export':
+            output = args.output or args.path.rsplit('.', 1)[0] + '.json'
+            results.export_json(output)
+            print(f"Exported {len(results)} results to: {output}")
+        elif args.command == 'summary':
+            print(json.dumps(results.stats, ensure_ascii=False, indent=2))
+            print(f"records: {len(results)}")
+        else:
+            fields = args.fields.split(',') if args.fields else None
+            for count, record in enumerate(results.select(fields, **dict(args.where))):
+                if args.limit is not None and count >= args.limit:
+                    break
+                print(json.dumps(record, ensure_ascii=False, default=json_default))
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
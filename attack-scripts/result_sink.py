@@ -0,0 +1,194 @@
+"""
+JSONL形式の結果ストリーム
+
+結果レコードをメモリに溜めず、完了したものからバックグラウンドのライタースレッドで
+JSONLファイルへ1行ずつ書き出します。一定間隔でfsyncするため、実行が途中で落ちても
+それまでの結果はファイルに残ります。
+
+書き込みに失敗した場合（ディスクフル・ネットワークファイルシステムのエラーなど）も、ライタースレッドは
+キューを空にし続けて呼び出し側を止めず、そのエラーを次の write / flush / close で送出して実行を失敗させます。
+
+StreamingResults はリストと同じように append / extend / len / 反復ができるので、
+テスターの self.results をそのまま置き換えられます。反復時はファイルを先頭から読み直すため、
+統計計算中もメモリ使用量は実行の長さに依存しません。
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+# ライタースレッドへの終了通知
+_STOP = object()
+
+
+class JSONLResultSink:
+    """バックグラウンドスレッドでJSONLファイルに結果を書き出すライター"""
+
+    def __init__(self, path: str, fsync_interval: float = 1.0, max_pending: int = 10000):
+        self.path = path
+        self.fsync_interval = fsync_interval
+        self.records_written = 0
+        # ライタースレッドで起きた書き込みエラー（以降の write / flush / close で送出する）
+        self.error = None
+        # 上限付きキューにして、書き込みが追いつかない場合は呼び出し側を待たせる
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name='result-sink', daemon=True)
+        self._thread.start()
+
+    def write(self, record: Dict):
+        """レコードを書き込み待ちキューに追加"""
+        self._raise_error()
+        self._queue.put(record)
+
+    def flush(self):
+        """キューに溜まったレコードがすべてファイルに書かれるまで待つ"""
+        self._queue.join()
+        self._raise_error()
+
+    def close(self):
+        """残りを書き出してfsyncし、ライタースレッドを終了"""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        self._raise_error()
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise self.error
+
+    def _run(self):
+        try:
+            f = open(self.path, 'a', encoding='utf-8')
+        except OSError as e:
+            self._fail(e)
+            f = None
+
+        last_sync = time.monotonic()
+        stopping = False
+        while not stopping:
+            try:
+                batch = [self._queue.get(timeout=self.fsync_interval)]
+            except queue.Empty:
+                batch = []
+
+            # 溜まっている分はまとめて書き出す
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stopping = any(record is _STOP for record in batch)
+            try:
+                # 書き込みに失敗した後は、キューを空にするだけで書かない
+                if self.error is None:
+                    self._write_batch(f, batch)
+                    now = time.monotonic()
+                    if stopping or now - last_sync >= self.fsync_interval:
+                        os.fsync(f.fileno())
+                        last_sync = now
+            except OSError as e:
+                self._fail(e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+        if f is not None:
+            try:
+                f.close()
+            except OSError:
+                # 書き出せなかったバッファの再試行でも失敗する（エラーは記録済み）
+                pass
+
+    def _write_batch(self, f, batch: List):
+        for record in batch:
+            if record is _STOP:
+                continue
+            try:
+                line = json.dumps(record, ensure_ascii=False) + '\n'
+            except (TypeError, ValueError) as e:
+                logger.error(f"Failed to serialize result record: {e}")
+                continue
+            f.write(line)
+            self.records_written += 1
+        if batch:
+            f.flush()
+
+    def _fail(self, error: OSError):
+        self.error = error
+        logger.error(f"Failed to write results to {self.path}: {error}")
+
+
+def iter_jsonl(paths: Iterable[str]) -> Iterator[Dict]:
+    """JSONLファイルを1レコードずつ読み出す（途中で壊れた末尾行は読み飛ばす）"""
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping truncated line in {path}")
+
+
+class StreamingResults:
+    """self.results の代わりに使う、JSONLファイルに逐次書き出す結果コレクション"""
+
+    def __init__(self, path: str, fsync_interval: float = 1.0):
+        self.path = path
+        self.sink = JSONLResultSink(path, fsync_interval=fsync_interval)
+        # 他プロセスが書いた結果ファイル（マルチプロセス実行時）
+        self.extra_paths = []
+        self._count = 0
+        self._extra_count = 0
+
+    @property
+    def paths(self) -> List[str]:
+        return [self.path] + self.extra_paths
+
+    def append(self, record: Dict):
+        self.sink.write(record)
+        self._count += 1
+
+    def extend(self, records: Iterable[Dict]):
+        for record in records:
+            self.append(record)
+
+    def attach(self, path: str, count: int):
+        """別プロセスが書いた結果ファイルを集計対象に加える"""
+        self.extra_paths.append(path)
+        self._extra_count += count
+
+    def close(self):
+        self.sink.close()
+
+    def __len__(self) -> int:
+        return self._count + self._extra_count
+
+    def __iter__(self) -> Iterator[Dict]:
+        self.sink.flush()
+        return iter_jsonl(self.paths)
+
+
+def result_stream_path(prefix: str) -> str:
+    """結果ストリームのファイル名を生成（例: attack-scripts/simple_test_results_YYYYMMDD_HHMMSS.jsonl）"""
+    timestamp = time.strftime("%Y%m%d_%H%M%S")
+    return f"attack-scripts/{prefix}_results_{timestamp}.jsonl"
+
+
+def detach_streamed_results(stats: Dict) -> Dict:
+    """保存用に、ストリーム済みの detailed_results をファイル名の参照に置き換える"""
+    results = stats.get('detailed_results')
+    if not isinstance(results, StreamingResults):
+        return stats
+    stats = dict(stats)
+    del stats['detailed_results']
+    stats['detailed_results_files'] = results.paths
+    return stats
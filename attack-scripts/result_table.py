@@ -0,0 +1,398 @@
+"""
+列指向の結果テーブル
+
+結果レコード（1試行ごとの辞書）を、フィールドごとの型付き配列に分解して保持します。
+フラグは1バイト、時刻・時間は8バイトの配列に入り、エラー文言やステータスコードのように
+取りうる値が少ないフィールドは値の一覧と1バイトのコード列に辞書符号化します。
+ヘッダーの辞書は、キーの組み合わせの番号と値の列として保持します（キーの文字列と辞書は行ごとに持たない）。
+レコードごとに辞書とその値のオブジェクトを持つ場合に比べて、1件あたりのメモリが大幅に減ります。
+
+集計（フラグの件数、値ごとの件数、数値列）は列をまとめて処理できるので、
+ResultAggregator.add_table から1回の列走査で統計情報を作り直せます。
+反復すると従来と同じ辞書を1件ずつ組み立てて返すので、JSON保存などはそのまま使えます。
+"""
+
+import math
+from array import array
+from collections import Counter
+from datetime import datetime, timedelta
+from operator import itemgetter
+from typing import Dict, Iterable, Iterator, List, Optional
+
+# 列の種類
+# flag: 真偽値（1バイト）
+# int: 整数（8バイト）
+# float: 実数（8バイト、None は NaN で保持）
+# category: 取りうる値が少ないもの（値の一覧 + コード列。None も値として扱う）
+# timestamp: ISO 8601 形式の時刻文字列（エポックからのマイクロ秒で保持）
+# mapping: ヘッダーなどの辞書（キーの組み合わせの番号 + 値の列で保持する）
+# object: 上記以外（スキーマにないフィールドもこれで保持する）
+COLUMN_KINDS = ('flag', 'int', 'float', 'category', 'timestamp', 'mapping', 'object')
+
+class _Missing:
+    """スキーマにないフィールドがそのレコードに存在しなかったことを表す値"""
+
+    def __reduce__(self):
+        # 別プロセスから受け取った（pickleされた）テーブルでも同じオブジェクトになるようにする
+        return '_MISSING'
+
+
+_MISSING = _Missing()
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+_NO_TIMESTAMP = -(2 ** 63)
+
+
+class _CategoryColumn:
+    """辞書符号化した列（値の一覧 + コード列）"""
+
+    def __init__(self):
+        self.values = []
+        self._index = {}
+        self.codes = array('B')
+
+    def code(self, value) -> int:
+        code = self._index.get(value)
+        if code is None:
+            code = self._index[value] = len(self.values)
+            self.values.append(value)
+            # 値の種類がコードの幅を超えたら広げる
+            if code > 0xFF and self.codes.typecode == 'B':
+                self.codes = array('H', self.codes)
+            elif code > 0xFFFF and self.codes.typecode == 'H':
+                self.codes = array('L', self.codes)
+        return code
+
+    def append(self, value):
+        self.codes.append(self.code(value))
+
+    def extend(self, other: '_CategoryColumn'):
+        remap = [self.code(value) for value in other.values]
+        self.codes.extend([remap[code] for code in other.codes])
+
+    def value_counts(self) -> Dict:
+        """値ごとの件数"""
+        if self.codes.typecode == 'B':
+            # 1バイトのコード列はバイト列として数える（値の種類ごとにCレベルの走査1回）
+            raw = self.codes.tobytes()
+            counts = {value: raw.count(code) for code, value in enumerate(self.values)}
+        else:
+            by_code = Counter(self.codes)
+            counts = {value: by_code.get(code, 0) for code, value in enumerate(self.values)}
+        return {value: count for value, count in counts.items() if count}
+
+
+# mapping 列で値を共有する（同じ値を1つのオブジェクトにまとめる）種類数の上限
+MAX_SHARED_VALUES = 4096
+
+
+class _MappingColumn:
+    """辞書の列（キーの組み合わせの番号 + 全行の値を行順に並べたリスト）
+
+    レスポンスヘッダーのようにキーの組み合わせが数種類しかない辞書を、キーの組み合わせごとに1つのタプルと、
+    行ごとの番号（1バイト）・値の終わりの位置（8バイト）として保持する。値の文字列は、種類が
+    MAX_SHARED_VALUES に達するまでは同じ値を1つのオブジェクトにまとめる（Server や Content-Type など）。
+    """
+
+    def __init__(self):
+        self.key_sets = _CategoryColumn()
+        self.values = []
+        self.ends = array('q')
+        self._shared = {}
+
+    def append(self, mapping: Optional[Dict]):
+        if not mapping:
+            self.key_sets.append(())
+            self.ends.append(len(self.values))
+            return
+        shared = self._shared
+        values = self.values
+        self.key_sets.append(tuple(mapping))
+        for value in mapping.values():
+            try:
+                value = shared[value]
+            except KeyError:
+                if len(shared) < MAX_SHARED_VALUES:
+                    shared[value] = value
+            except TypeError:
+                # ハッシュできない値はそのまま持つ
+                pass
+            values.append(value)
+        self.ends.append(len(values))
+
+    def extend(self, other: '_MappingColumn'):
+        offset = len(self.values)
+        self.key_sets.extend(other.key_sets)
+        self.values.extend(other.values)
+        self.ends.extend([end + offset for end in other.ends])
+
+    def get(self, index: int) -> Dict:
+        keys = self.key_sets.values[self.key_sets.codes[index]]
+        if not keys:
+            return {}
+        end = self.ends[index]
+        return dict(zip(keys, self.values[end - len(keys):end]))
+
+    def __getstate__(self) -> Dict:
+        # 共有用の表は追加時にしか使わないので送らない（受け取った側では値を共有せずに追加する）
+        state = dict(self.__dict__)
+        state['_shared'] = {}
+        return state
+
+
+def _tuple_getter(names: List[str]):
+    """レコードから指定したキーの値をタプルで取り出す関数（キーが1つでもタプルを返す）"""
+    if not names:
+        return lambda record: ()
+    if len(names) == 1:
+        getter = itemgetter(names[0])
+        return lambda record: (getter(record),)
+    return itemgetter(*names)
+
+
+def _pack(typecode: str, values, convert) -> array:
+    """値のタプルを型付き配列にする（None などが混ざっていたら convert で変換してから）"""
+    try:
+        return array(typecode, values)
+    except TypeError:
+        return array(typecode, [convert(value) for value in values])
+
+
+def _to_flag(value) -> int:
+    return 1 if value else 0
+
+
+def _to_int(value) -> int:
+    return value or 0
+
+
+def _to_float(value) -> float:
+    return math.nan if value is None else value
+
+
+def _to_micros(value: Optional[str]) -> int:
+    if value is None:
+        return _NO_TIMESTAMP
+    return (datetime.fromisoformat(value) - _EPOCH) // _MICROSECOND
+
+
+def _from_micros(value: int) -> Optional[str]:
+    return None if value == _NO_TIMESTAMP else (_EPOCH + value * _MICROSECOND).isoformat()
+
+
+class ResultTable:
+    """結果レコードを列ごとに保持するテーブル（self.results として list の代わりに使う）
+
+    flag / int / float の列は種類ごとに1本の配列に行順で並べ（1件の追加が配列への追加1回で済む）、
+    列として取り出すときはストライド付きのスライスで切り出す。
+    """
+
+    def __init__(self, schema: Dict[str, str]):
+        # schema: フィールド名 -> 列の種類（COLUMN_KINDS）。レコードの辞書と同じ順に並べる
+        self.schema = dict(schema)
+        names = {kind: [name for name, k in self.schema.items() if k == kind] for kind in COLUMN_KINDS}
+        self._flag_names = names['flag']
+        self._int_names = names['int']
+        self._float_names = names['float']
+        self._get_flags = _tuple_getter(self._flag_names)
+        self._get_ints = _tuple_getter(self._int_names)
+        self._get_floats = _tuple_getter(self._float_names)
+        self._flags = array('b')
+        self._ints = array('q')
+        self._floats = array('d')
+        self._categories = {name: _CategoryColumn() for name in names['category']}
+        self._timestamps = {name: array('q') for name in names['timestamp']}
+        self._mappings = {name: _MappingColumn() for name in names['mapping']}
+        self._objects = {name: [] for name in names['object']}
+        # スキーマにないフィールド（レコードにない行は _MISSING）
+        self._extra = {}
+        self._count = 0
+
+    def append(self, record: Dict):
+        try:
+            flags = self._get_flags(record)
+            ints = self._get_ints(record)
+            floats = self._get_floats(record)
+            complete = True
+        except KeyError:
+            # スキーマのキーが欠けているレコード（既定値で埋める）
+            flags = tuple(record.get(name) for name in self._flag_names)
+            ints = tuple(record.get(name) for name in self._int_names)
+            floats = tuple(record.get(name) for name in self._float_names)
+            complete = False
+
+        # 変換に失敗しても途中まで追加された状態にならないよう、配列を作ってから連結する
+        flags = _pack('b', flags, _to_flag)
+        ints = _pack('q', ints, _to_int)
+        floats = _pack('d', floats, _to_float)
+        self._flags.extend(flags)
+        self._ints.extend(ints)
+        self._floats.extend(floats)
+
+        for name, column in self._categories.items():
+            column.append(record.get(name))
+        for name, data in self._timestamps.items():
+            data.append(_to_micros(record.get(name)))
+        for name, column in self._mappings.items():
+            column.append(record.get(name))
+        for name, data in self._objects.items():
+            data.append(record.get(name))
+
+        if self._extra or not complete or len(record) != len(self.schema):
+            self._append_extra(record)
+        self._count += 1
+
+    def _append_extra(self, record: Dict):
+        for name, value in record.items():
+            if name in self.schema:
+                continue
+            data = self._extra.get(name)
+            if data is None:
+                data = self._extra[name] = [_MISSING] * self._count
+            data.append(value)
+        for name, data in self._extra.items():
+            if len(data) == self._count:
+                data.append(_MISSING)
+
+    def extend(self, records: Iterable[Dict]):
+        if isinstance(records, ResultTable) and records.schema == self.schema:
+            # 同じスキーマのテーブル同士は列ごとに連結する
+            self._flags.extend(records._flags)
+            self._ints.extend(records._ints)
+            self._floats.extend(records._floats)
+            for group, others in ((self._categories, records._categories), (self._mappings, records._mappings)):
+                for name, column in group.items():
+                    column.extend(others[name])
+            for group, others in ((self._timestamps, records._timestamps), (self._objects, records._objects)):
+                for name, data in group.items():
+                    data.extend(others[name])
+            for name in set(self._extra) | set(records._extra):
+                data = self._extra.get(name)
+                if data is None:
+                    data = self._extra[name] = [_MISSING] * self._count
+                data.extend(records._extra.get(name, [_MISSING] * len(records)))
+            self._count += len(records)
+            return
+        for record in records:
+            self.append(record)
+
+    def clear(self):
+        self.__init__(self.schema)
+
+    def __getstate__(self) -> Dict:
+        # 値の取り出し関数（lambda を含む）はpickleできないので、受け取った側でスキーマから作り直す
+        state = dict(self.__dict__)
+        for name in ('_get_flags', '_get_ints', '_get_floats'):
+            del state[name]
+        return state
+
+    def __setstate__(self, state: Dict):
+        self.__dict__.update(state)
+        self._get_flags = _tuple_getter(self._flag_names)
+        self._get_ints = _tuple_getter(self._int_names)
+        self._get_floats = _tuple_getter(self._float_names)
+
+    def row(self, index: int) -> Dict:
+        """1件分のレコードを辞書として組み立てる"""
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('result index out of range')
+
+        values = {}
+        for names, data, convert in ((self._flag_names, self._flags, bool),
+                                     (self._int_names, self._ints, None),
+                                     (self._float_names, self._floats, _from_float)):
+            width = len(names)
+            row = data[index * width:(index + 1) * width]
+            for name, value in zip(names, row):
+                values[name] = convert(value) if convert else value
+        for name, column in self._categories.items():
+            values[name] = column.values[column.codes[index]]
+        for name, data in self._timestamps.items():
+            values[name] = _from_micros(data[index])
+        for name, column in self._mappings.items():
+            values[name] = column.get(index)
+        for name, data in self._objects.items():
+            values[name] = data[index]
+
+        record = {name: values[name] for name in self.schema}
+        for name, data in self._extra.items():
+            value = data[index]
+            if value is not _MISSING:
+                record[name] = value
+        return record
+
+    def __getitem__(self, index: int) -> Dict:
+        return self.row(index)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[Dict]:
+        for index in range(self._count):
+            yield self.row(index)
+
+    # ---- 列単位のアクセス（集計用） ----
+
+    def has(self, name: str) -> bool:
+        return name in self.schema
+
+    def kind(self, name: str) -> Optional[str]:
+        return self.schema.get(name)
+
+    def values(self, name: str):
+        """flag / int / float 列を配列で返す（float 列の None は NaN）"""
+        kind = self.schema[name]
+        if kind == 'flag':
+            names, data = self._flag_names, self._flags
+        elif kind == 'int':
+            names, data = self._int_names, self._ints
+        elif kind == 'float':
+            names, data = self._float_names, self._floats
+        else:
+            raise TypeError(f"Column {name!r} is not numeric ({kind})")
+        return data[names.index(name)::len(names)]
+
+    def decoded(self, name: str) -> List:
+        """列の値を（カテゴリ列はコードを値に戻して）リストで返す"""
+        kind = self.schema[name]
+        if kind == 'category':
+            column = self._categories[name]
+            values = column.values
+            return [values[code] for code in column.codes]
+        if kind == 'flag':
+            return [value == 1 for value in self.values(name)]
+        if kind == 'float':
+            return [_from_float(value) for value in self.values(name)]
+        if kind == 'int':
+            return self.values(name).tolist()
+        if kind == 'timestamp':
+            return [_from_micros(value) for value in self._timestamps[name]]
+        if kind == 'mapping':
+            column = self._mappings[name]
+            return [column.get(index) for index in range(self._count)]
+        return list(self._objects[name])
+
+    def codes(self, name: str):
+        """カテゴリ列のコード列と値の一覧"""
+        column = self._categories[name]
+        return column.codes, column.values
+
+    def count_true(self, name: str) -> int:
+        return self.values(name).tobytes().count(1)
+
+    def value_counts(self, name: str) -> Dict:
+        return self._categories[name].value_counts()
+
+
+def _from_float(value: float) -> Optional[float]:
+    return None if value != value else value
+
+
+def json_default(value):
+    """json.dump の default 用（ResultTable はレコードの配列として保存する）"""
+    if isinstance(value, ResultTable):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -0,0 +1,438 @@
+"""
+テスト結果のSQLiteストア（取り込みと検索）
+
+実行ごとの結果ファイル（*_results_YYYYMMDD_HHMMSS.json）を比べるには、インデント付きのJSONを毎回
+まるごと読み込む必要があります。ingest で各実行の test_summary などの要約と detailed_results を
+インデックス付きのSQLiteデータベースに1回だけ取り込み、以降の検索はデータベースに対して行います。
+
+    python attack-scripts/results_db.py ingest                       # attack-scripts/*_results_*.json / .rbin を取り込む
+    python attack-scripts/results_db.py runs --target contact2       # 実行の一覧（ブロック率など）
+    python attack-scripts/results_db.py latency --by day,status      # ステータスコード別の p95 の推移
+    python attack-scripts/results_db.py rates --by run               # 実行ごとのブロック率・チャレンジ率
+    python attack-scripts/results_db.py sql "SELECT ..."             # 任意のSQL
+
+取り込み済みのファイルはサイズと更新時刻が変わっていなければ読み飛ばします。
+ストリーム保存（--stream-results）した実行は、結果ファイルが参照するJSONLファイルから取り込みます。
+バイナリ形式（.rbin）の結果ファイルはメモリマップして1件ずつ取り込みます。
+パーセンタイルは latency_stats.LatencyHistogram で計算します（SQLiteには集計関数がないため）。
+"""
+
+import argparse
+import glob
+import itertools
+import json
+import logging
+import os
+import re
+import sqlite3
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from latency_stats import LatencyHistogram
+from result_binary import BinaryResults
+from result_sink import iter_jsonl
+from result_table import json_default
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATABASE = 'attack-scripts/results.db'
+DEFAULT_PATTERNS = ('attack-scripts/*_results_*.json', 'attack-scripts/*_results_*.rbin')
+
+# 結果ファイル名（スクリプト名と保存時刻）
+RESULT_FILE_PATTERN = re.compile(r'(?P<script>.+)_results_(?P<stamp>\d{8}_\d{6})\.(json|rbin)$')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    file TEXT NOT NULL UNIQUE,
+    file_size INTEGER,
+    file_mtime REAL,
+    script TEXT,
+    started_at TEXT,
+    target_url TEXT,
+    api_endpoint TEXT,
+    total_time REAL,
+    total_requests INTEGER,
+    successful_requests INTEGER,
+    success_rate REAL,
+    block_rate REAL,
+    challenge_rate REAL,
+    requests_per_second REAL,
+    load_model TEXT,
+    target_rate REAL,
+    p50 REAL,
+    p95 REAL,
+    p99 REAL,
+    summary TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_started_at ON runs (started_at);
+CREATE INDEX IF NOT EXISTS runs_target_url ON runs (target_url);
+
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    attempt INTEGER,
+    thread_id INTEGER,
+    worker_id INTEGER,
+    timestamp TEXT,
+    success INTEGER,
+    error TEXT,
+    status_code INTEGER,
+    response_time REAL,
+    service_time REAL,
+    start_lag REAL,
+    cloudflare_blocked INTEGER,
+    challenge_detected INTEGER,
+    bot_score REAL,
+    page_title TEXT,
+    cf_ray TEXT,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS results_run_status ON results (run_id, status_code);
+CREATE INDEX IF NOT EXISTS results_timestamp ON results (timestamp);
+"""
+
+RESULT_COLUMNS = ('run_id', 'attempt', 'thread_id', 'worker_id', 'timestamp', 'success', 'error', 'status_code',
+                  'response_time', 'service_time', 'start_lag', 'cloudflare_blocked', 'challenge_detected',
+                  'bot_score', 'page_title', 'cf_ray', 'extra')
+
+# 列として持つ、または取り込まないレコードのキー（それ以外のスカラー値は extra にJSONで入れる）
+_RECORD_KEYS = frozenset(RESULT_COLUMNS) | {
+    'process_id', 'intended_start', 'actual_start', 'response_headers', 'cloudflare_headers', 'header_set'
+}
+
+# 検索の --by に指定できる集計の単位（SQLの式）
+GROUP_KEYS = {
+    'run': 'r.run_id',
+    'script': 'r.script',
+    'target': 'r.target_url',
+    'status': "COALESCE(x.status_code, 'none')",
+    'day': 'substr(x.timestamp, 1, 10)',
+    'hour': 'substr(x.timestamp, 1, 13)',
+    'minute': 'substr(x.timestamp, 1, 16)',
+    'worker': 'x.worker_id',
+    'error': 'x.error'
+}
+
+
+def connect(path: str = DEFAULT_DATABASE) -> sqlite3.Connection:
+    """データベースを開く（なければスキーマを作る）"""
+    db = sqlite3.connect(path)
+    db.execute('PRAGMA foreign_keys = ON')
+    db.executescript(SCHEMA)
+    return db
+
+
+def _started_at(path: str, stats: Dict) -> Optional[str]:
+    """実行の開始時刻（ファイル名の保存時刻から実行時間を引く。取れなければ最初のレコードの時刻）"""
+    match = RESULT_FILE_PATTERN.search(os.path.basename(path))
+    if match:
+        saved = datetime.strptime(match.group('stamp'), '%Y%m%d_%H%M%S')
+        total_time = stats.get('test_summary', {}).get('total_time') or 0
+        return datetime.fromtimestamp(saved.timestamp() - total_time).isoformat(timespec='seconds')
+    results = stats.get('detailed_results') or []
+    return results[0].get('timestamp') if results else None
+
+
+def _run_row(path: str, stats: Dict) -> Dict:
+    """runs テーブルの1行（古い形式の結果ファイルにない値は NULL）"""
+    summary = stats.get('test_summary', {})
+    detection = stats.get('cloudflare_detection', {})
+    performance = stats.get('performance', {})
+    latency = performance.get('latency') or {}
+    total = summary.get('total_requests') or 0
+    block_rate = detection.get('block_rate')
+    if block_rate is None and 'blocks' in detection:
+        block_rate = detection['blocks'] / total * 100 if total else 0
+    match = RESULT_FILE_PATTERN.search(os.path.basename(path))
+    stat = os.stat(path)
+    return {
+        'file': path,
+        'file_size': stat.st_size,
+        'file_mtime': stat.st_mtime,
+        'script': match.group('script') if match else None,
+        'started_at': _started_at(path, stats),
+        'target_url': summary.get('target_url'),
+        'api_endpoint': summary.get('api_endpoint'),
+        'total_time': summary.get('total_time'),
+        'total_requests': total,
+        'successful_requests': summary.get('successful_requests'),
+        'success_rate': summary.get('success_rate'),
+        'block_rate': block_rate,
+        'challenge_rate': detection.get('challenge_rate'),
+        'requests_per_second': performance.get('requests_per_second'),
+        'load_model': performance.get('load_model'),
+        'target_rate': performance.get('target_rate'),
+        'p50': latency.get('p50'),
+        'p95': latency.get('p95'),
+        'p99': latency.get('p99'),
+        # 詳細結果以外の要約（ヘッダーセットや飽和点探索などもそのまま残す）
+        'summary': json.dumps({key: value for key, value in stats.items() if key != 'detailed_results'},
+                              ensure_ascii=False, default=json_default)
+    }
+
+
+def _cf_ray(record: Dict) -> Optional[str]:
+    for headers in (record.get('cloudflare_headers'), record.get('response_headers')):
+        for name, value in (headers or {}).items():
+            if name.lower() == 'cf-ray':
+                return value
+    return None
+
+
+def _result_rows(run_id: int, records: Iterable[Dict]):
+    """results テーブルの行（RESULT_COLUMNS の順のタプル）"""
+    for record in records:
+        intended_start = record.get('intended_start')
+        actual_start = record.get('actual_start')
+        extra = {key: value for key, value in record.items()
+                 if key not in _RECORD_KEYS and not isinstance(value, (dict, list))}
+        worker_id = record.get('worker_id')
+        if worker_id is None:
+            worker_id = record.get('process_id')
+        yield (
+            run_id,
+            record.get('attempt'),
+            record.get('thread_id'),
+            worker_id,
+            record.get('timestamp'),
+            record.get('success'),
+            record.get('error'),
+            record.get('status_code'),
+            record.get('response_time'),
+            record.get('service_time'),
+            max(actual_start - intended_start, 0) if intended_start and actual_start else None,
+            record.get('cloudflare_blocked'),
+            record.get('challenge_detected'),
+            record.get('bot_score'),
+            record.get('page_title'),
+            _cf_ray(record),
+            json.dumps(extra, ensure_ascii=False, default=json_default) if extra else None
+        )
+
+
+def ingest_file(db: sqlite3.Connection, path: str, force: bool = False) -> Optional[int]:
+    """結果ファイルを1つ取り込み、取り込んだ結果レコードの件数を返す（変更がなく読み飛ばした場合は None）"""
+    stat = os.stat(path)
+    existing = db.execute('SELECT run_id, file_size, file_mtime FROM runs WHERE file = ?', (path,)).fetchone()
+    if existing and not force and existing[1] == stat.st_size and existing[2] == stat.st_mtime:
+        return None
+
+    binary = None
+    if path.endswith('.rbin'):
+        # バイナリ結果ファイルはメモリマップしたまま1件ずつ読む
+        binary = BinaryResults(path)
+        stats = binary.stats
+        records = binary
+    else:
+        with open(path, encoding='utf-8') as f:
+            stats = json.load(f)
+        if stats.get('detailed_results_files'):
+            records = iter_jsonl(stats['detailed_results_files'])
+        else:
+            records = stats.get('detailed_results') or []
+
+    try:
+        row = _run_row(path, stats)
+        with db:
+            if existing:
+                db.execute('DELETE FROM runs WHERE run_id = ?', (existing[0],))
+            cursor = db.execute(f"INSERT INTO runs ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})",
+                                tuple(row.values()))
+            run_id = cursor.lastrowid
+            before = db.total_changes
+            db.executemany(f"INSERT INTO results ({', '.join(RESULT_COLUMNS)}) "
+                           f"VALUES ({', '.join('?' * len(RESULT_COLUMNS))})", _result_rows(run_id, records))
+            return db.total_changes - before
+    finally:
+        if binary is not None:
+            binary.close()
+
+
+def ingest(db: sqlite3.Connection, paths: Sequence[str], force: bool = False) -> Dict[str, int]:
+    """結果ファイルをまとめて取り込む（壊れたファイルは警告して飛ばす）"""
+    counts = {'ingested': 0, 'skipped': 0, 'failed': 0, 'results': 0}
+    for path in paths:
+        try:
+            added = ingest_file(db, path, force=force)
+        except (OSError, ValueError, sqlite3.Error) as e:
+            logger.warning(f"Failed to ingest {path}: {e}")
+            counts['failed'] += 1
+            continue
+        if added is None:
+            counts['skipped'] += 1
+        else:
+            counts['ingested'] += 1
+            counts['results'] += added
+            logger.info(f"Ingested {path}: {added} results")
+    return counts
+
+
+def expand_paths(patterns: Sequence[str]) -> List[str]:
+    """取り込むファイルの一覧（patterns が空の場合は DEFAULT_PATTERNS）
+
+    指定されたパスは一致するファイルがなくてもそのまま返し、ingest で失敗として報告させる。
+    既定のパターンは一致するファイルがなければ飛ばす。
+    """
+    paths = []
+    for pattern in patterns or DEFAULT_PATTERNS:
+        matches = sorted(glob.glob(pattern))
+        paths.extend(matches or ([pattern] if patterns else []))
+    return paths
+
+
+def _filters(args) -> Tuple[str, List]:
+    """検索の絞り込み条件（WHERE 句と値）"""
+    clauses = []
+    values = []
+    if args.target:
+        clauses.append('r.target_url LIKE ?')
+        values.append(f'%{args.target}%')
+    if args.script:
+        clauses.append('r.script = ?')
+        values.append(args.script)
+    if args.since:
+        clauses.append('r.started_at >= ?')
+        values.append(args.since)
+    if args.run:
+        clauses.append(f"r.run_id IN ({', '.join('?' * len(args.run))})")
+        values.extend(args.run)
+    return (' AND '.join(clauses) or '1'), values
+
+
+def _group_keys(text: str) -> List[str]:
+    keys = [key.strip() for key in text.split(',') if key.strip()]
+    unknown = [key for key in keys if key not in GROUP_KEYS]
+    if unknown or not keys:
+        raise argparse.ArgumentTypeError(f"Unknown group key(s): {', '.join(unknown) or text!r} "
+                                         f"(choose from {', '.join(GROUP_KEYS)})")
+    return keys
+
+
+def query_runs(db: sqlite3.Connection, args) -> Tuple[List[str], List[tuple]]:
+    where, values = _filters(args)
+    headers = ['run', 'started_at', 'script', 'target_url', 'requests', 'success%', 'block%', 'challenge%',
+               'req/s', 'p95']
+    rows = db.execute(f"""
+        SELECT r.run_id, r.started_at, r.script, r.target_url, r.total_requests, r.success_rate, r.block_rate,
+               r.challenge_rate, r.requests_per_second, r.p95
+        FROM runs r WHERE {where} ORDER BY r.started_at
+    """, values).fetchall()
+    return headers, rows
+
+
+def query_rates(db: sqlite3.Connection, args) -> Tuple[List[str], List[tuple]]:
+    where, values = _filters(args)
+    keys = [GROUP_KEYS[key] for key in args.by]
+    headers = list(args.by) + ['requests', 'success%', 'block%', 'challenge%', '403', '429', 'errors']
+    rows = db.execute(f"""
+        SELECT {', '.join(keys)}, COUNT(*), AVG(x.success) * 100, AVG(x.cloudflare_blocked) * 100,
+               AVG(x.challenge_detected) * 100, SUM(x.status_code = 403), SUM(x.status_code = 429),
+               SUM(x.status_code IS NULL)
+        FROM results x JOIN runs r ON r.run_id = x.run_id
+        WHERE {where} GROUP BY {', '.join(keys)} ORDER BY {', '.join(keys)}
+    """, values).fetchall()
+    return headers, rows
+
+
+def query_latency(db: sqlite3.Connection, args) -> Tuple[List[str], List[tuple]]:
+    """グループごとのレイテンシのパーセンタイル（行はグループ順に読み、ヒストグラムに入れる）"""
+    where, values = _filters(args)
+    keys = [GROUP_KEYS[key] for key in args.by]
+    cursor = db.execute(f"""
+        SELECT {', '.join(keys)}, x.response_time
+        FROM results x JOIN runs r ON r.run_id = x.run_id
+        WHERE x.response_time > 0 AND {where} ORDER BY {', '.join(keys)}
+    """, values)
+    width = len(keys)
+    headers = list(args.by) + ['requests', 'mean', 'p50', 'p90', 'p95', 'p99', 'max']
+    rows = []
+    for group, group_rows in itertools.groupby(cursor, key=lambda row: row[:width]):
+        histogram = LatencyHistogram()
+        histogram.record_many([row[width] for row in group_rows])
+        summary = histogram.summary()
+        rows.append(group + (summary['count'], summary['mean'], summary['p50'], summary['p90'], summary['p95'],
+                             summary['p99'], summary['max']))
+    return headers, rows
+
+
+def _format_value(value) -> str:
+    if value is None:
+        return '-'
+    if isinstance(value, float):
+        return f'{value:.3f}' if abs(value) < 10 else f'{value:.1f}'
+    return str(value)
+
+
+def print_table(headers: List[str], rows: List[tuple]):
+    """検索結果を列を揃えて出力"""
+    cells = [headers] + [[_format_value(value) for value in row] for row in rows]
+    widths = [max(len(row[index]) for row in cells) for index in range(len(headers))]
+    for number, row in enumerate(cells):
+        print('  '.join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip())
+        if number == 0:
+            print('  '.join('-' * width for width in widths))
+
+
+def main():
+    """メイン関数"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Index test result files in SQLite and query them')
+    parser.add_argument('--db', default=DEFAULT_DATABASE,
+                        help=f'SQLite database file (default: {DEFAULT_DATABASE})')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    ingest_parser = commands.add_parser('ingest', help='Load result files into the database')
+    ingest_parser.add_argument('paths', nargs='*',
+                               help=f"Result files or glob patterns (default: {' '.join(DEFAULT_PATTERNS)})")
+    ingest_parser.add_argument('--force', action='store_true',
+                               help='Re-ingest files even if their size and mtime are unchanged')
+
+    for name, description in (('runs', 'List ingested runs with their summary rates'),
+                              ('rates', 'Success/block/challenge rates grouped by --by'),
+                              ('latency', 'Latency percentiles grouped by --by')):
+        query_parser = commands.add_parser(name, help=description)
+        query_parser.add_argument('--target', help='Only runs whose target URL contains this text')
+        query_parser.add_argument('--script', help='Only runs of this script, e.g. simple_test')
+        query_parser.add_argument('--since', help='Only runs started at or after this ISO date/time')
+        query_parser.add_argument('--run', type=int, action='append', help='Only this run id (repeatable)')
+        query_parser.add_argument('--json', action='store_true', help='Print rows as JSON')
+        if name != 'runs':
+            query_parser.add_argument('--by', type=_group_keys, default=['run'] if name == 'rates' else ['status'],
+                                      help=f"Comma-separated group keys: {', '.join(GROUP_KEYS)} "
+                                           f"(default: {'run' if name == 'rates' else 'status'})")
+
+    sql_parser = commands.add_parser('sql', help='Run an SQL query against the runs/results tables')
+    sql_parser.add_argument('query')
+    sql_parser.add_argument('--json', action='store_true', help='Print rows as JSON')
+
+    args = parser.parse_args()
+    db = connect(args.db)
+    try:
+        if args.command == 'ingest':
+            counts = ingest(db, expand_paths(args.paths), force=args.force)
+            logger.info(f"Ingested {counts['ingested']} files ({counts['results']} results), "
+                        f"skipped {counts['skipped']} unchanged, {counts['failed']} failed")
+            return 1 if counts['failed'] else 0
+
+        if args.command == 'sql':
+            cursor = db.execute(args.query)
+            headers = [column[0] for column in cursor.description or []]
+            rows = cursor.fetchall()
+        else:
+            query = {'runs': query_runs, 'rates': query_rates, 'latency': query_latency}[args.command]
+            headers, rows = query(db, args)
+
+        if args.json:
+            print(json.dumps([dict(zip(headers, row)) for row in rows], ensure_ascii=False, indent=2))
+        else:
+            print_table(headers, rows)
+    except sqlite3.Error as e:
+        logger.error(f"Query failed: {e}")
+        return 1
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
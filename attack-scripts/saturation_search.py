@@ -0,0 +1,187 @@
+"""
+飽和点（Bot Fight Mode が発動し始めるリクエストレート）の探索
+
+レートを段階的に上げながら各段で一定時間（ウィンドウ）オープンループで送信し、そのウィンドウ内の
+ブロック（403）・レート制限（429）・チャレンジ（503 など）の割合を測ります。防御応答の割合が
+しきい値を超えた段が見つかったら、直前の通過した段との間を二分探索して発動点を絞り込みます。
+
+各ウィンドウの実行はテスター側の関数（rate, num_requests を受け取り、そのウィンドウだけの
+ResultAggregator を返す）に任せるので、送信の方法（スレッド・asyncio）には依存しません。
+"""
+
+import logging
+import math
+import time
+from typing import Callable, Dict, List, Optional
+
+from latency_stats import ResultAggregator
+
+logger = logging.getLogger(__name__)
+
+# 防御応答として数えるステータスコード（ステータスコードだけで分類する。テスターの challenge_detected は
+# 本文のキーワードでも立ち、"Cloudflare" を含む403のブロックページでも True になるため、ここでは数えない）
+BLOCK_STATUS_CODES = (403,)
+RATE_LIMIT_STATUS_CODES = (429,)
+CHALLENGE_STATUS_CODES = (503, 520, 521, 522, 523, 524)
+
+
+def step_rates(start: float, limit: float, step: Optional[float] = None, factor: float = 2.0) -> List[float]:
+    """段階的に上げるレートの列（step 指定時は等差、それ以外は factor 倍ずつ。最後は limit で止める）"""
+    if start <= 0 or limit < start:
+        raise ValueError(f"Invalid rate range: {start} - {limit}")
+    if step is None and factor <= 1:
+        raise ValueError(f"Step factor must be > 1: {factor}")
+    rates = []
+    rate = start
+    while rate < limit:
+        rates.append(rate)
+        rate = rate + step if step else rate * factor
+    rates.append(limit)
+    return rates
+
+
+class WindowResult:
+    """1ウィンドウ（1つのレートでの計測）の結果"""
+
+    def __init__(self, phase: str, rate: float, aggregator: ResultAggregator, started_at: float, finished_at: float,
+                 trip_threshold: float):
+        self.phase = phase
+        self.rate = rate
+        self.started_at = started_at
+        self.finished_at = finished_at
+        total = aggregator.total
+        codes = aggregator.status_codes
+        self.requests = total
+        self.blocked = sum(codes.get(code, 0) for code in BLOCK_STATUS_CODES)
+        self.rate_limited = sum(codes.get(code, 0) for code in RATE_LIMIT_STATUS_CODES)
+        self.challenged = sum(codes.get(code, 0) for code in CHALLENGE_STATUS_CODES)
+        # ステータスコードのない失敗（タイムアウト・接続エラー）
+        self.errors = total - sum(codes.values())
+        self.success_rate = aggregator.rate('success')
+        self.defense_rate = self._percent(self.blocked + self.rate_limited + self.challenged)
+        self.tripped = self.defense_rate > trip_threshold
+        self.latency = aggregator.response_times.summary()
+        self.latency_by_status_code = aggregator.latency_report()['by_status_code']
+
+    def _percent(self, count: int) -> float:
+        return count / self.requests * 100 if self.requests else 0
+
+    @property
+    def achieved_rate(self) -> float:
+        elapsed = self.finished_at - self.started_at
+        return self.requests / elapsed if elapsed > 0 else 0
+
+    def to_dict(self) -> Dict:
+        return {
+            'phase': self.phase,
+            'target_rate': self.rate,
+            'achieved_rate': self.achieved_rate,
+            'requests': self.requests,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'success_rate': self.success_rate,
+            'block_rate': self._percent(self.blocked),
+            'rate_limit_rate': self._percent(self.rate_limited),
+            'challenge_rate': self._percent(self.challenged),
+            'error_rate': self._percent(self.errors),
+            'defense_rate': self.defense_rate,
+            'tripped': self.tripped,
+            'latency': self.latency,
+            'latency_by_status_code': self.latency_by_status_code
+        }
+
+
+class SaturationSearch:
+    """段階的なレートの引き上げと二分探索で、防御応答が出始めるレートを探す"""
+
+    def __init__(self, run_window: Callable[[float, int], ResultAggregator], start_rate: float, max_rate: float,
+                 step: Optional[float] = None, factor: float = 2.0, window: float = 10.0, min_requests: int = 20,
+                 trip_threshold: float = 5.0, resolution: float = 0.1, max_probes: int = 6, cooldown: float = 0.0):
+        # run_window(rate, num_requests): そのレートで num_requests 件を送信し、そのウィンドウだけの集計器を返す
+        self.run_window = run_window
+        self.rates = step_rates(start_rate, max_rate, step, factor)
+        self.window = window
+        self.min_requests = min_requests
+        # 防御応答の割合（%）がこれを超えたウィンドウを「発動」とみなす
+        self.trip_threshold = trip_threshold
+        # 二分探索の終了条件（通過・発動のレートの差が発動側のレートに対してこの割合以下）と最大試行回数
+        self.resolution = resolution
+        self.max_probes = max_probes
+        # ウィンドウ間の待機（発動後のブロックが次のウィンドウに持ち越されないようにする）
+        self.cooldown = cooldown
+        self.windows = []
+
+    def _measure(self, phase: str, rate: float) -> WindowResult:
+        if self.windows and self.cooldown > 0:
+            time.sleep(self.cooldown)
+        num_requests = max(self.min_requests, int(math.ceil(rate * self.window)))
+        logger.info(f"Saturation search ({phase}): {rate:.2f} req/s x {num_requests} requests")
+        started_at = time.time()
+        aggregator = self.run_window(rate, num_requests)
+        result = WindowResult(phase, rate, aggregator, started_at, time.time(), self.trip_threshold)
+        self.windows.append(result)
+        logger.info(f"Saturation search ({phase}): {rate:.2f} req/s -> defense {result.defense_rate:.1f}% "
+                    f"(403 {result.blocked}, 429 {result.rate_limited}, challenge {result.challenged}), "
+                    f"p95 {result.latency['p95']:.3f}s{' [TRIPPED]' if result.tripped else ''}")
+        return result
+
+    def run(self) -> Dict:
+        """探索を実行してレポートを返す"""
+        passed = None
+        tripped = None
+        for rate in self.rates:
+            result = self._measure('step', rate)
+            if result.tripped:
+                tripped = result
+                break
+            passed = result
+
+        probes = 0
+        if tripped is not None and passed is not None:
+            low, high = passed.rate, tripped.rate
+            while probes < self.max_probes and (high - low) / high > self.resolution:
+                middle = (low + high) / 2
+                result = self._measure('bisect', middle)
+                probes += 1
+                if result.tripped:
+                    high = middle
+                else:
+                    low = middle
+            max_passing_rate, min_tripping_rate = low, high
+        else:
+            max_passing_rate = passed.rate if passed else None
+            min_tripping_rate = tripped.rate if tripped else None
+
+        if tripped is None:
+            logger.info(f"Saturation search: no defense response up to {self.rates[-1]:.2f} req/s")
+        elif passed is None:
+            logger.info(f"Saturation search: tripped already at the start rate {self.rates[0]:.2f} req/s")
+        else:
+            logger.info(f"Saturation search: tipping point between {max_passing_rate:.2f} and "
+                        f"{min_tripping_rate:.2f} req/s")
+
+        return {
+            'trip_threshold': self.trip_threshold,
+            'window': self.window,
+            'tipping_point': {
+                # 発動しなかった最大のレートと、発動した最小のレート（発動点はこの間）
+                'max_passing_rate': max_passing_rate,
+                'min_tripping_rate': min_tripping_rate,
+                'found': tripped is not None and passed is not None,
+                'bisect_probes': probes
+            },
+            # 実行順のウィンドウ
+            'windows': [window.to_dict() for window in self.windows],
+            # レート順に並べたレイテンシ曲線
+            'latency_curve': [
+                {
+                    'target_rate': window.rate,
+                    'achieved_rate': window.achieved_rate,
+                    'p50': window.latency['p50'],
+                    'p95': window.latency['p95'],
+                    'p99': window.latency['p99'],
+                    'defense_rate': window.defense_rate
+                }
+                for window in sorted(self.windows, key=lambda window: window.rate)
+            ]
+        }
@@ -12,28 +12,71 @@ import logging
 import json
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Dict, List
+from typing import Dict, List, Optional
 import random
 import string
+import asyncio
 
 import requests
+import aiohttp
 
-# ログ設定
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('attack-scripts/simple_test.log'),
-        logging.StreamHandler()
-    ]
-)
+from browser_clearance import ClearanceBroker
+from concurrency_limiter import AIMDLimiter
+from distributed import DEFAULT_READ_TIMEOUT, Coordinator, CoordinatorLost, RemoteResults, parse_address, run_worker
+from header_capture import HEADER_CAPTURE_LEVELS, HeaderCapture
+from http_sessions import SessionManager, build_connection_stats, merge_connection_stats
+from latency_stats import ResultAggregator, aggregate
+from log_setup import configure_attempt_logging, parse_log_sample, result_outcome, setup_logging
+from live_metrics import LiveMetrics, describe_live_metrics, metrics_path
+from load_scheduler import OpenLoopScheduler, parse_rate
+from request_timing import PhaseTimer, describe_phases, phase_fields, phase_report, timed_request, trace_phases
+from result_binary import OUTPUT_FORMATS, write_binary_results
+from result_sink import StreamingResults, detach_streamed_results, result_stream_path
+from result_table import ResultTable, json_default
+from saturation_search import SaturationSearch
+
+# ログ設定（書き込みはキュー経由でリスナースレッドが行う）
+setup_logging('attack-scripts/simple_test.log')
 logger = logging.getLogger(__name__)
+# 試行ごとのログ（--quiet / --log-sample の対象。引数は出力するときにだけ整形される）
+attempt_logger = logging.getLogger(f'{__name__}.attempts')
 
 
 class SimpleBotTester:
     """シンプルなHTTPリクエストベースのBotテスタークラス"""
     
-    def __init__(self, target_url: str, api_endpoint: str = None):
+    # 統計情報で件数を数えるフラグと、平均・分布を出す時間の項目
+    STAT_FLAG_FIELDS = ('success', 'cloudflare_blocked', 'challenge_detected')
+    STAT_TIMING_FIELDS = ('service_time',) + phase_fields()
+    # 結果テーブルの列（結果レコードのキーと同じ順）
+    RESULT_COLUMNS = {
+        'thread_id': 'int',
+        'attempt': 'int',
+        'timestamp': 'timestamp',
+        'success': 'flag',
+        'error': 'category',
+        'response_time': 'float',
+        'intended_start': 'float',
+        'actual_start': 'float',
+        'service_time': 'float',
+        # DNS・接続・TLS・TTFB・本文受信・レスポンスの処理の所要時間（dns_time, ..., processing_time）
+        **{field: 'float' for field in phase_fields()},
+        'status_code': 'category',
+        'cloudflare_blocked': 'flag',
+        'challenge_detected': 'flag',
+        'bot_score': 'float',
+        'response_headers': 'mapping',
+        'cloudflare_headers': 'mapping',
+        'header_set': 'category',
+        # ハイブリッドモードで使ったクリアランス（"ブラウザ番号:取得回数"）
+        'clearance': 'category'
+    }
+    
+    def __init__(self, target_url: str, api_endpoint: str = None, per_worker_sessions: bool = False,
+                 pool_size: int = 10, keep_alive: bool = True, max_retries: int = 0,
+                 stream_results: bool = False, fsync_interval: float = 1.0, capture_headers: str = 'all',
+                 output_format: str = 'json',
+                 live_metrics: Optional[LiveMetrics] = None, clearance_broker: Optional[ClearanceBroker] = None):
         self.target_url = target_url
         # APIエンドポイントが指定されていない場合は、target_urlから推測
         if api_endpoint is None:
@@ -41,24 +84,50 @@ class SimpleBotTester:
             self.api_endpoint = f"{base_url}/api/contact"
         else:
             self.api_endpoint = api_endpoint
-        self.results = []
+        self.results = ResultTable(self.RESULT_COLUMNS)
+        self.aggregator = ResultAggregator(self.STAT_FLAG_FIELDS, self.STAT_TIMING_FIELDS)
+        self.target_rate = None
+        # Trueの場合、結果をメモリに溜めずJSONLファイルへ逐次書き出す
+        self.stream_results = stream_results
+        self.fsync_interval = fsync_interval
+        # 結果ファイルの形式（json / binary）
+        self.output_format = output_format
+        # 実行中のメトリクス（秒単位のウィンドウ・Prometheusエンドポイント）
+        self.live_metrics = live_metrics
+        # レスポンスヘッダーの記録（none / cf / all）
+        self.header_capture = HeaderCapture(capture_headers)
+        # 適応的な同時実行数の制御（run_test で adaptive=True のときに作る）
+        self.concurrency_limiter = None
+        # asyncioエンジンの接続数カウンタ（aiohttpのトレースで集計）
+        self._async_connection_counts = None
+        # 分散実行時にワーカーから受け取った接続統計の合計
+        self.remote_connection_stats = None
+        # 送信ループで1件ごとに呼ぶ関数（例外を送出すると残りを送らずに止める。分散実行のワーカーで使う）
+        self.abort_check = None
+        # ハイブリッドモード: ブラウザで取得したCookieとUser-Agentを付けて送信する（start 済みのもの）
+        self.clearance_broker = clearance_broker
         
         # セッションを作成（Cookieなどを保持）
-        self.session = requests.Session()
-        
         # 一般的なブラウザのUser-Agentを設定
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/139.0.0.0 Safari/537.36',
-            'Accept': 'application/json, text/plain, */*',
-            'Accept-Language': 'ja,en-US;q=0.9,en;q=0.8',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'DNT': '1',
-            'Connection': 'keep-alive',
-            'Sec-Fetch-Dest': 'empty',
-            'Sec-Fetch-Mode': 'cors',
-            'Sec-Fetch-Site': 'same-origin',
-            'Content-Type': 'application/json'
-        })
+        self.sessions = SessionManager(
+            headers={
+                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/139.0.0.0 Safari/537.36',
+                'Accept': 'application/json, text/plain, */*',
+                'Accept-Language': 'ja,en-US;q=0.9,en;q=0.8',
+                'Accept-Encoding': 'gzip, deflate, br',
+                'DNT': '1',
+                'Connection': 'keep-alive',
+                'Sec-Fetch-Dest': 'empty',
+                'Sec-Fetch-Mode': 'cors',
+                'Sec-Fetch-Site': 'same-origin',
+                'Content-Type': 'application/json'
+            },
+            per_worker=per_worker_sessions,
+            pool_size=pool_size,
+            keep_alive=keep_alive,
+            max_retries=max_retries
+        )
+        self.session = self.sessions.shared
     
     def generate_random_email(self) -> str:
         """ランダムなメールアドレスを生成"""
@@ -80,169 +149,383 @@ class SimpleBotTester:
         ]
         return random.choice(messages)
     
-    def submit_contact_form(self, thread_id: int, attempt: int) -> Dict:
-        """コンタクトフォームにデータを送信"""
-        start_time = time.time()
-        result = {
+    def _new_result(self, thread_id: int, attempt: int, intended_start: float, actual_start: float) -> Dict:
+        """1リクエスト分の結果レコードを初期化"""
+        return {
             'thread_id': thread_id,
             'attempt': attempt,
             'timestamp': datetime.now().isoformat(),
             'success': False,
             'error': None,
             'response_time': 0,
+            'intended_start': intended_start,
+            'actual_start': actual_start,
+            'service_time': 0,
+            'dns_time': 0,
+            'connect_time': 0,
+            'tls_time': 0,
+            'ttfb_time': 0,
+            'body_time': 0,
+            'processing_time': 0,
             'status_code': None,
             'cloudflare_blocked': False,
             'challenge_detected': False,
             'bot_score': None,
             'response_headers': {},
-            'cloudflare_headers': {}
+            'cloudflare_headers': {},
+            'header_set': None,
+            'clearance': None
+        }
+    
+    def _build_form_data(self) -> Dict:
+        """送信するフォームデータを生成"""
+        return {
+            'email': self.generate_random_email(),
+            'message': self.generate_random_message(),
+            'recaptchaToken': ''  # 実際のreCAPTCHAトークンは取得困難なため空で送信
         }
+    
+    def _request_headers(self) -> Dict:
+        """POST用のリクエストヘッダーを作成"""
+        # Accept-Encodingを制限してBrotli圧縮を回避
+        headers = dict(self.session.headers)
+        headers['Accept-Encoding'] = 'gzip, deflate'
+        return headers
+    
+    def _process_response(self, result: Dict, status_code: int, response_headers, response_text: str,
+                          thread_id: int, attempt: int):
+        """レスポンスを解析して結果レコードに反映（同期・非同期エンジン共通）"""
+        result['status_code'] = status_code
+        
+        # デバッグ: レスポンスヘッダーをログ出力
+        attempt_logger.debug("Thread %s, Attempt %s: Response headers: %s", thread_id, attempt, response_headers)
+        
+        # レスポンスヘッダーを記録レベルに応じて保存（Cloudflare関連のヘッダーの抽出を含む）
+        self.header_capture.capture(result, response_headers)
+        
+        # レスポンスの解析
+        if status_code == 200:
+            try:
+                response_data = json.loads(response_text)
+                if response_data.get('success'):
+                    result['success'] = True
+                    attempt_logger.info("Thread %s, Attempt %s: Form submission successful", thread_id, attempt)
+                    
+                    # Bot スコア情報を取得
+                    if 'scores' in response_data:
+                        scores = response_data['scores']
+                        if 'recaptcha' in scores and scores['recaptcha'] is not None:
+                            result['bot_score'] = scores['recaptcha']
+                else:
+                    result['error'] = response_data.get('error', 'Unknown API error')
+                    attempt_logger.warning("Thread %s, Attempt %s: API error: %s", thread_id, attempt, result['error'])
+                    
+            except json.JSONDecodeError as e:
+                result['error'] = f"Invalid JSON response: {str(e)}"
+                attempt_logger.error("Thread %s, Attempt %s: Invalid JSON response. Response text: %s...", thread_id, attempt, response_text[:200])
+            except Exception as e:
+                result['error'] = f"JSON parsing error: {str(e)}"
+                attempt_logger.error("Thread %s, Attempt %s: JSON parsing error: %s. Response text: %s...", thread_id, attempt, e, response_text[:200])
+        
+        elif status_code == 403:
+            result['cloudflare_blocked'] = True
+            result['error'] = "Cloudflare blocked (403)"
+            attempt_logger.warning("Thread %s, Attempt %s: Cloudflare blocked (403)", thread_id, attempt)
+        
+        elif status_code == 429:
+            result['error'] = "Rate limited (429)"
+            attempt_logger.warning("Thread %s, Attempt %s: Rate limited (429)", thread_id, attempt)
+        
+        elif status_code in [503, 520, 521, 522, 523, 524]:
+            result['challenge_detected'] = True
+            result['error'] = f"Cloudflare challenge/error ({status_code})"
+            attempt_logger.warning("Thread %s, Attempt %s: Cloudflare challenge/error (%s)", thread_id, attempt, status_code)
+        
+        else:
+            result['error'] = f"HTTP {status_code}"
+            attempt_logger.warning("Thread %s, Attempt %s: HTTP %s", thread_id, attempt, status_code)
+        
+        # Cloudflareの検知を確認
+        response_text = response_text.lower()
+        if any(keyword in response_text for keyword in ['cloudflare', 'checking your browser', 'ddos protection']):
+            result['challenge_detected'] = True
+            attempt_logger.info("Thread %s, Attempt %s: Cloudflare challenge page detected", thread_id, attempt)
+    
+    def submit_contact_form(self, thread_id: int, attempt: int, intended_start: Optional[float] = None) -> Dict:
+        """コンタクトフォームにデータを送信
+        
+        intended_start を指定した場合、response_time は予定開始時刻から計測する。
+        """
+        actual_start = time.time()
+        start_time = intended_start if intended_start is not None else actual_start
+        result = self._new_result(thread_id, attempt, start_time, actual_start)
+        timer = PhaseTimer()
+        clearance = None
         
         try:
             # ランダムなフォームデータを生成
-            email = self.generate_random_email()
-            message = self.generate_random_message()
-            
-            form_data = {
-                'email': email,
-                'message': message,
-                'recaptchaToken': ''  # 実際のreCAPTCHAトークンは取得困難なため空で送信
-            }
-            
-            logger.info(f"Thread {thread_id}, Attempt {attempt}: Sending POST to {self.api_endpoint}")
+            form_data = self._build_form_data()
+            headers = self._request_headers()
+            cookies = None
+            if self.clearance_broker is not None:
+                clearance = self.clearance_broker.clearance_for(thread_id)
+                headers['User-Agent'] = clearance.user_agent
+                cookies = clearance.cookies
+                result['clearance'] = clearance.label
             
-            # APIエンドポイントにPOSTリクエストを送信
-            # Accept-Encodingを制限してBrotli圧縮を回避
-            headers = self.session.headers.copy()
-            headers['Accept-Encoding'] = 'gzip, deflate'
+            attempt_logger.info("Thread %s, Attempt %s: Sending POST to %s", thread_id, attempt, self.api_endpoint)
             
-            response = self.session.post(
+            # APIエンドポイントにPOSTリクエストを送信（接続・ヘッダー受信・本文受信を分けて計測）
+            response, _ = timed_request(
+                self.sessions.get(),
+                'POST',
                 self.api_endpoint,
+                timer=timer,
                 json=form_data,
                 timeout=30,
-                headers=headers
+                headers=headers,
+                cookies=cookies
             )
             
-            result['status_code'] = response.status_code
-            result['response_headers'] = dict(response.headers)
-            
-            # デバッグ: レスポンスヘッダーをログ出力
-            logger.debug(f"Thread {thread_id}, Attempt {attempt}: Response headers: {dict(response.headers)}")
-            
-            # Cloudflare関連のヘッダーを抽出
-            cloudflare_headers = {}
-            for header, value in response.headers.items():
-                if header.lower().startswith('cf-') or 'cloudflare' in header.lower():
-                    cloudflare_headers[header] = value
-            result['cloudflare_headers'] = cloudflare_headers
-            
-            # レスポンスの解析
-            if response.status_code == 200:
-                try:
-                    response_data = response.json()
-                    if response_data.get('success'):
-                        result['success'] = True
-                        logger.info(f"Thread {thread_id}, Attempt {attempt}: Form submission successful")
-                        
-                        # Bot スコア情報を取得
-                        if 'scores' in response_data:
-                            scores = response_data['scores']
-                            if 'recaptcha' in scores and scores['recaptcha'] is not None:
-                                result['bot_score'] = scores['recaptcha']
-                    else:
-                        result['error'] = response_data.get('error', 'Unknown API error')
-                        logger.warning(f"Thread {thread_id}, Attempt {attempt}: API error: {result['error']}")
-                        
-                except json.JSONDecodeError as e:
-                    result['error'] = f"Invalid JSON response: {str(e)}"
-                    logger.error(f"Thread {thread_id}, Attempt {attempt}: Invalid JSON response. Response text: {response.text[:200]}...")
-                except Exception as e:
-                    result['error'] = f"JSON parsing error: {str(e)}"
-                    logger.error(f"Thread {thread_id}, Attempt {attempt}: JSON parsing error: {e}. Response text: {response.text[:200]}...")
-            
-            elif response.status_code == 403:
-                result['cloudflare_blocked'] = True
-                result['error'] = "Cloudflare blocked (403)"
-                logger.warning(f"Thread {thread_id}, Attempt {attempt}: Cloudflare blocked (403)")
-            
-            elif response.status_code == 429:
-                result['error'] = "Rate limited (429)"
-                logger.warning(f"Thread {thread_id}, Attempt {attempt}: Rate limited (429)")
-            
-            elif response.status_code in [503, 520, 521, 522, 523, 524]:
-                result['challenge_detected'] = True
-                result['error'] = f"Cloudflare challenge/error ({response.status_code})"
-                logger.warning(f"Thread {thread_id}, Attempt {attempt}: Cloudflare challenge/error ({response.status_code})")
-            
-            else:
-                result['error'] = f"HTTP {response.status_code}"
-                logger.warning(f"Thread {thread_id}, Attempt {attempt}: HTTP {response.status_code}")
-            
-            # Cloudflareの検知を確認
-            response_text = response.text.lower()
-            if any(keyword in response_text for keyword in ['cloudflare', 'checking your browser', 'ddos protection']):
-                result['challenge_detected'] = True
-                logger.info(f"Thread {thread_id}, Attempt {attempt}: Cloudflare challenge page detected")
+            processing_start = time.perf_counter()
+            self._process_response(result, response.status_code, response.headers, response.text,
+                                   thread_id, attempt)
+            timer.add('processing', time.perf_counter() - processing_start)
                 
         except requests.exceptions.Timeout:
             result['error'] = "Request timeout"
-            logger.error(f"Thread {thread_id}, Attempt {attempt}: Request timeout")
+            attempt_logger.error("Thread %s, Attempt %s: Request timeout", thread_id, attempt)
             
         except requests.exceptions.ConnectionError as e:
             result['error'] = f"Connection error: {str(e)}"
-            logger.error(f"Thread {thread_id}, Attempt {attempt}: Connection error: {e}")
+            attempt_logger.error("Thread %s, Attempt %s: Connection error: %s", thread_id, attempt, e)
+            
+        except Exception as e:
+            result['error'] = f"Unexpected error: {str(e)}"
+            attempt_logger.error("Thread %s, Attempt %s: Unexpected error: %s", thread_id, attempt, e)
+        
+        finally:
+            end_time = time.time()
+            result['response_time'] = end_time - start_time
+            result['service_time'] = end_time - actual_start
+            timer.apply(result)
+            if clearance is not None:
+                self.clearance_broker.observe(clearance, result)
+        
+        return result
+    
+    async def submit_contact_form_async(self, http: aiohttp.ClientSession, thread_id: int, attempt: int,
+                                        intended_start: Optional[float] = None) -> Dict:
+        """コンタクトフォームにデータを送信（asyncioエンジン用）"""
+        actual_start = time.time()
+        start_time = intended_start if intended_start is not None else actual_start
+        result = self._new_result(thread_id, attempt, start_time, actual_start)
+        timer = PhaseTimer()
+        clearance = None
+        
+        try:
+            form_data = self._build_form_data()
+            clearance_options = {}
+            if self.clearance_broker is not None:
+                clearance = self.clearance_broker.clearance_for(thread_id)
+                clearance_options = {'headers': {'User-Agent': clearance.user_agent}, 'cookies': clearance.cookies}
+                result['clearance'] = clearance.label
+            
+            attempt_logger.info("Thread %s, Attempt %s: Sending POST to %s", thread_id, attempt, self.api_endpoint)
             
+            # dns / connect / ttfb はトレースのコールバックが timer に書き込む
+            async with http.post(self.api_endpoint, json=form_data, trace_request_ctx={'timer': timer},
+                                 **clearance_options) as response:
+                body_start = time.perf_counter()
+                response_text = await response.text(errors='replace')
+                timer.add('body', time.perf_counter() - body_start)
+                processing_start = time.perf_counter()
+                self._process_response(result, response.status, response.headers, response_text,
+                                       thread_id, attempt)
+                timer.add('processing', time.perf_counter() - processing_start)
+        
+        except asyncio.TimeoutError:
+            result['error'] = "Request timeout"
+            attempt_logger.error("Thread %s, Attempt %s: Request timeout", thread_id, attempt)
+        
+        except aiohttp.ClientConnectionError as e:
+            result['error'] = f"Connection error: {str(e)}"
+            attempt_logger.error("Thread %s, Attempt %s: Connection error: %s", thread_id, attempt, e)
+        
         except Exception as e:
             result['error'] = f"Unexpected error: {str(e)}"
-            logger.error(f"Thread {thread_id}, Attempt {attempt}: Unexpected error: {e}")
+            attempt_logger.error("Thread %s, Attempt %s: Unexpected error: %s", thread_id, attempt, e)
         
         finally:
-            result['response_time'] = time.time() - start_time
+            end_time = time.time()
+            result['response_time'] = end_time - start_time
+            result['service_time'] = end_time - actual_start
+            timer.apply(result)
+            if clearance is not None:
+                self.clearance_broker.observe(clearance, result)
         
         return result
     
-    def run_test(self, num_requests: int = 50, num_threads: int = 5, delay: float = 0.1) -> Dict:
-        """テストを実行"""
+    def _log_result(self, result: Dict):
+        """完了したリクエストの結果をリアルタイムでログ出力"""
+        if not attempt_logger.isEnabledFor(logging.INFO):
+            return
+        status = "SUCCESS" if result['success'] else "FAILED"
+        error_info = f" ({result['error']})" if result['error'] else ""
+        cf_info = ""
+        if result['cloudflare_blocked']:
+            cf_info = " [CF-BLOCKED]"
+        elif result['challenge_detected']:
+            cf_info = " [CF-CHALLENGE]"
+        outcome = result_outcome(result)
+        
+        attempt_logger.info("Thread %s, Attempt %s: %s%s%s", result['thread_id'], result['attempt'],
+                            status, error_info, cf_info, extra={'outcome': outcome})
+    
+    def run_test(self, num_requests: int = 50, num_threads: int = 5, delay: float = 0.1,
+                 engine: str = 'thread', concurrency: int = 100, rate: Optional[float] = None,
+                 adaptive: bool = False, min_concurrency: int = 1, decrease_factor: float = 0.5) -> Dict:
+        """テストを実行
+        
+        rate (req/s) を指定するとオープンループで一定レートで発行し、delay は無視する。
+        adaptive=True の場合、429・チャレンジの応答に応じて同時実行数を min_concurrency から
+        スレッド数（asyncioエンジンでは concurrency）の間で調整する。
+        """
+        self.target_rate = rate
+        if adaptive:
+            self._enable_adaptive(concurrency if engine == 'asyncio' else num_threads, min_concurrency,
+                                  decrease_factor)
+        if engine == 'asyncio':
+            return self.run_test_async(num_requests=num_requests, concurrency=concurrency, delay=delay, rate=rate)
+        
         logger.info(f"Starting Simple Bot Fight Mode test")
         logger.info(f"Target URL: {self.target_url}")
         logger.info(f"API Endpoint: {self.api_endpoint}")
         logger.info(f"Number of requests: {num_requests}")
         logger.info(f"Number of threads: {num_threads}")
-        logger.info(f"Delay between requests: {delay}s")
+        if rate:
+            logger.info(f"Target arrival rate: {rate:.2f} req/s (open-loop)")
+        else:
+            logger.info(f"Delay between requests: {delay}s")
         
+        self._open_results()
         start_time = time.time()
         
+        try:
+            self._execute_threaded(num_requests, num_threads, delay, rate)
+        finally:
+            self._close_results()
+        
+        total_time = time.time() - start_time
+        
+        # 統計情報を計算
+        stats = self.calculate_statistics(total_time)
+        
+        # 結果をファイルに保存
+        self.save_results(stats)
+        
+        return stats
+    
+    def _execute_threaded(self, num_requests: int, num_threads: int, delay: float, rate: Optional[float] = None,
+                          attempt_offset: int = 0):
+        """スレッドプールでリクエストを発行し、完了順に self.results に追加"""
         with ThreadPoolExecutor(max_workers=num_threads) as executor:
             futures = []
             
-            for i in range(num_requests):
-                thread_id = i % num_threads
-                future = executor.submit(self.submit_contact_form, thread_id, i)
-                futures.append(future)
+            try:
+                if rate:
+                    # オープンループ: 前のリクエストの完了を待たずに時刻表どおり発行
+                    for i, intended_start in OpenLoopScheduler(rate).ticks(num_requests):
+                        self._check_abort()
+                        thread_id = i % num_threads
+                        futures.append(self._submit(executor, thread_id, attempt_offset + i, intended_start))
+                else:
+                    for i in range(num_requests):
+                        self._check_abort()
+                        thread_id = i % num_threads
+                        future = self._submit(executor, thread_id, attempt_offset + i)
+                        futures.append(future)
+                        
+                        # リクエスト間隔制御
+                        if delay > 0:
+                            time.sleep(delay)
                 
-                # リクエスト間隔制御
-                if delay > 0:
-                    time.sleep(delay)
-            
-            # 結果を収集
-            for future in as_completed(futures):
-                try:
-                    result = future.result()
-                    self.results.append(result)
-                    
-                    # リアルタイムでログ出力
-                    status = "SUCCESS" if result['success'] else "FAILED"
-                    error_info = f" ({result['error']})" if result['error'] else ""
-                    cf_info = ""
-                    if result['cloudflare_blocked']:
-                        cf_info = " [CF-BLOCKED]"
-                    elif result['challenge_detected']:
-                        cf_info = " [CF-CHALLENGE]"
-                    
-                    logger.info(f"Thread {result['thread_id']}, Attempt {result['attempt']}: {status}{error_info}{cf_info}")
-                    
-                except Exception as e:
-                    logger.error(f"Error processing result: {e}")
+                # 結果を収集
+                for future in as_completed(futures):
+                    try:
+                        result = future.result()
+                        self._record_result(result)
+                        
+                        # リアルタイムでログ出力
+                        self._log_result(result)
+                        
+                    except CoordinatorLost:
+                        raise
+                    except Exception as e:
+                        logger.error(f"Error processing result: {e}")
+            except BaseException:
+                # 中断した場合は、まだ始まっていないリクエストを送らない
+                for future in futures:
+                    future.cancel()
+                raise
+    
+    def _check_abort(self):
+        if self.abort_check is not None:
+            self.abort_check()
+    
+    def _submit(self, executor: ThreadPoolExecutor, thread_id: int, attempt: int,
+                intended_start: Optional[float] = None):
+        """1件をスレッドプールに投入（適応的な制御が有効なら、上限に空きができるまで待つ）"""
+        limiter = self.concurrency_limiter
+        if limiter is None:
+            return self._observe(executor.submit(self.submit_contact_form, thread_id, attempt, intended_start))
+        
+        started = limiter.acquire()
+        future = executor.submit(self.submit_contact_form, thread_id, attempt, intended_start)
+        future.add_done_callback(
+            lambda done: limiter.release(None if done.exception() else done.result(), started))
+        return self._observe(future)
+    
+    def _enable_adaptive(self, max_limit: int, min_concurrency: int, decrease_factor: float):
+        """適応的な同時実行数の制御を有効にする（上限は max_limit から始める）"""
+        self.concurrency_limiter = AIMDLimiter(
+            max_limit=max_limit,
+            min_limit=min_concurrency,
+            decrease_factor=decrease_factor,
+            throttled=self._is_throttled
+        )
+        logger.info(f"Adaptive concurrency: {min_concurrency} - {max_limit}")
+        if self.live_metrics is not None:
+            limiter = self.concurrency_limiter
+            self.live_metrics.add_gauge('concurrency_limit', lambda: limiter.current_limit)
+            self.live_metrics.add_gauge('in_flight', lambda: limiter.in_flight)
+    
+    @staticmethod
+    def _is_throttled(result: Dict) -> bool:
+        """同時実行数を下げるべき応答か（429、またはチャレンジ・エラーの 503/52x で失敗したもの）"""
+        return result['status_code'] == 429 or (result['challenge_detected'] and not result['success'])
+    
+    def run_test_async(self, num_requests: int = 50, concurrency: int = 100, delay: float = 0.1,
+                       rate: Optional[float] = None) -> Dict:
+        """asyncioエンジンでテストを実行（1プロセスで大量の同時リクエストを保持）"""
+        self.target_rate = rate
+        logger.info(f"Starting Simple Bot Fight Mode test (asyncio engine)")
+        logger.info(f"Target URL: {self.target_url}")
+        logger.info(f"API Endpoint: {self.api_endpoint}")
+        logger.info(f"Number of requests: {num_requests}")
+        logger.info(f"Max concurrency: {concurrency}")
+        if rate:
+            logger.info(f"Target arrival rate: {rate:.2f} req/s (open-loop)")
+        else:
+            logger.info(f"Delay between requests: {delay}s")
+        
+        self._open_results()
+        start_time = time.time()
+        
+        try:
+            asyncio.run(self._run_async(num_requests, concurrency, delay, rate))
+        finally:
+            self._close_results()
         
         total_time = time.time() - start_time
         
@@ -254,27 +537,256 @@ class SimpleBotTester:
         
         return stats
     
+    async def _run_async(self, num_requests: int, concurrency: int, delay: float, rate: Optional[float] = None,
+                         attempt_offset: int = 0):
+        """イベントループ上でリクエストを発行し、完了順に結果を収集"""
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        # 同時接続数は同時実行数に合わせる（aiohttpのデフォルト上限100を解除）
+        connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=concurrency, ttl_dns_cache=300,
+                                         force_close=not self.sessions.keep_alive)
+        timeout = aiohttp.ClientTimeout(total=30)
+        
+        # 新規接続と再利用接続の数を数える
+        counts = {'opened': 0, 'reused': 0}
+        self._async_connection_counts = counts
+        
+        async def on_connection_create_end(session, context, params):
+            counts['opened'] += 1
+        
+        async def on_connection_reuseconn(session, context, params):
+            counts['reused'] += 1
+        
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace_phases(trace_config)
+        
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                         headers=self._request_headers(),
+                                         trace_configs=[trace_config]) as http:
+            
+            limiter = self.concurrency_limiter
+            
+            async def bounded_submit(thread_id: int, attempt: int, intended_start: Optional[float] = None) -> Dict:
+                if limiter is None:
+                    async with semaphore:
+                        return await self.submit_contact_form_async(http, thread_id, attempt, intended_start)
+                
+                # 適応的な制御: 上限に空きができるまで待ち、結果で上限を調整する
+                started = await limiter.acquire_async()
+                result = None
+                try:
+                    result = await self.submit_contact_form_async(http, thread_id, attempt, intended_start)
+                    return result
+                finally:
+                    await limiter.release_async(result, started)
+            
+            tasks = []
+            try:
+                if rate:
+                    # オープンループ: 前のリクエストの完了を待たずに時刻表どおり発行
+                    async for i, intended_start in OpenLoopScheduler(rate).ticks_async(num_requests):
+                        self._check_abort()
+                        thread_id = i % concurrency
+                        tasks.append(self._observe(asyncio.ensure_future(
+                            bounded_submit(thread_id, attempt_offset + i, intended_start))))
+                else:
+                    for i in range(num_requests):
+                        self._check_abort()
+                        thread_id = i % concurrency
+                        tasks.append(self._observe(asyncio.ensure_future(
+                            bounded_submit(thread_id, attempt_offset + i))))
+                        
+                        # リクエスト間隔制御（イベントループはブロックしない）
+                        if delay > 0:
+                            await asyncio.sleep(delay)
+                
+                # 結果を収集
+                for next_done in asyncio.as_completed(tasks):
+                    try:
+                        result = await next_done
+                        self._record_result(result)
+                        
+                        # リアルタイムでログ出力
+                        self._log_result(result)
+                        
+                    except CoordinatorLost:
+                        raise
+                    except Exception as e:
+                        logger.error(f"Error processing result: {e}")
+            except BaseException:
+                # 中断した場合は、まだ終わっていないリクエストを取り消す
+                for task in tasks:
+                    task.cancel()
+                raise
+    
+    def run_saturation_search(self, start_rate: float, max_rate: float, step: Optional[float] = None,
+                              factor: float = 2.0, window: float = 10.0, min_requests: int = 20,
+                              trip_threshold: float = 5.0, resolution: float = 0.1, max_probes: int = 6,
+                              cooldown: float = 0.0, num_threads: int = 50, engine: str = 'thread',
+                              concurrency: int = 100) -> Dict:
+        """レートを段階的に上げて、ブロック・レート制限・チャレンジが出始めるレートを探す
+        
+        各ウィンドウはオープンループで送信する（スレッドエンジンでは num_threads が同時に待てる上限）。
+        """
+        logger.info(f"Starting saturation search ({engine} engine)")
+        logger.info(f"API Endpoint: {self.api_endpoint}")
+        logger.info(f"Rate range: {start_rate:.2f} - {max_rate:.2f} req/s, window {window}s, "
+                    f"trip threshold {trip_threshold}%")
+        
+        def run_window(rate: float, num_requests: int) -> ResultAggregator:
+            # ウィンドウの間だけ別の集計器に記録し、終わったら全体の集計器にマージする
+            overall = self.aggregator
+            self.aggregator = ResultAggregator(self.STAT_FLAG_FIELDS, self.STAT_TIMING_FIELDS)
+            attempt_offset = overall.total
+            try:
+                if engine == 'asyncio':
+                    asyncio.run(self._run_async(num_requests, concurrency, 0, rate, attempt_offset=attempt_offset))
+                else:
+                    self._execute_threaded(num_requests, num_threads, 0, rate, attempt_offset=attempt_offset)
+            finally:
+                window_stats = self.aggregator
+                self.aggregator = overall
+                overall.merge(window_stats)
+            return window_stats
+        
+        search = SaturationSearch(run_window, start_rate, max_rate, step=step, factor=factor, window=window,
+                                  min_requests=min_requests, trip_threshold=trip_threshold,
+                                  resolution=resolution, max_probes=max_probes, cooldown=cooldown)
+        
+        self._open_results()
+        start_time = time.time()
+        try:
+            report = search.run()
+        finally:
+            self._close_results()
+        
+        total_time = time.time() - start_time
+        
+        stats = self.calculate_statistics(total_time)
+        # レート全体の平均ではなく、ウィンドウごとの値を見る
+        stats['performance']['load_model'] = 'saturation-search'
+        stats['saturation_search'] = report
+        
+        self.save_results(stats)
+        
+        return stats
+    
+    def run_distributed(self, coordinator: Coordinator, num_requests: int = 50, num_threads: int = 5,
+                        delay: float = 0.1, engine: str = 'thread', concurrency: int = 100,
+                        rate: Optional[float] = None, adaptive: bool = False, min_concurrency: int = 1,
+                        decrease_factor: float = 0.5) -> Dict:
+        """リクエスト数とレートをワーカーに分割して実行し、全ワーカーの結果を1つのレポートにまとめる
+        
+        送信の設定（スレッド数・エンジン・適応的な制御など）はワーカーごとに適用する。
+        """
+        self.target_rate = rate
+        logger.info(f"Starting Simple Bot Fight Mode test (distributed, {coordinator.num_workers} workers)")
+        logger.info(f"Target URL: {self.target_url}")
+        logger.info(f"API Endpoint: {self.api_endpoint}")
+        logger.info(f"Number of requests: {num_requests}")
+        if rate:
+            logger.info(f"Target arrival rate: {rate:.2f} req/s (open-loop, split across workers)")
+        else:
+            logger.info(f"Delay between requests: {delay}s (per worker)")
+        
+        job = {
+            'target_url': self.target_url,
+            'tester_options': {
+                'api_endpoint': self.api_endpoint,
+                'per_worker_sessions': self.sessions.per_worker,
+                'pool_size': self.sessions.pool_size,
+                'keep_alive': self.sessions.keep_alive,
+                'max_retries': self.sessions.max_retries,
+                'capture_headers': self.header_capture.level
+            },
+            'num_threads': num_threads,
+            'delay': delay,
+            'engine': engine,
+            'concurrency': concurrency,
+            'adaptive': adaptive,
+            'min_concurrency': min_concurrency,
+            'decrease_factor': decrease_factor
+        }
+        
+        self._open_results()
+        try:
+            workers = coordinator.run(num_requests, rate, job, self._record_remote_result)
+        finally:
+            self._close_results()
+        
+        # ワーカーの接続待ちは含めない
+        total_time = time.time() - coordinator.started_at
+        
+        # ワーカー側でしか分からない値（接続統計・ヘッダーセット）を合算
+        summaries = [worker['summary'] for worker in workers if worker['summary']]
+        self.remote_connection_stats = merge_connection_stats([summary['connection_stats'] for summary in summaries])
+        for summary in summaries:
+            if summary['header_sets']:
+                self.header_capture.merge(summary['header_sets'])
+        
+        stats = self.calculate_statistics(total_time)
+        stats['test_summary']['workers'] = len(workers)
+        stats['distributed'] = {
+            'listen': f"{coordinator.address[0]}:{coordinator.address[1]}",
+            'workers': workers
+        }
+        
+        self.save_results(stats)
+        
+        return stats
+    
+    def _open_results(self):
+        """結果の保存先を準備（ストリーム時はJSONLファイルに逐次書き出す）"""
+        if self.stream_results:
+            self.results = StreamingResults(result_stream_path('simple_test'), self.fsync_interval)
+            logger.info(f"Streaming results to: {self.results.path}")
+        if self.live_metrics is not None:
+            self.live_metrics.start()
+    
+    def _close_results(self):
+        """結果ストリームを閉じる（残りを書き出してfsync）"""
+        if isinstance(self.results, StreamingResults):
+            self.results.close()
+        if self.live_metrics is not None:
+            self.live_metrics.stop()
+    
+    def _observe(self, future):
+        """ライブメトリクスが有効なら、完了した時点で結果を記録させる
+
+        結果の収集ループは送信がすべて終わってから回るので、ライブメトリクスは Future の完了で記録する。
+        """
+        if self.live_metrics is not None:
+            future.add_done_callback(self.live_metrics.observe)
+        return future
+    
+    def _record_remote_result(self, result: Dict):
+        """ワーカーから受信した結果を記録（受信した時点で完了しているので、ライブメトリクスにもそのまま加える）"""
+        self._record_result(result)
+        if self.live_metrics is not None:
+            self.live_metrics.record(result)
+    
+    def _record_result(self, result: Dict):
+        """完了した結果を保存し、集計器を更新"""
+        self.results.append(result)
+        self.aggregator.add(result)
+    
     def calculate_statistics(self, total_time: float) -> Dict:
         """統計情報を計算"""
-        total_requests = len(self.results)
-        successful_requests = sum(1 for r in self.results if r['success'])
-        failed_requests = total_requests - successful_requests
-        
-        cloudflare_blocks = sum(1 for r in self.results if r['cloudflare_blocked'])
-        challenges_detected = sum(1 for r in self.results if r['challenge_detected'])
+        stats = self.aggregator
+        if stats.total != len(self.results):
+            # self.results が外部から設定された場合などは1回の走査で集計し直す
+            stats = aggregate(self.results, self.STAT_FLAG_FIELDS, self.STAT_TIMING_FIELDS)
         
-        response_times = [r['response_time'] for r in self.results if r['response_time'] > 0]
-        avg_response_time = sum(response_times) / len(response_times) if response_times else 0
+        total_requests = stats.total
+        successful_requests = stats.flags['success']
+        failed_requests = total_requests - successful_requests
         
-        bot_scores = [r['bot_score'] for r in self.results if r['bot_score'] is not None]
-        avg_bot_score = sum(bot_scores) / len(bot_scores) if bot_scores else None
+        cloudflare_blocks = stats.flags['cloudflare_blocked']
+        challenges_detected = stats.flags['challenge_detected']
         
-        # ステータスコード別の統計
-        status_codes = {}
-        for r in self.results:
-            code = r['status_code']
-            if code:
-                status_codes[code] = status_codes.get(code, 0) + 1
+        latency = stats.latency_report()
         
         return {
             'test_summary': {
@@ -284,38 +796,144 @@ class SimpleBotTester:
                 'total_requests': total_requests,
                 'successful_requests': successful_requests,
                 'failed_requests': failed_requests,
-                'success_rate': (successful_requests / total_requests * 100) if total_requests > 0 else 0
+                'success_rate': stats.rate('success')
             },
             'cloudflare_detection': {
                 'blocks': cloudflare_blocks,
                 'challenges_detected': challenges_detected,
-                'block_rate': (cloudflare_blocks / total_requests * 100) if total_requests > 0 else 0,
-                'challenge_rate': (challenges_detected / total_requests * 100) if total_requests > 0 else 0
+                'block_rate': stats.rate('cloudflare_blocked'),
+                'challenge_rate': stats.rate('challenge_detected')
             },
             'performance': {
-                'avg_response_time': avg_response_time,
-                'requests_per_second': total_requests / total_time if total_time > 0 else 0
-            },
-            'status_codes': status_codes,
-            'bot_scores': {
-                'avg_score': avg_bot_score,
-                'total_scores_received': len(bot_scores),
-                'scores': bot_scores
+                'load_model': 'open-loop' if self.target_rate else 'closed-loop',
+                'target_rate': self.target_rate,
+                'avg_response_time': stats.response_times.mean,
+                'avg_service_time': stats.mean('service_time'),
+                # 予定開始時刻から実際の開始までの遅れ（オープンループ時の送信側の詰まり）
+                'avg_start_lag': stats.start_lags.mean,
+                'requests_per_second': total_requests / total_time if total_time > 0 else 0,
+                'latency': latency['overall'],
+                'latency_by_status_code': latency['by_status_code'],
+                # フェーズごとの所要時間（接続を再利用した試行の dns / connect / tls は含めない）
+                'phases': phase_report(stats)
             },
+            'status_codes': stats.status_codes,
+            'connection_stats': self._connection_stats(),
+            # 同時実行数の推移（適応的な制御が有効な場合）
+            'concurrency': self.concurrency_limiter.summary() if self.concurrency_limiter else None,
+            'bot_scores': stats.bot_scores.summary(),
+            'header_capture': self.header_capture.level,
+            # 共通のレスポンスヘッダー（all の場合のみ。レコードの header_set から参照）
+            'header_sets': self.header_capture.summary(),
+            # 実行中のメトリクスの時系列ファイルと、防御応答が出始めた時刻
+            'live_metrics': self.live_metrics.summary() if self.live_metrics else None,
+            # ハイブリッドモードのブラウザとクリアランスの取り直し
+            'browser_clearance': self.clearance_broker.summary() if self.clearance_broker else None,
             'detailed_results': self.results
         }
     
+    def _connection_stats(self) -> Dict:
+        """接続の再利用状況（分散実行時は全ワーカーの合計）"""
+        if self.remote_connection_stats is not None:
+            return self.remote_connection_stats
+        if self._async_connection_counts is not None:
+            counts = self._async_connection_counts
+            connection_stats = build_connection_stats(1, counts['opened'], counts['opened'] + counts['reused'])
+            connection_stats['keep_alive'] = self.sessions.keep_alive
+            return connection_stats
+        return self.sessions.connection_stats()
+    
     def save_results(self, stats: Dict):
-        """結果をJSONファイルに保存"""
+        """結果をJSONファイル（output_format が binary の場合は .rbin ファイル）に保存"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        if self.output_format == 'binary':
+            filename = f"attack-scripts/simple_test_results_{timestamp}.rbin"
+            write_binary_results(filename, stats, self.RESULT_COLUMNS)
+            logger.info(f"Results saved to: {filename}")
+            return
+        
         filename = f"attack-scripts/simple_test_results_{timestamp}.json"
         
+        # ストリーム済みの詳細結果はJSONLファイルへの参照として保存
+        stats = detach_streamed_results(stats)
+        
         with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(stats, f, ensure_ascii=False, indent=2)
+            json.dump(stats, f, ensure_ascii=False, indent=2, default=json_default)
         
         logger.info(f"Results saved to: {filename}")
 
 
+def _run_worker_job(job: Dict, results: RemoteResults) -> Dict:
+    """分散実行のワーカーで割り当て分を実行し、コーディネーターに返すサマリーを作る"""
+    tester = SimpleBotTester(target_url=job['target_url'], **job['tester_options'])
+    tester.results = results
+    # コーディネーターとの接続が切れたら、残りの割り当てを送らずに止める
+    tester.abort_check = results.check
+    tester.target_rate = job['rate']
+    if job['adaptive']:
+        tester._enable_adaptive(job['concurrency'] if job['engine'] == 'asyncio' else job['num_threads'],
+                                job['min_concurrency'], job['decrease_factor'])
+    
+    if job['engine'] == 'asyncio':
+        asyncio.run(tester._run_async(job['num_requests'], job['concurrency'], job['delay'], job['rate'],
+                                      attempt_offset=job['attempt_offset']))
+    else:
+        tester._execute_threaded(job['num_requests'], job['num_threads'], job['delay'], job['rate'],
+                                 attempt_offset=job['attempt_offset'])
+    
+    stats = tester.aggregator
+    return {
+        'result_count': len(results),
+        'success_rate': stats.rate('success'),
+        'status_codes': stats.status_codes,
+        'latency': stats.response_times.summary(),
+        'connection_stats': tester._connection_stats(),
+        'header_sets': tester.header_capture.summary(),
+        'concurrency': tester.concurrency_limiter.summary() if tester.concurrency_limiter else None
+    }
+
+
+def print_distributed_report(distributed: Dict):
+    """分散実行のワーカーごとの結果をコンソールに出力"""
+    print("\nWorkers:")
+    for worker in distributed['workers']:
+        summary = worker['summary']
+        line = (f"  #{worker['worker_id']} {worker['host']} ({worker['address']}): {worker['status']}, "
+                f"{worker['received']}/{worker['requests']} results")
+        if summary:
+            line += f", success {summary['success_rate']:.1f}%, p95 {summary['latency']['p95']:.3f}s"
+        if worker['error']:
+            line += f" - {worker['error']}"
+        print(line)
+
+
+def print_saturation_report(report: Dict):
+    """飽和点探索の結果（ウィンドウごとの値と発動点）をコンソールに出力"""
+    print("\n" + "="*78)
+    print("SATURATION SEARCH RESULTS")
+    print("="*78)
+    print(f"{'phase':<7}{'target':>9}{'achieved':>10}{'reqs':>7}{'ok%':>7}{'403%':>7}{'429%':>7}"
+          f"{'chal%':>7}{'p50':>8}{'p95':>8}")
+    for window in report['windows']:
+        latency = window['latency']
+        mark = '  TRIPPED' if window['tripped'] else ''
+        print(f"{window['phase']:<7}{window['target_rate']:>9.2f}{window['achieved_rate']:>10.2f}"
+              f"{window['requests']:>7}{window['success_rate']:>7.1f}{window['block_rate']:>7.1f}"
+              f"{window['rate_limit_rate']:>7.1f}{window['challenge_rate']:>7.1f}"
+              f"{latency['p50']:>8.3f}{latency['p95']:>8.3f}{mark}")
+    
+    tipping_point = report['tipping_point']
+    print("-"*78)
+    if tipping_point['found']:
+        print(f"Tipping point: between {tipping_point['max_passing_rate']:.2f} and "
+              f"{tipping_point['min_tripping_rate']:.2f} req/s (trip threshold {report['trip_threshold']}%)")
+    elif tipping_point['min_tripping_rate'] is None:
+        print(f"No tipping point up to {tipping_point['max_passing_rate']:.2f} req/s")
+    else:
+        print(f"Already tripped at the start rate {tipping_point['min_tripping_rate']:.2f} req/s")
+    print("="*78)
+
+
 def main():
     """メイン関数"""
     parser = argparse.ArgumentParser(description='Simple Bot Fight Mode Tester')
@@ -329,23 +947,201 @@ def main():
                        help='Number of concurrent threads (default: 3)')
     parser.add_argument('--delay', type=float, default=0.2,
                        help='Delay between requests in seconds (default: 0.2)')
+    parser.add_argument('--per-worker-sessions', action='store_true',
+                       help='Use one HTTP session per worker thread instead of one shared session')
+    parser.add_argument('--pool-size', type=int,
+                       help='Connection pool size per session (default: number of threads)')
+    parser.add_argument('--no-keep-alive', action='store_true',
+                       help='Disable HTTP keep-alive (open a new connection per request)')
+    parser.add_argument('--retries', type=int, default=0,
+                       help='Retries on connection errors (default: 0)')
+    parser.add_argument('--rate', type=parse_rate,
+                       help='Open-loop target arrival rate, e.g. 500/s or 30/m (overrides --delay)')
+    parser.add_argument('--stream-results', action='store_true',
+                       help='Write results incrementally to a JSONL file instead of keeping them in memory')
+    parser.add_argument('--fsync-interval', type=float, default=1.0,
+                       help='Seconds between fsyncs of the result stream (default: 1.0)')
+    parser.add_argument('--live-metrics', action='store_true',
+                       help='Keep per-interval windows of rate, latency, status codes and block/challenge counts '
+                            'and write them to a time-series JSONL file next to the results')
+    parser.add_argument('--metrics-port', type=int,
+                       help='Also serve the live metrics in Prometheus text format on 127.0.0.1:PORT/metrics '
+                            '(implies --live-metrics)')
+    parser.add_argument('--metrics-interval', type=float, default=1.0,
+                       help='Live metrics window length in seconds (default: 1.0)')
+    parser.add_argument('--output-format', choices=OUTPUT_FORMATS, default='json',
+                       help='Result file format: json, or binary (.rbin: fixed-width records read lazily with '
+                            'result_binary.py, exportable to JSON) (default: json)')
+    parser.add_argument('--engine', choices=['thread', 'asyncio'], default='thread',
+                       help='Request engine: thread (ThreadPoolExecutor) or asyncio (aiohttp) (default: thread)')
+    parser.add_argument('--concurrency', type=int, default=100,
+                       help='Max in-flight requests for the asyncio engine (default: 100)')
+    parser.add_argument('--adaptive', action='store_true',
+                       help='Adapt concurrency AIMD-style: halve it on 429/challenge responses and raise it by one '
+                            'per window of clean responses, between --min-concurrency and --threads/--concurrency')
+    parser.add_argument('--min-concurrency', type=int, default=1,
+                       help='Lowest concurrency the adaptive limiter backs off to (default: 1)')
+    parser.add_argument('--aimd-decrease', type=float, default=0.5,
+                       help='Factor applied to the concurrency limit on a throttling response (default: 0.5)')
+    parser.add_argument('--capture-headers', choices=HEADER_CAPTURE_LEVELS, default='all',
+                       help='Response headers to record: none, cf (Cloudflare headers only) or all '
+                            '(shared header sets stored once and referenced by id) (default: all)')
+    parser.add_argument('--quiet', action='store_true',
+                       help='Do not log per-attempt messages (run-level messages and the summary are still printed)')
+    parser.add_argument('--log-sample', type=parse_log_sample,
+                       help='Log only 1 in N per-attempt messages per outcome/level, e.g. 100 (successes and info) '
+                            'or success=100,info=100,warning=10; blocks and errors are logged in full unless listed')
+    search_group = parser.add_argument_group('saturation search',
+                                             'Raise the open-loop rate in steps, then bisect to the rate at which '
+                                             '403/429/challenge responses start (--threads caps in-flight requests '
+                                             'for the thread engine)')
+    search_group.add_argument('--search', action='store_true',
+                              help='Run a saturation search instead of a fixed number of requests')
+    search_group.add_argument('--search-start', type=parse_rate, default=1.0,
+                              help='First step rate, e.g. 1/s (default: 1/s)')
+    search_group.add_argument('--search-max', type=parse_rate, default=50.0,
+                              help='Highest rate to try, e.g. 200/s (default: 50/s)')
+    search_group.add_argument('--search-step', type=parse_rate,
+                              help='Add this rate at each step, e.g. 5/s (default: multiply by --search-factor)')
+    search_group.add_argument('--search-factor', type=float, default=2.0,
+                              help='Multiply the rate by this at each step when --search-step is not given (default: 2)')
+    search_group.add_argument('--search-window', type=float, default=10.0,
+                              help='Seconds of traffic measured at each rate (default: 10)')
+    search_group.add_argument('--search-min-requests', type=int, default=20,
+                              help='Minimum requests per window (default: 20)')
+    search_group.add_argument('--trip-threshold', type=float, default=5.0,
+                              help='Percentage of 403/429/challenge responses in a window that counts as tripped '
+                                   '(default: 5)')
+    search_group.add_argument('--search-resolution', type=float, default=0.1,
+                              help='Stop bisecting when the passing/tripping rates are within this fraction '
+                                   '(default: 0.1)')
+    search_group.add_argument('--search-max-probes', type=int, default=6,
+                              help='Maximum bisection windows (default: 6)')
+    search_group.add_argument('--search-cooldown', type=float, default=0.0,
+                              help='Seconds to wait between windows so blocks do not carry over (default: 0)')
+    hybrid_group = parser.add_argument_group('hybrid mode',
+                                             'Earn Cloudflare clearance cookies and the User-Agent in real browsers '
+                                             '(as in cloudflare_bot_test.py) and send the HTTP requests with them; '
+                                             'each browser re-earns its clearance when the cookies expire or its '
+                                             'requests start being blocked')
+    hybrid_group.add_argument('--browser-clearance', type=int, default=0, metavar='N',
+                              help='Number of browser sessions that earn clearance (default: 0, hybrid mode off)')
+    hybrid_group.add_argument('--clearance-max-age', type=float,
+                              help='Re-earn clearance after this many seconds even if the cookies have not expired')
+    hybrid_group.add_argument('--clearance-block-rate', type=float, default=50.0,
+                              help='Re-earn a browser\'s clearance when this percentage of its recent requests are '
+                                   'blocked (403 or failed challenge) (default: 50)')
+    hybrid_group.add_argument('--clearance-window', type=int, default=20,
+                              help='Number of recent requests per browser used for the block rate (default: 20)')
+    hybrid_group.add_argument('--clearance-no-headless', action='store_true',
+                              help='Show the clearance browsers (default: headless)')
+    distributed_group = parser.add_argument_group('distributed mode',
+                                                  'Split --requests and --rate across worker agents on other hosts '
+                                                  '(or on localhost); the other options apply to each worker')
+    distributed_group.add_argument('--listen', type=parse_address,
+                                   help='Run as coordinator listening on HOST:PORT, e.g. 0.0.0.0:9700')
+    distributed_group.add_argument('--workers', type=int, default=2,
+                                   help='Number of workers to wait for in coordinator mode (default: 2)')
+    distributed_group.add_argument('--accept-timeout', type=float, default=60.0,
+                                   help='Seconds to wait for workers; the run starts with those connected '
+                                        '(default: 60)')
+    distributed_group.add_argument('--worker-timeout', type=float, default=DEFAULT_READ_TIMEOUT,
+                                   help='Seconds without any message (results or heartbeat) after which a worker '
+                                        f'is reported as lost (default: {DEFAULT_READ_TIMEOUT:g})')
+    distributed_group.add_argument('--worker', type=parse_address, metavar='HOST:PORT',
+                                   help='Run as a worker agent for the coordinator at HOST:PORT '
+                                        '(the test settings come from the coordinator)')
     
     args = parser.parse_args()
+    if args.browser_clearance and (args.listen or args.worker):
+        parser.error('--browser-clearance cannot be combined with the distributed mode')
+    configure_attempt_logging(attempt_logger, quiet=args.quiet, sample=args.log_sample)
+    
+    if args.worker:
+        try:
+            run_worker(args.worker, _run_worker_job, connect_timeout=args.accept_timeout)
+        except Exception as e:
+            logger.error(f"Worker failed: {e}")
+            return 1
+        return 0
+    
+    live_metrics = None
+    if args.live_metrics or args.metrics_port is not None:
+        live_metrics = LiveMetrics('simple_test', metrics_path('simple_test'), interval=args.metrics_interval,
+                                   port=args.metrics_port)
+    
+    clearance_broker = None
+    if args.browser_clearance:
+        # Selenium はハイブリッドモードでだけ必要なので、ここで読み込む
+        from cloudflare_bot_test import CloudflareBotTester
+        browser = CloudflareBotTester(target_url=args.url, headless=not args.clearance_no_headless)
+        clearance_broker = ClearanceBroker(browser.create_driver, args.url, browsers=args.browser_clearance,
+                                           max_age=args.clearance_max_age,
+                                           block_rate=args.clearance_block_rate / 100,
+                                           block_window=args.clearance_window)
+        try:
+            clearance_broker.start()
+        except Exception as e:
+            logger.error(f"Hybrid mode failed: {e}")
+            clearance_broker.close()
+            return 1
     
     # テスターを初期化
     tester = SimpleBotTester(
         target_url=args.url,
-        api_endpoint=args.api
+        api_endpoint=args.api,
+        per_worker_sessions=args.per_worker_sessions,
+        pool_size=args.pool_size or max(args.threads, 10),
+        keep_alive=not args.no_keep_alive,
+        max_retries=args.retries,
+        stream_results=args.stream_results,
+        fsync_interval=args.fsync_interval,
+        capture_headers=args.capture_headers,
+        output_format=args.output_format,
+        live_metrics=live_metrics,
+        clearance_broker=clearance_broker
     )
     
     try:
-        # テスト実行
-        stats = tester.run_test(
+        if args.search:
+            stats = tester.run_saturation_search(
+                start_rate=args.search_start,
+                max_rate=args.search_max,
+                step=args.search_step,
+                factor=args.search_factor,
+                window=args.search_window,
+                min_requests=args.search_min_requests,
+                trip_threshold=args.trip_threshold,
+                resolution=args.search_resolution,
+                max_probes=args.search_max_probes,
+                cooldown=args.search_cooldown,
+                num_threads=args.threads,
+                engine=args.engine,
+                concurrency=args.concurrency
+            )
+            print_saturation_report(stats['saturation_search'])
+            return 0
+        
+        run_options = dict(
             num_requests=args.requests,
             num_threads=args.threads,
-            delay=args.delay
+            delay=args.delay,
+            engine=args.engine,
+            concurrency=args.concurrency,
+            rate=args.rate,
+            adaptive=args.adaptive,
+            min_concurrency=args.min_concurrency,
+            decrease_factor=args.aimd_decrease
         )
         
+        # テスト実行
+        if args.listen:
+            coordinator = Coordinator(args.listen, args.workers, accept_timeout=args.accept_timeout,
+                                      read_timeout=args.worker_timeout)
+            stats = tester.run_distributed(coordinator, **run_options)
+        else:
+            stats = tester.run_test(**run_options)
+        
         # 結果をコンソールに出力
         print("\n" + "="*60)
         print("SIMPLE BOT FIGHT MODE TEST RESULTS")
@@ -359,6 +1155,14 @@ def main():
         print(f"Success Rate: {stats['test_summary']['success_rate']:.1f}%")
         print(f"Requests/Second: {stats['performance']['requests_per_second']:.2f}")
         print(f"Avg Response Time: {stats['performance']['avg_response_time']:.2f}s")
+        latency = stats['performance']['latency']
+        print(f"Latency p50/p95/p99: {latency['p50']:.3f}s / {latency['p95']:.3f}s / {latency['p99']:.3f}s "
+              f"(max {latency['max']:.3f}s, stddev {latency['stddev']:.3f}s)")
+        print(f"Phase Times (avg): {describe_phases(stats['performance']['phases'])}")
+        if stats['performance']['target_rate']:
+            print(f"Target Rate: {stats['performance']['target_rate']:.2f} req/s (open-loop)")
+            print(f"Avg Service Time: {stats['performance']['avg_service_time']:.2f}s")
+            print(f"Avg Start Lag: {stats['performance']['avg_start_lag']:.3f}s")
         print(f"Cloudflare Blocks: {stats['cloudflare_detection']['blocks']}")
         print(f"Block Rate: {stats['cloudflare_detection']['block_rate']:.1f}%")
         print(f"Cloudflare Challenges: {stats['cloudflare_detection']['challenges_detected']}")
@@ -367,10 +1171,32 @@ def main():
         if stats['bot_scores']['avg_score'] is not None:
             print(f"Avg Bot Score: {stats['bot_scores']['avg_score']:.3f}")
         
+        connection_stats = stats['connection_stats']
+        print(f"HTTP Sessions: {connection_stats['sessions']}")
+        print(f"Connections Opened: {connection_stats['connections_opened']}")
+        print(f"Connection Reuse Rate: {connection_stats['connection_reuse_rate']:.1f}%")
+        if stats['header_sets'] is not None:
+            print(f"Distinct Header Sets: {len(stats['header_sets'])}")
+        if stats['concurrency'] is not None:
+            concurrency_stats = stats['concurrency']
+            print(f"Adaptive Concurrency: avg {concurrency_stats['avg_limit']:.1f}, "
+                  f"lowest {concurrency_stats['lowest_limit']}, final {concurrency_stats['final_limit']} "
+                  f"(max {concurrency_stats['max_limit']}, {concurrency_stats['decreases']} back-offs)")
+        if stats['live_metrics'] is not None:
+            print(f"Live Metrics: {describe_live_metrics(stats['live_metrics'])}")
+        if stats['browser_clearance'] is not None:
+            clearance = stats['browser_clearance']
+            print(f"Browser Clearance: {clearance['ready_browsers']}/{clearance['browsers']} browsers, "
+                  f"{clearance['refreshes']} refreshes ({clearance['refreshes_expired']} expired, "
+                  f"{clearance['refreshes_blocked']} blocked)")
+        
         print("\nStatus Code Distribution:")
         for code, count in stats['status_codes'].items():
             print(f"  {code}: {count}")
         
+        if 'distributed' in stats:
+            print_distributed_report(stats['distributed'])
+        
         print("="*60)
         
     except KeyboardInterrupt:
@@ -378,6 +1204,9 @@ def main():
     except Exception as e:
         logger.error(f"Test failed: {e}")
         return 1
+    finally:
+        if clearance_broker is not None:
+            clearance_broker.close()
     
     return 0
 
@@ -0,0 +1,56 @@
+"""
+attack-scripts のテスト（pytest）
+
+実行（リポジトリのルートで）:
+    poetry run pytest attack-scripts/tests
+
+ネットワークは使わず、mock_server.py のスタンドインサーバーを 127.0.0.1 の空きポートで起動して使います。
+"""
+
+import io
+import logging
+import sys
+from pathlib import Path
+
+import pytest
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(SCRIPTS_DIR))
+
+# テスターはインポート時に setup_logging でファイルとコンソールにログを出すため、先にルートロガーを設定して
+# それを無効にする（ルートロガーにハンドラーがあれば setup_logging は何もしない）
+
+
+class _DiscardStream(io.TextIOBase):
+    def write(self, text):
+        return len(text)
+
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler(_DiscardStream())]
+)
+
+from mock_server import MockCloudflareServer, MockServerConfig  # noqa: E402
+
+
+@pytest.fixture
+def mock_server_factory():
+    """設定を指定してスタンドインサーバーを起動する（テストの終了時に停止する）"""
+    servers = []
+
+    def start(**config) -> MockCloudflareServer:
+        server = MockCloudflareServer('127.0.0.1', 0, MockServerConfig(seed=0, **config)).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def mock_server(mock_server_factory) -> MockCloudflareServer:
+    return mock_server_factory()
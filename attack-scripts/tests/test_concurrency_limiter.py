@@ -0,0 +1,134 @@
+"""concurrency_limiter.py の AIMDLimiter（減少は世代ごとに1回・下限・加算的増加・待ち合わせ）のテスト"""
+
+import asyncio
+import threading
+
+import pytest
+
+import concurrency_limiter
+from concurrency_limiter import AIMDLimiter
+
+OK = {'status_code': 200}
+THROTTLED = {'status_code': 429}
+
+
+class FakeClock:
+    """concurrency_limiter の time の代わり（monotonic は advance で進めたときだけ変わる）"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float = 1.0):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(concurrency_limiter, 'time', fake)
+    return fake
+
+
+def test_one_decrease_per_generation(clock):
+    limiter = AIMDLimiter(max_limit=16)
+    started = [limiter.acquire() for _ in range(4)]
+    clock.advance()
+
+    # 同じ世代（前回下げる前に開始した）のスロットリングは1回しか下げない
+    for start in started:
+        limiter.release(THROTTLED, start)
+    assert limiter.limit == 8.0
+    assert (limiter.decreases, limiter.throttled_responses) == (1, 4)
+
+    # 下げた時点以降に開始したリクエストは次の世代として下げる（同じ時刻も含む）
+    start = limiter.acquire()
+    clock.advance()
+    limiter.release(THROTTLED, start)
+    assert limiter.limit == 4.0
+    start = limiter.acquire()
+    limiter.release(THROTTLED, start)
+    assert limiter.limit == 2.0
+    assert limiter.decreases == 3
+    assert [limit for _, limit, _ in limiter.time_series()] == [16, 8, 4, 2]
+
+
+def test_decrease_stops_at_min_limit(clock):
+    limiter = AIMDLimiter(max_limit=8, min_limit=3)
+    for _ in range(5):
+        start = limiter.acquire()
+        clock.advance()
+        limiter.release(THROTTLED, start)
+    assert limiter.limit == 3.0
+    assert limiter.current_limit == 3
+    assert limiter.summary()['lowest_limit'] == 3
+
+
+def test_additive_increase_is_capped_at_max_limit(clock):
+    limiter = AIMDLimiter(max_limit=6, initial_limit=4, increase=2.0)
+    expected = 4.0
+    for _ in range(4):
+        start = limiter.acquire()
+        limiter.release(OK, start)
+        # 1件の完了ごとに increase / limit（1ウィンドウで約 increase）増やす
+        expected += 2.0 / expected
+        assert limiter.limit == pytest.approx(expected)
+    assert limiter.current_limit == 5
+
+    for _ in range(20):
+        limiter.release(OK, limiter.acquire())
+    assert limiter.limit == 6.0
+    assert [limit for _, limit, _ in limiter.time_series()] == [4, 5, 6]
+
+
+def test_release_without_result_does_not_adjust(clock):
+    limiter = AIMDLimiter(max_limit=4, initial_limit=2)
+    limiter.release(None, limiter.acquire())
+    assert (limiter.limit, limiter.in_flight) == (2.0, 0)
+
+
+def test_acquire_blocks_until_a_slot_is_released(clock):
+    limiter = AIMDLimiter(max_limit=2)
+    started = [limiter.acquire(), limiter.acquire()]
+    acquired = threading.Event()
+
+    def acquire():
+        limiter.acquire()
+        acquired.set()
+
+    thread = threading.Thread(target=acquire, daemon=True)
+    thread.start()
+    assert not acquired.wait(0.2)
+    assert limiter.in_flight == 2
+
+    limiter.release(None, started[0])
+    assert acquired.wait(5)
+    thread.join(5)
+    assert limiter.in_flight == 2
+
+
+def test_async_acquire_and_release(clock):
+    async def run():
+        limiter = AIMDLimiter(max_limit=2)
+        started = [await limiter.acquire_async(), await limiter.acquire_async()]
+        waiting = asyncio.ensure_future(limiter.acquire_async())
+        for _ in range(5):
+            await asyncio.sleep(0)
+        assert not waiting.done()
+
+        clock.advance()
+        await limiter.release_async(THROTTLED, started[0])
+        # 上限が 1 に下がり、実行中が 1 件なので待っている側はまだ始められない
+        assert limiter.limit == 1.0
+        for _ in range(5):
+            await asyncio.sleep(0)
+        assert not waiting.done()
+
+        await limiter.release_async(THROTTLED, started[1])
+        await asyncio.wait_for(waiting, 5)
+        assert limiter.in_flight == 1
+        assert (limiter.decreases, limiter.throttled_responses) == (1, 2)
+
+    asyncio.run(run())
@@ -0,0 +1,219 @@
+"""distributed.py のコーディネーターとワーカーを localhost でスタンドインサーバーに向けて動かすテスト"""
+
+import json
+import socket
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+import requests
+
+from distributed import PROTOCOL_VERSION, Coordinator, CoordinatorLost, MessageReader, run_worker, send_message
+from simple_test import SimpleBotTester, _run_worker_job
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """結果ファイル（attack-scripts/simple_test_results_*.json）の保存先"""
+    (tmp_path / 'attack-scripts').mkdir()
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def start_thread_workers(coordinator: Coordinator, count: int):
+    threads = [threading.Thread(target=run_worker, args=(coordinator.address, _run_worker_job), daemon=True)
+               for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def start_process_worker(coordinator: Coordinator, workdir: Path) -> subprocess.Popen:
+    host, port = coordinator.address
+    return subprocess.Popen([sys.executable, str(SCRIPTS_DIR / 'simple_test.py'), '--worker', f'{host}:{port}',
+                             '--quiet'], cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def start_fake_worker(coordinator: Coordinator, behaviour: str) -> threading.Thread:
+    """プロトコルの途中で止まるワーカー（'before_ready': job を受け取って切断、'silent': 開始後に何も送らない）"""
+    done = threading.Event()
+
+    def run():
+        sock = socket.create_connection(coordinator.address)
+        reader = MessageReader(sock)
+        try:
+            send_message(sock, {'type': 'hello', 'version': PROTOCOL_VERSION, 'host': 'fake', 'pid': 0})
+            reader.read()
+            if behaviour == 'silent':
+                send_message(sock, {'type': 'ready'})
+                reader.read()
+                done.wait(30)
+        finally:
+            reader.close()
+            sock.close()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.stop = done.set
+    return thread
+
+
+def run_coordinator(coordinator: Coordinator, server, num_requests: int, **options):
+    tester = SimpleBotTester(target_url=f"{server.base_url}/contact")
+    try:
+        stats = tester.run_distributed(coordinator, num_requests=num_requests, num_threads=4, delay=0, **options)
+    finally:
+        tester.sessions.close()
+    return tester, stats
+
+
+def contact_requests(server) -> int:
+    stats = json.loads(requests.get(f"{server.base_url}/__stats", timeout=5).text)
+    return stats['requests'].get('/api/contact', 0)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def workers_by_status(stats):
+    workers = stats['distributed']['workers']
+    return {status: [worker for worker in workers if worker['status'] == status]
+            for status in ('done', 'lost', 'failed')}
+
+
+def test_results_from_all_workers_are_merged(mock_server, workdir):
+    coordinator = Coordinator(('127.0.0.1', 0), 2, accept_timeout=10)
+    threads = start_thread_workers(coordinator, 2)
+    tester, stats = run_coordinator(coordinator, mock_server, 40)
+    for thread in threads:
+        thread.join(10)
+
+    assert stats['test_summary']['total_requests'] == 40
+    assert stats['test_summary']['success_rate'] == 100
+    assert sorted(result['attempt'] for result in tester.results) == list(range(40))
+    assert {result['worker_id'] for result in tester.results} == {0, 1}
+    workers = stats['distributed']['workers']
+    assert [(worker['status'], worker['received'], worker['requests']) for worker in workers] == [
+        ('done', 20, 20), ('done', 20, 20)]
+    assert len(list(workdir.glob('attack-scripts/simple_test_results_*.json'))) == 1
+
+
+def test_killed_worker_is_reported_lost(mock_server_factory, workdir):
+    server = mock_server_factory(latency=0.02)
+    coordinator = Coordinator(('127.0.0.1', 0), 2, accept_timeout=30)
+    processes = [start_process_worker(coordinator, workdir) for _ in range(2)]
+    tester = SimpleBotTester(target_url=f"{server.base_url}/contact")
+    killed = {}
+    record = tester._record_remote_result
+
+    def record_and_kill(result):
+        # 最初に結果を送ってきたワーカーのプロセスを止める
+        if not killed:
+            worker_pid = next(worker['pid'] for worker in coordinator._workers
+                              if worker['worker_id'] == result['worker_id'])
+            process = next(process for process in processes if process.pid == worker_pid)
+            process.kill()
+            killed['worker_id'] = result['worker_id']
+        record(result)
+
+    tester._record_remote_result = record_and_kill
+    try:
+        stats = tester.run_distributed(coordinator, num_requests=400, num_threads=2, delay=0)
+    finally:
+        tester.sessions.close()
+        for process in processes:
+            process.kill()
+            process.wait(10)
+
+    statuses = workers_by_status(stats)
+    assert len(statuses['done']) == 1 and len(statuses['lost']) == 1
+    lost = statuses['lost'][0]
+    assert lost['worker_id'] == killed['worker_id']
+    assert lost['received'] < lost['requests']
+    assert lost['error'] == 'connection closed'
+    assert stats['test_summary']['total_requests'] == statuses['done'][0]['requests'] + lost['received']
+
+
+def test_worker_lost_before_ready_does_not_stop_the_run(mock_server, workdir):
+    coordinator = Coordinator(('127.0.0.1', 0), 2, accept_timeout=10)
+    fake = start_fake_worker(coordinator, 'before_ready')
+    fake.join(10)
+    start_thread_workers(coordinator, 1)
+    tester, stats = run_coordinator(coordinator, mock_server, 20)
+
+    statuses = workers_by_status(stats)
+    assert [worker['host'] for worker in statuses['lost']] == ['fake']
+    assert statuses['lost'][0]['error'].startswith('failed to start')
+    assert len(statuses['done']) == 1
+    assert stats['test_summary']['total_requests'] == statuses['done'][0]['requests'] == 10
+
+
+def test_silent_worker_is_lost_after_read_timeout(mock_server, workdir):
+    coordinator = Coordinator(('127.0.0.1', 0), 2, accept_timeout=10, read_timeout=1.0)
+    fake = start_fake_worker(coordinator, 'silent')
+    start_thread_workers(coordinator, 1)
+    try:
+        tester, stats = run_coordinator(coordinator, mock_server, 20)
+    finally:
+        fake.stop()
+
+    statuses = workers_by_status(stats)
+    assert [worker['host'] for worker in statuses['lost']] == ['fake']
+    assert statuses['lost'][0]['error'] == 'no message within the read timeout'
+    assert stats['test_summary']['total_requests'] == 10
+
+
+def test_heartbeats_keep_a_slow_worker(mock_server_factory, workdir):
+    # 1件の応答に read_timeout より長くかかっても、heartbeat が届いていれば lost にしない
+    server = mock_server_factory(latency=1.5)
+    coordinator = Coordinator(('127.0.0.1', 0), 1, accept_timeout=10, read_timeout=0.6)
+    start_thread_workers(coordinator, 1)
+    tester, stats = run_coordinator(coordinator, server, 1)
+
+    assert [worker['status'] for worker in stats['distributed']['workers']] == ['done']
+    assert stats['test_summary']['successful_requests'] == 1
+
+
+@pytest.mark.parametrize('engine', ['thread', 'asyncio'])
+def test_worker_stops_when_the_coordinator_dies(mock_server, workdir, engine):
+    port = free_port()
+    # 400件を 20 req/s で送る（20秒かかる）実行の途中でコーディネーターのプロセスを止める
+    coordinator = subprocess.Popen([sys.executable, str(SCRIPTS_DIR / 'simple_test.py'),
+                                    '--url', f"{mock_server.base_url}/contact", '--listen', f'127.0.0.1:{port}',
+                                    '--workers', '1', '--requests', '400', '--rate', '20/s', '--engine', engine, '--quiet'],
+                                   cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    outcome = {}
+
+    def work():
+        try:
+            outcome['summary'] = run_worker(('127.0.0.1', port), _run_worker_job, connect_timeout=20)
+        except Exception as e:
+            outcome['error'] = e
+
+    worker = threading.Thread(target=work, daemon=True)
+    worker.start()
+    try:
+        deadline = time.monotonic() + 20
+        while contact_requests(mock_server) < 5 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert contact_requests(mock_server) >= 5
+    finally:
+        coordinator.kill()
+        coordinator.wait(10)
+
+    # 割り当ての残り（約20秒分）を送り続けずに、すぐに CoordinatorLost で終わる
+    worker.join(10)
+    assert not worker.is_alive()
+    assert isinstance(outcome.get('error'), CoordinatorLost)
+    sent = contact_requests(mock_server)
+    assert sent < 400
+    time.sleep(0.5)
+    assert contact_requests(mock_server) == sent
@@ -0,0 +1,75 @@
+"""html_page_test.py のマルチプロセス実行のテスト"""
+
+import json
+import multiprocessing
+
+import pytest
+
+from html_page_test import HTMLPageBotTester
+from live_metrics import LiveMetrics
+from result_sink import StreamingResults
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    (tmp_path / 'attack-scripts').mkdir()
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_multiprocess_opens_sink_after_fork_and_closes_it(mock_server, workdir, monkeypatch):
+    tester = HTMLPageBotTester(target_url=f"{mock_server.base_url}/contact", stream_results=True)
+    opened = []
+    open_results = tester._open_results
+
+    def record_open(*args, **kwargs):
+        # 開く時点でワーカープロセスはすべて起動済み
+        opened.append(len(multiprocessing.active_children()))
+        open_results(*args, **kwargs)
+
+    monkeypatch.setattr(tester, '_open_results', record_open)
+    try:
+        stats = tester.run_test_multiprocess(2, num_requests=10, num_threads=2, delay=0)
+    finally:
+        tester.sessions.close()
+
+    assert opened == [2]
+    assert isinstance(tester.results, StreamingResults)
+    assert not tester.results.sink._thread.is_alive()
+    assert stats['test_summary']['total_requests'] == 10
+    attempts = []
+    for path in tester.results.paths:
+        with open(path, encoding='utf-8') as f:
+            attempts.extend(json.loads(line)['attempt'] for line in f)
+    assert sorted(attempts) == list(range(10))
+
+
+def test_multiprocess_closes_sink_on_error(mock_server, workdir, monkeypatch):
+    tester = HTMLPageBotTester(target_url=f"{mock_server.base_url}/contact", stream_results=True)
+    def interrupted(futures):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr('html_page_test.as_completed', interrupted)
+    try:
+        with pytest.raises(KeyboardInterrupt):
+            tester.run_test_multiprocess(2, num_requests=4, num_threads=1, delay=0)
+    finally:
+        tester.sessions.close()
+    assert not tester.results.sink._thread.is_alive()
+
+
+def test_multiprocess_feeds_live_metrics(mock_server_factory, workdir):
+    server = mock_server_factory(block_rate=1.0)
+    live_metrics = LiveMetrics('html_page_test', interval=0.2)
+    tester = HTMLPageBotTester(target_url=f"{server.base_url}/contact", live_metrics=live_metrics)
+    try:
+        stats = tester.run_test_multiprocess(2, num_requests=10, num_threads=2, delay=0)
+    finally:
+        tester.sessions.close()
+
+    # 各プロセスの結果がすべて親プロセスのウィンドウに記録される
+    assert live_metrics.total == 10
+    assert live_metrics.flag_totals['cloudflare_blocked'] == 10
+    assert live_metrics.status_totals == {403: 10}
+    assert stats['live_metrics']['onset']['cloudflare_blocked'] is not None
+    assert stats['live_metrics']['onset']['blocked_403'] is not None
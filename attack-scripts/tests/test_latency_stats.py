@@ -0,0 +1,52 @@
+"""latency_stats.py の集計器（Botスコアの分布）のテスト"""
+
+import random
+
+import pytest
+
+from latency_stats import ResultAggregator, ScoreHistogram
+
+
+def test_score_histogram_summary():
+    histogram = ScoreHistogram()
+    for score in (0.9, 0.9, 0.3, 0.0, 1.0, 0.42):
+        histogram.record(score)
+    assert histogram.summary() == {
+        'avg_score': pytest.approx(3.52 / 6),
+        'total_scores_received': 6,
+        'min_score': 0.0,
+        'max_score': 1.0,
+        'distribution': {'0.00': 1, '0.30': 1, '0.42': 1, '0.90': 2, '1.00': 1}
+    }
+
+
+def test_empty_score_histogram():
+    assert ScoreHistogram().summary() == {'avg_score': None, 'total_scores_received': 0, 'min_score': None,
+                                          'max_score': None, 'distribution': {}}
+
+
+def test_score_histogram_is_bounded_and_mergeable():
+    rng = random.Random(0)
+    scores = [rng.randint(0, 100) / 100 for _ in range(100000)]
+    one, batched, merged = ScoreHistogram(), ScoreHistogram(), ScoreHistogram()
+    for score in scores:
+        one.record(score)
+    batched.record_many(scores)
+    for part in (scores[:30000], scores[30000:]):
+        histogram = ScoreHistogram()
+        histogram.record_many(part)
+        merged.merge(histogram)
+
+    assert len(one.counts) <= 101
+    for histogram in (batched, merged):
+        assert histogram.counts == one.counts
+        assert histogram.summary()['avg_score'] == pytest.approx(sum(scores) / len(scores))
+
+
+def test_aggregator_keeps_no_raw_scores():
+    aggregator = ResultAggregator()
+    for attempt in range(1000):
+        aggregator.add({'success': True, 'status_code': 200, 'response_time': 0.1, 'bot_score': 0.9})
+    aggregator.add({'success': False, 'status_code': 403, 'response_time': 0.1, 'bot_score': None})
+    assert aggregator.bot_scores.counts == {90: 1000}
+    assert aggregator.bot_scores.summary()['total_scores_received'] == 1000
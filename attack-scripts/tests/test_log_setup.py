@@ -0,0 +1,60 @@
+"""log_setup.py のキュー経由のログ出力（flush_logging とフォーク後のリスナー）のテスト"""
+
+import logging
+import os
+
+import pytest
+
+import log_setup
+
+
+@pytest.fixture
+def queued_logging(tmp_path):
+    """テスト用の設定（捨てるストリーム）を外して setup_logging を有効にし、終了後に元に戻す"""
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    for handler in handlers:
+        root.removeHandler(handler)
+    log_file = tmp_path / 'test.log'
+    listener = log_setup.setup_logging(str(log_file))
+    yield log_file
+    log_setup._stop_listener()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    for handler in listener.handlers:
+        handler.close()
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+    log_setup._listener = None
+
+
+def test_flush_logging_writes_queued_records(queued_logging):
+    logging.getLogger('test').info('queued line')
+    log_setup.flush_logging()
+    assert 'queued line' in queued_logging.read_text()
+    # 書き出した後もリスナーは動き続ける
+    logging.getLogger('test').info('second line')
+    log_setup.flush_logging()
+    assert 'second line' in queued_logging.read_text()
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='requires fork')
+def test_forked_child_gets_its_own_listener(queued_logging):
+    parent_listener = log_setup._listener
+    pid = os.fork()
+    if pid == 0:
+        # 子プロセス（atexit を実行しない終了と同じく、flush_logging で書き出してから os._exit する）
+        code = 1
+        try:
+            logging.getLogger('test').info('from child')
+            log_setup.flush_logging()
+            code = 0 if log_setup._listener is not parent_listener else 2
+        finally:
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    assert 'from child' in queued_logging.read_text()
+    logging.getLogger('test').info('from parent')
+    log_setup.flush_logging()
+    assert 'from parent' in queued_logging.read_text()
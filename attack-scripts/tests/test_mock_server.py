@@ -0,0 +1,124 @@
+"""mock_server.py の応答が実際のルート（app/api/contact/route.ts）・Cloudflare の応答と同じ形かのテスト"""
+
+import json
+
+import pytest
+import requests
+
+from simple_test import SimpleBotTester
+
+CONTACT_FORM = {'email': 'test@example.com', 'message': 'お問い合わせテストです。', 'recaptchaToken': ''}
+
+# app/api/contact/route.ts の成功時の応答（reCAPTCHAトークンなし、cf-* ヘッダーなし）。
+# cloudflareBotScore は undefined なので NextResponse.json は scores.cloudflare を出力しない
+ROUTE_SUCCESS_BODY = {
+    'success': True,
+    'message': 'お問い合わせを受け付けました',
+    'scores': {'recaptcha': None, 'jsDetectionPassed': None},
+    'debug': {
+        'hasCfClearance': False,
+        'headers': {'cfRay': None, 'cfConnectingIp': None, 'cfIpCountry': None}
+    }
+}
+
+
+def post_contact(server, headers=None, payload=None) -> requests.Response:
+    return requests.post(f"{server.base_url}/api/contact", json=payload or CONTACT_FORM, headers=headers, timeout=5)
+
+
+def submit(server) -> dict:
+    tester = SimpleBotTester(target_url=f"{server.base_url}/contact")
+    try:
+        return tester.submit_contact_form(0, 0)
+    finally:
+        tester.sessions.close()
+
+
+def test_success_matches_route(mock_server):
+    response = post_contact(mock_server)
+    assert response.status_code == 200
+    assert response.headers['X-Bot-Detection-Type'] == 'Cloudflare-Bot-Fight-Mode'
+    assert response.json() == ROUTE_SUCCESS_BODY
+    # 実際のルートの応答にない "cloudflare" の文字列を含めない（simple_test のキーワード走査に引っかかる）
+    assert 'cloudflare' not in response.text.lower()
+
+
+def test_success_with_cloudflare_headers_matches_route(mock_server):
+    response = post_contact(mock_server, headers={
+        'cf-bot-score': '42', 'cf-ray': '8f00-NRT', 'cf-connecting-ip': '203.0.113.10', 'cf-ipcountry': 'JP',
+        'x-cf-js-detection-status': 'passed', 'Cookie': 'cf_clearance=abc'
+    }, payload=dict(CONTACT_FORM, recaptchaToken='token'))
+    body = response.json()
+    assert body['scores'] == {'recaptcha': 0.9, 'cloudflare': 0.42, 'jsDetectionPassed': True}
+    assert body['debug'] == {
+        'hasCfClearance': True,
+        'headers': {'cfRay': '8f00-NRT', 'cfConnectingIp': '203.0.113.10', 'cfIpCountry': 'JP'}
+    }
+
+
+def test_unparsable_bot_score_is_null_like_route(mock_server):
+    # parseInt が NaN になり、JSON.stringify で null になる
+    assert post_contact(mock_server, headers={'cf-bot-score': 'n/a'}).json()['scores']['cloudflare'] is None
+
+
+def test_missing_fields_match_route(mock_server):
+    response = post_contact(mock_server, payload={'email': 'test@example.com'})
+    assert response.status_code == 400
+    assert response.json() == {'error': 'メールアドレスとお問い合わせ内容は必須です'}
+
+
+def test_success_is_not_counted_as_challenge(mock_server):
+    result = submit(mock_server)
+    assert result['success'] is True
+    assert result['status_code'] == 200
+    assert result['challenge_detected'] is False
+    assert result['cloudflare_blocked'] is False
+
+
+@pytest.mark.parametrize('config, status_code, marker', [
+    ({'block_rate': 1.0}, 403, 'Sorry, you have been blocked'),
+    ({'rate_limit_rate': 1.0}, 429, 'Too Many Requests'),
+    ({'challenge_rate': 1.0}, 503, 'Checking your browser'),
+    ({'challenge_rate': 1.0, 'challenge_status': 403}, 403, 'Checking your browser'),
+])
+def test_fault_responses(mock_server_factory, config, status_code, marker):
+    server = mock_server_factory(**config)
+    response = post_contact(server)
+    assert response.status_code == status_code
+    assert response.headers['Content-Type'].startswith('text/html')
+    assert response.headers['Server'] == 'cloudflare'
+    assert 'CF-RAY' in response.headers
+    assert marker in response.text
+    if status_code == 429:
+        assert response.headers['Retry-After'] == '1'
+    if 'challenge_rate' in config:
+        assert response.headers['cf-mitigated'] == 'challenge'
+
+
+def test_rate_limit_token_bucket(mock_server_factory):
+    server = mock_server_factory(rate_limit=2.0)
+    status_codes = [post_contact(server).status_code for _ in range(4)]
+    assert status_codes[:2] == [200, 200]
+    assert 429 in status_codes[2:]
+
+
+# ブロックページは本物と同じく "Cloudflare" の文字列を含むため、キーワード走査で challenge_detected も立つ
+@pytest.mark.parametrize('config, expected', [
+    ({'block_rate': 1.0}, {'cloudflare_blocked': True, 'challenge_detected': True,
+                           'error': 'Cloudflare blocked (403)'}),
+    ({'rate_limit_rate': 1.0}, {'cloudflare_blocked': False, 'challenge_detected': False,
+                                'error': 'Rate limited (429)'}),
+    ({'challenge_rate': 1.0}, {'cloudflare_blocked': False, 'challenge_detected': True,
+                               'error': 'Cloudflare challenge/error (503)'}),
+])
+def test_fault_classification(mock_server_factory, config, expected):
+    result = submit(mock_server_factory(**config))
+    assert result['success'] is False
+    assert {key: result[key] for key in expected} == expected
+
+
+def test_stats_endpoint(mock_server):
+    post_contact(mock_server)
+    stats = json.loads(requests.get(f"{mock_server.base_url}/__stats", timeout=5).text)
+    assert stats['requests']['/api/contact'] == 1
+    assert stats['status_codes']['200'] == 1
@@ -0,0 +1,51 @@
+"""page_analysis.py の走査による解析が BeautifulSoup での解析と同じ結果になるかのテスト"""
+
+import pytest
+
+from mock_server import BLOCK_PAGE, CHALLENGE_PAGE, CONTACT_PAGE
+from page_analysis import analyze_contact_page, analyze_contact_page_bs4
+
+FORM = '''<form>
+<input id="email" type="email" name="email">
+<textarea id="message" name="message"></textarea>
+<button type="submit">送信</button>
+</form>'''
+
+COMMENTED_PAGES = {
+    'commented_out_form': f'<html><head><title>お問い合わせ</title></head><body><!-- {FORM} --></body></html>',
+    'commented_out_title': f'<html><head><!-- <title>Old</title> --><title>New</title></head><body>{FORM}</body></html>',
+    'comment_before_form': f'<html><body><!-- <button type="submit"> --><form><input id="email" type="email">'
+                           f'<textarea id="message"></textarea></form></body></html>',
+    'commented_out_script': '<html><head><!-- <script src="https://www.google.com/recaptcha/api.js"></script> -->'
+                            f'</head><body>{FORM}</body></html>',
+    'script_in_comment_not_closed_in_comment': f'<html><body><!-- <script> -->{FORM}</body></html>',
+    'multiline_comment': f'<html><title>t</title><!--\n<input id="email" type="email">\n-->\n{FORM}</html>',
+    'comment_inside_script': f'<html><script>var a = "<!--";</script>{FORM}</html>',
+}
+
+
+@pytest.mark.parametrize('name', sorted(COMMENTED_PAGES))
+def test_commented_out_markup_matches_bs4(name):
+    page = COMMENTED_PAGES[name]
+    assert analyze_contact_page(page) == analyze_contact_page_bs4(page)
+
+
+def test_commented_out_form_is_not_found():
+    assert analyze_contact_page(COMMENTED_PAGES['commented_out_form'])['form_found'] is False
+    assert analyze_contact_page(COMMENTED_PAGES['commented_out_title'])['page_title'] == 'New'
+
+
+def test_unterminated_comment_runs_to_the_end():
+    # ブラウザと同じく最後までコメントとして扱う（html.parser はバージョンによって後続のタグを解釈する）
+    result = analyze_contact_page(f'<html><title>t</title><!-- {FORM}')
+    assert result['page_title'] == 't'
+    assert result['form_found'] is False
+
+
+@pytest.mark.parametrize('page', [CONTACT_PAGE, CHALLENGE_PAGE, BLOCK_PAGE], ids=['contact', 'challenge', 'block'])
+def test_stand_in_pages_match_bs4(page):
+    assert analyze_contact_page(page) == analyze_contact_page_bs4(page)
+
+
+def test_contact_page_form_is_found():
+    assert analyze_contact_page(CONTACT_PAGE)['form_found'] is True
@@ -0,0 +1,145 @@
+"""result_binary.py の .rbin ファイルの書き出しと読み込み（行・列・絞り込み・JSONへの書き出し）のテスト"""
+
+import json
+import math
+
+import pytest
+
+from result_binary import _NO_REFERENCE, MAGIC, BinaryResults, write_binary_results
+from result_table import _NO_TIMESTAMP, json_default
+from simple_test import SimpleBotTester
+
+SCHEMA = SimpleBotTester.RESULT_COLUMNS
+
+
+def make_record(attempt: int, status_code, **values):
+    record = {field: None for field in SCHEMA}
+    record.update({
+        'thread_id': attempt % 2,
+        'attempt': attempt,
+        'timestamp': f'2026-10-17T12:00:{attempt:02d}.123456',
+        'success': status_code == 200,
+        'error': None if status_code == 200 else f'HTTP {status_code}',
+        'response_time': 0.25 + attempt / 100,
+        'status_code': status_code,
+        'cloudflare_blocked': status_code == 403,
+        'challenge_detected': status_code == 503,
+        'response_headers': {'Content-Type': 'application/json', 'CF-RAY': f'8f{attempt:02d}-NRT'},
+        'cloudflare_headers': {'CF-RAY': f'8f{attempt:02d}-NRT'},
+    })
+    record.update(values)
+    return record
+
+
+RECORDS = [
+    make_record(0, 200, bot_score=0.9, intended_start=100.0, actual_start=100.01),
+    make_record(1, 403),
+    # 接続エラー: ステータスコード・時刻・ヘッダーなし
+    make_record(2, None, timestamp=None, response_time=0.0, response_headers={}, cloudflare_headers={},
+                error='Connection error'),
+    make_record(3, 200, bot_score=0.3, clearance='0:1'),
+    # スキーマにないフィールド（分散実行の worker_id など）はヒープの追加フィールド列に入る
+    make_record(4, 503, worker_id=1, proxy={'host': 'proxy.example', 'port': 8080}),
+]
+
+STATS = {
+    'test_summary': {'total_requests': len(RECORDS), 'success_rate': 40.0, 'processes': None},
+    'status_codes': {'200': 2, '403': 1, '503': 1},
+    'detailed_results': RECORDS,
+    'live_metrics': None
+}
+
+
+@pytest.fixture
+def rbin(tmp_path):
+    path = str(tmp_path / 'simple_test_results.rbin')
+    write_binary_results(path, STATS, SCHEMA)
+    with BinaryResults(path) as results:
+        yield results
+
+
+def test_rows_round_trip(rbin):
+    assert len(rbin) == len(RECORDS)
+    assert list(rbin) == RECORDS
+    assert [rbin[index] for index in range(len(RECORDS))] == RECORDS
+    assert rbin[-1] == RECORDS[-1]
+    assert rbin.row(4, ['attempt', 'worker_id']) == {'attempt': 4, 'worker_id': 1}
+    assert rbin.stats == {key: value for key, value in STATS.items() if key != 'detailed_results'}
+    with pytest.raises(IndexError):
+        rbin.row(len(RECORDS))
+
+
+def test_sentinels_and_category_codes(rbin):
+    def raw(index, name):
+        return rbin._struct.unpack_from(rbin._map, rbin._records_offset + index * rbin._struct.size)[
+            rbin._slots[name]]
+
+    # None の float は NaN、時刻は _NO_TIMESTAMP、空の辞書は _NO_REFERENCE として持ち、読むと元に戻る
+    assert math.isnan(raw(1, 'bot_score')) and rbin[1]['bot_score'] is None
+    assert raw(2, 'timestamp') == _NO_TIMESTAMP and rbin[2]['timestamp'] is None
+    assert raw(2, 'response_headers') == _NO_REFERENCE and rbin[2]['response_headers'] == {}
+    assert raw(0, '') == _NO_REFERENCE and raw(4, '') != _NO_REFERENCE
+    # カテゴリ列は出現順の値の一覧へのコード
+    assert rbin.categories['status_code'] == [200, 403, None, 503]
+    assert [raw(index, 'status_code') for index in range(len(RECORDS))] == [0, 1, 2, 0, 3]
+    assert rbin.categories['clearance'] == [None, '0:1']
+
+
+def test_columns(rbin):
+    for name in ('attempt', 'timestamp', 'status_code', 'bot_score', 'success', 'response_headers'):
+        assert list(rbin.column(name)) == [record[name] for record in RECORDS]
+    with pytest.raises(KeyError):
+        list(rbin.column('worker_id'))
+
+
+def test_select(rbin):
+    assert list(rbin.select(status_code=200)) == [RECORDS[0], RECORDS[3]]
+    assert list(rbin.select(status_code=None)) == [RECORDS[2]]
+    assert list(rbin.select(['attempt'], success=False, thread_id=1)) == [{'attempt': 1}]
+    assert list(rbin.select(['attempt', 'worker_id'], challenge_detected=True)) == [{'attempt': 4, 'worker_id': 1}]
+    assert list(rbin.select(bot_score=0.3)) == [RECORDS[3]]
+    assert list(rbin.select(error='Connection error', timestamp=None)) == [RECORDS[2]]
+    # カテゴリの一覧にない値はレコードを読まずに空になる
+    assert list(rbin.select(status_code=429)) == []
+    with pytest.raises(KeyError):
+        list(rbin.select(worker_id=1))
+
+
+def test_export_json_matches_json_results(rbin, tmp_path):
+    output = tmp_path / 'exported.json'
+    rbin.export_json(str(output))
+    expected = json.dumps(STATS, ensure_ascii=False, indent=2, default=json_default)
+    assert output.read_text(encoding='utf-8') == expected
+
+
+def test_empty_run(tmp_path):
+    stats = dict(STATS, detailed_results=[])
+    path = str(tmp_path / 'empty.rbin')
+    write_binary_results(path, stats, SCHEMA)
+    with BinaryResults(path) as results:
+        assert len(results) == 0
+        assert list(results) == []
+        assert list(results.column('attempt')) == []
+        assert list(results.select(success=True)) == []
+        output = tmp_path / 'empty.json'
+        results.export_json(str(output))
+    assert output.read_text(encoding='utf-8') == json.dumps(stats, ensure_ascii=False, indent=2,
+                                                            default=json_default)
+
+
+def test_truncated_file_is_rejected(tmp_path):
+    path = tmp_path / 'truncated.rbin'
+    write_binary_results(str(path), STATS, SCHEMA)
+    # 書き出しの途中で止まったファイル（footer と末尾の MAGIC がない）
+    data = path.read_bytes()
+    path.write_bytes(data[:len(data) // 2])
+    with pytest.raises(ValueError, match='Truncated'):
+        BinaryResults(str(path))
+
+
+@pytest.mark.parametrize('data', [b'{"test_summary": {}}' * 4, b'BFMRES00' + b'\0' * 32, MAGIC[:4]])
+def test_bad_magic_is_rejected(tmp_path, data):
+    path = tmp_path / 'not_rbin.rbin'
+    path.write_bytes(data)
+    with pytest.raises(ValueError, match='Not a binary result file'):
+        BinaryResults(str(path))
@@ -0,0 +1,88 @@
+"""result_sink.py の JSONL 書き出し（往復・書きかけの行・書き込みエラー）のテスト"""
+
+import os
+import threading
+
+import pytest
+
+from result_sink import JSONLResultSink, StreamingResults, iter_jsonl
+
+RECORDS = [
+    {'attempt': 0, 'success': True, 'status_code': 200, 'message': 'お問い合わせを受け付けました'},
+    {'attempt': 1, 'success': False, 'status_code': 403, 'error': 'Cloudflare blocked (403)'},
+    {'attempt': 2, 'success': False, 'status_code': None, 'error': 'timeout'},
+]
+
+
+def call_with_timeout(func, timeout=10):
+    """func を別スレッドで実行し、止まったままならテストを失敗させる（送出された例外は返す）"""
+    outcome = {}
+
+    def run():
+        try:
+            outcome['value'] = func()
+        except BaseException as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), f'{func} did not return within {timeout}s'
+    return outcome
+
+
+def test_round_trip(tmp_path):
+    results = StreamingResults(str(tmp_path / 'results.jsonl'), fsync_interval=0.05)
+    results.extend(RECORDS[:2])
+    results.append(RECORDS[2])
+    assert len(results) == 3
+    assert list(results) == RECORDS
+    results.close()
+    assert list(iter_jsonl([str(tmp_path / 'results.jsonl')])) == RECORDS
+
+
+def test_unserializable_record_is_skipped(tmp_path):
+    path = str(tmp_path / 'results.jsonl')
+    sink = JSONLResultSink(path, fsync_interval=0.05)
+    sink.write(RECORDS[0])
+    sink.write({'attempt': 1, 'value': object()})
+    sink.write(RECORDS[1])
+    sink.close()
+    assert sink.records_written == 2
+    assert list(iter_jsonl([path])) == RECORDS[:2]
+
+
+def test_truncated_trailing_line_is_skipped(tmp_path, caplog):
+    # 強制終了で最後の行が書きかけのまま残ったファイル
+    path = tmp_path / 'results.jsonl'
+    sink = JSONLResultSink(str(path), fsync_interval=0.05)
+    for record in RECORDS[:2]:
+        sink.write(record)
+    sink.close()
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"attempt": 2, "success": fa')
+
+    assert list(iter_jsonl([str(path)])) == RECORDS[:2]
+    assert 'results.jsonl' in caplog.text
+
+
+@pytest.mark.skipif(not os.path.exists('/dev/full'), reason='requires /dev/full')
+def test_write_error_is_raised_instead_of_hanging(tmp_path):
+    results = StreamingResults('/dev/full', fsync_interval=0.05)
+    results.append(RECORDS[0])
+
+    # 書き込みに失敗してもライタースレッドはキューを処理し続け、flush は止まらずにエラーを送出する
+    outcome = call_with_timeout(results.sink.flush)
+    assert isinstance(outcome.get('error'), OSError)
+    assert results.sink.error is outcome['error']
+    with pytest.raises(OSError):
+        results.append(RECORDS[1])
+    outcome = call_with_timeout(results.close)
+    assert isinstance(outcome.get('error'), OSError)
+    assert not results.sink._thread.is_alive()
+
+
+def test_open_error_is_raised(tmp_path):
+    sink = JSONLResultSink(str(tmp_path / 'missing' / 'results.jsonl'), fsync_interval=0.05)
+    outcome = call_with_timeout(sink.close)
+    assert isinstance(outcome.get('error'), FileNotFoundError)
@@ -0,0 +1,117 @@
+"""result_table.py の列指向テーブルと、ResultAggregator.add_table の列ごとの集計のテスト"""
+
+import pickle
+import random
+
+import pytest
+
+from latency_stats import ResultAggregator
+from result_table import MAX_SHARED_VALUES, ResultTable
+from simple_test import SimpleBotTester
+
+HEADER_SETS = (
+    {'Content-Type': 'application/json', 'Server': 'cloudflare', 'CF-RAY': None, 'Date': None},
+    {'Content-Type': 'text/html; charset=UTF-8', 'Server': 'cloudflare', 'cf-mitigated': 'challenge', 'CF-RAY': None},
+    {},
+)
+
+
+def make_records(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    records = []
+    for index in range(count):
+        status_code = rng.choice([200, 200, 200, 403, 429, 503, None])
+        headers = {key: value if value is not None else f'{key}-{index}'
+                   for key, value in rng.choice(HEADER_SETS).items()}
+        response_time = rng.choice([0.0, rng.uniform(0.001, 2.0)])
+        record = {
+            'thread_id': index % 8,
+            'attempt': index,
+            'timestamp': '2026-10-17T12:00:00.123456',
+            'success': status_code == 200,
+            'error': None if status_code == 200 else f'HTTP {status_code}',
+            'response_time': response_time,
+            'intended_start': 100.0 + index,
+            'actual_start': 100.0 + index + rng.choice([0.0, 0.01]),
+            'service_time': response_time / 2,
+            'status_code': status_code,
+            'cloudflare_blocked': status_code == 403,
+            'challenge_detected': status_code == 503,
+            'bot_score': rng.choice([None, 0.9, 0.3]),
+            'response_headers': headers,
+            'cloudflare_headers': {key: value for key, value in headers.items() if key.lower().startswith('cf-')},
+            'header_set': None,
+            'clearance': None
+        }
+        record.update({field: None for field in SimpleBotTester.RESULT_COLUMNS if field not in record})
+        records.append({field: record[field] for field in SimpleBotTester.RESULT_COLUMNS})
+    return records
+
+
+def make_table(records) -> ResultTable:
+    table = ResultTable(SimpleBotTester.RESULT_COLUMNS)
+    table.extend(records)
+    return table
+
+
+def test_rows_round_trip():
+    records = make_records(500)
+    table = make_table(records)
+    assert len(table) == len(records)
+    assert list(table) == records
+    assert table[-1] == records[-1]
+    assert table.decoded('response_headers') == [record['response_headers'] for record in records]
+
+
+def test_mapping_column_shares_keys_and_repeated_values():
+    table = make_table(make_records(200))
+    column = table._mappings['response_headers']
+    # キーの組み合わせは HEADER_SETS の種類だけ
+    assert len(column.key_sets.values) == len(HEADER_SETS)
+    servers = [value for value in column.values if value == 'cloudflare']
+    assert len({id(value) for value in servers}) == 1
+
+
+def test_mapping_column_stops_sharing_at_limit():
+    table = ResultTable({'response_headers': 'mapping'})
+    for index in range(MAX_SHARED_VALUES + 10):
+        table.append({'response_headers': {'CF-RAY': f'ray-{index}'}})
+    assert len(table._mappings['response_headers']._shared) == MAX_SHARED_VALUES
+    assert table[-1] == {'response_headers': {'CF-RAY': f'ray-{MAX_SHARED_VALUES + 9}'}}
+
+
+def test_extend_and_pickle():
+    first, second = make_records(100, seed=1), make_records(150, seed=2)
+    table = make_table(first)
+    table.extend(pickle.loads(pickle.dumps(make_table(second))))
+    assert list(table) == first + second
+
+
+def aggregates(aggregator: ResultAggregator):
+    """比較用に集計結果を平らな辞書にする"""
+    report = aggregator.latency_report()
+    values = {f'overall.{key}': value for key, value in report['overall'].items()}
+    for code, summary in report['by_status_code'].items():
+        values.update({f'{code}.{key}': value for key, value in summary.items()})
+    for name, histogram in (('service_time', aggregator.timings['service_time']), ('lag', aggregator.start_lags)):
+        values.update({f'{name}.{key}': value for key, value in histogram.summary().items()})
+    bot_scores = aggregator.bot_scores.summary()
+    values.update({f'bot_scores.{key}': bot_scores[key] for key in ('avg_score', 'min_score', 'max_score')})
+    counts = (aggregator.total, aggregator.flags, aggregator.status_codes, bot_scores['total_scores_received'],
+              bot_scores['distribution'])
+    return counts, values
+
+
+@pytest.mark.parametrize('count', [0, 1, 1000])
+def test_add_table_matches_add(count):
+    records = make_records(count)
+    by_record = ResultAggregator(SimpleBotTester.STAT_FLAG_FIELDS, ('service_time',))
+    for record in records:
+        by_record.add(record)
+    by_table = ResultAggregator(SimpleBotTester.STAT_FLAG_FIELDS, ('service_time',))
+    by_table.add_table(make_table(records))
+
+    expected_counts, expected = aggregates(by_record)
+    actual_counts, actual = aggregates(by_table)
+    assert actual_counts == expected_counts
+    assert actual == pytest.approx(expected)
@@ -0,0 +1,24 @@
+"""results_db.py の取り込み対象の展開のテスト"""
+
+import results_db
+
+
+def test_default_patterns_without_matches_are_skipped(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert results_db.expand_paths([]) == []
+
+
+def test_default_patterns_expand_to_matches(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'attack-scripts').mkdir()
+    for name in ('simple_test_results_2.rbin', 'simple_test_results_1.json', 'notes.json'):
+        (tmp_path / 'attack-scripts' / name).write_text('')
+    assert results_db.expand_paths([]) == ['attack-scripts/simple_test_results_1.json',
+                                           'attack-scripts/simple_test_results_2.rbin']
+
+
+def test_given_paths_without_matches_are_kept(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'a_results_1.json').write_text('')
+    assert results_db.expand_paths(['missing.json', '*_results_*.json', 'none_*.rbin']) == [
+        'missing.json', 'a_results_1.json', 'none_*.rbin']
@@ -0,0 +1,104 @@
+"""saturation_search.py の段階的な引き上げと二分探索のテスト（既知のレートで発動する run_window を使う）"""
+
+import pytest
+
+from latency_stats import ResultAggregator
+from saturation_search import SaturationSearch, WindowResult, step_rates
+
+
+class FakeTarget:
+    """trip_rate を超えるレートでは全件 429 を返し、それ以下では全件成功する対象の代わり"""
+
+    def __init__(self, trip_rate: float):
+        self.trip_rate = trip_rate
+        self.calls = []
+
+    def run_window(self, rate: float, num_requests: int) -> ResultAggregator:
+        self.calls.append((rate, num_requests))
+        aggregator = ResultAggregator()
+        tripped = rate > self.trip_rate
+        for _ in range(num_requests):
+            aggregator.add({'success': not tripped, 'status_code': 429 if tripped else 200, 'response_time': 0.1})
+        return aggregator
+
+
+def search(target: FakeTarget, start_rate: float, max_rate: float, **options) -> dict:
+    options = dict({'window': 0.5, 'min_requests': 5}, **options)
+    return SaturationSearch(target.run_window, start_rate, max_rate, **options).run()
+
+
+def test_step_rates():
+    assert step_rates(1, 10) == [1, 2, 4, 8, 10]
+    assert step_rates(5, 20, step=5) == [5, 10, 15, 20]
+    with pytest.raises(ValueError):
+        step_rates(10, 5)
+
+
+def test_tipping_point_is_found_within_resolution():
+    target = FakeTarget(trip_rate=10)
+    report = search(target, 1, 64, resolution=0.1)
+
+    point = report['tipping_point']
+    assert point['found'] is True
+    assert point['max_passing_rate'] <= 10 < point['min_tripping_rate']
+    assert (point['min_tripping_rate'] - point['max_passing_rate']) / point['min_tripping_rate'] <= 0.1
+    phases = [window['phase'] for window in report['windows']]
+    assert phases == ['step'] * 5 + ['bisect'] * point['bisect_probes']
+    assert [rate for rate, _ in target.calls[:5]] == [1, 2, 4, 8, 16]
+    # 1ウィンドウの件数は rate * window（min_requests 未満にはしない）
+    assert [count for _, count in target.calls[:5]] == [5, 5, 5, 5, 8]
+    assert [window['target_rate'] for window in report['latency_curve']] == sorted(rate for rate, _ in target.calls)
+
+
+def test_tripped_at_start_rate():
+    target = FakeTarget(trip_rate=10)
+    report = search(target, 20, 64)
+
+    assert report['tipping_point'] == {'max_passing_rate': None, 'min_tripping_rate': 20, 'found': False,
+                                       'bisect_probes': 0}
+    assert target.calls == [(20, 10)]
+    assert report['windows'][0]['rate_limit_rate'] == 100
+    assert report['windows'][0]['tripped'] is True
+
+
+def test_never_tripped():
+    target = FakeTarget(trip_rate=100)
+    report = search(target, 1, 12)
+
+    assert report['tipping_point'] == {'max_passing_rate': 12, 'min_tripping_rate': None, 'found': False,
+                                       'bisect_probes': 0}
+    assert [rate for rate, _ in target.calls] == [1, 2, 4, 8, 12]
+    assert not any(window['tripped'] for window in report['windows'])
+
+
+def test_bisection_stops_after_max_probes():
+    target = FakeTarget(trip_rate=10)
+    report = search(target, 1, 64, resolution=0.001, max_probes=2)
+
+    point = report['tipping_point']
+    assert point['found'] is True
+    assert point['bisect_probes'] == 2
+    assert [rate for rate, _ in target.calls[5:]] == [12, 10]
+    assert (point['max_passing_rate'], point['min_tripping_rate']) == (10, 12)
+    # 分解能には届いていない
+    assert (point['min_tripping_rate'] - point['max_passing_rate']) / point['min_tripping_rate'] > 0.001
+
+
+def test_window_counts_defense_responses_by_status_code():
+    aggregator = ResultAggregator()
+    results = [
+        # ブロックページは "Cloudflare" を含むので challenge_detected も立つが、403 としてだけ数える
+        {'status_code': 403, 'cloudflare_blocked': True, 'challenge_detected': True},
+        {'status_code': 429},
+        {'status_code': 503, 'challenge_detected': True},
+        {'status_code': None},
+        {'status_code': 200, 'success': True},
+    ]
+    for result in results:
+        aggregator.add(dict(result, response_time=0.1))
+    window = WindowResult('step', 5, aggregator, 0.0, 1.0, trip_threshold=50)
+
+    assert (window.blocked, window.rate_limited, window.challenged, window.errors) == (1, 1, 1, 1)
+    assert window.defense_rate == 60
+    assert window.tripped is True
+    assert window.success_rate == 20
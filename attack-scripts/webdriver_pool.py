@@ -0,0 +1,126 @@
+"""
+Chrome WebDriver プール
+
+起動済みのChromeインスタンスを上限付きで保持し、試行ごとに貸し出して再利用します。
+返却時にCookieとストレージを消去するため、試行間で状態は引き継がれません。
+Chromeの起動時間（数秒）が試行ごとの計測値に混ざらないようにするためのものです。
+"""
+
+import logging
+import queue
+import threading
+import time
+from typing import Callable, List, Tuple
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+
+logger = logging.getLogger(__name__)
+
+
+class WebDriverPool:
+    """上限付きのWebDriverプール"""
+
+    def __init__(self, factory: Callable[[], webdriver.Chrome], size: int, origins: List[str] = None):
+        self.factory = factory
+        self.size = size
+        # 返却時にストレージを消去するオリジン（例: https://example.com）
+        self.origins = origins or []
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._all_drivers = []
+        self.launches = 0
+
+    def _launch(self) -> Tuple[webdriver.Chrome, float]:
+        """新しいドライバーを起動し、起動にかかった時間とともに返す"""
+        start_time = time.time()
+        try:
+            driver = self.factory()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+        startup_time = time.time() - start_time
+        with self._lock:
+            self._all_drivers.append(driver)
+            self.launches += 1
+        logger.info(f"WebDriver launched in {startup_time:.2f}s ({self._created}/{self.size})")
+        return driver, startup_time
+
+    def warm_up(self):
+        """プールの上限までドライバーを事前に起動しておく"""
+        while True:
+            with self._lock:
+                if self._created >= self.size:
+                    break
+                self._created += 1
+            driver, _ = self._launch()
+            self._idle.put(driver)
+
+    def acquire(self) -> Tuple[webdriver.Chrome, float]:
+        """ドライバーを借りる。(ドライバー, このために要した起動時間) を返す
+
+        待機中のドライバーがあれば起動時間は0。上限に達している場合は返却を待つ。
+        """
+        while True:
+            try:
+                return self._idle.get_nowait(), 0.0
+            except queue.Empty:
+                pass
+
+            with self._lock:
+                can_launch = self._created < self.size
+                if can_launch:
+                    self._created += 1
+            if can_launch:
+                return self._launch()
+
+            # 破棄されたドライバーの枠が空く場合に備えて定期的に再確認する
+            try:
+                return self._idle.get(timeout=1.0), 0.0
+            except queue.Empty:
+                continue
+
+    def release(self, driver: webdriver.Chrome, healthy: bool = True):
+        """ドライバーを返却する。状態を消去できなかった場合は破棄する"""
+        if healthy:
+            try:
+                self.reset(driver)
+                self._idle.put(driver)
+                return
+            except WebDriverException as e:
+                logger.warning(f"WebDriver reset failed, discarding: {e}")
+        self._discard(driver)
+
+    def reset(self, driver: webdriver.Chrome):
+        """Cookie・ストレージ・キャッシュを消去して空白ページに戻す"""
+        driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+        driver.execute_cdp_cmd('Network.clearBrowserCache', {})
+        for origin in self.origins:
+            driver.execute_cdp_cmd('Storage.clearDataForOrigin', {'origin': origin, 'storageTypes': 'all'})
+        driver.get('about:blank')
+
+    def _discard(self, driver: webdriver.Chrome):
+        """ドライバーを終了してプールから外す（次回の acquire で再起動される）"""
+        with self._lock:
+            self._created -= 1
+            if driver in self._all_drivers:
+                self._all_drivers.remove(driver)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def close(self):
+        """プール内のすべてのドライバーを終了する"""
+        with self._lock:
+            drivers = list(self._all_drivers)
+            self._all_drivers.clear()
+            self._created = 0
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+        logger.info(f"WebDriver pool closed ({len(drivers)} drivers, {self.launches} launches)")